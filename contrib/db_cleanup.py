@@ -155,6 +155,7 @@ class HistoryCleanup():
 
   def clean_up_sensors(self):
     self.__clean_up('SensorHistory')
+    self.__clean_up('SensorAverageHistory')
 
   def clean_up_doors(self):
     self.__clean_up('ButtonHistory')
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+"""
+ Measure how long it takes to list all the available hardware drivers, and to load the drivers that are used for
+ scanning new sensors and relays at startup, and how many modules are imported for that.
+ Run this script in the TerrariumPI root folder with the same python version as TerrariumPI. Run it twice, as the
+ first run generates the hardware driver registry (data/hardware_registry.json).
+
+ python contrib/hardware_startup_benchmark.py
+"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+start = time.time()
+modules = len(sys.modules)
+
+from hardware.sensor import terrariumSensor
+from hardware.relay import terrariumRelay
+from hardware.button import terrariumButton
+from hardware.webcam import terrariumWebcam
+from hardware.display import terrariumDisplay
+
+import_time = time.time() - start
+
+start = time.time()
+drivers = len(terrariumSensor.available_sensors) + len(terrariumRelay.available_relays) + len(terrariumButton.available_buttons) + len(terrariumWebcam.available_webcams) + len(terrariumDisplay.available_displays)
+registry_time = time.time() - start
+
+start = time.time()
+scan_drivers = 0
+for hardware in list(terrariumSensor.available_hardware.values()) + list(terrariumRelay.available_hardware.values()):
+  # The engine scans for new sensors and relays at startup. Only the scannable drivers are loaded for that
+  if getattr(hardware, 'scannable', False):
+    try:
+      hardware.load()
+      scan_drivers += 1
+    except Exception as ex:
+      print(f'Could not load {hardware}: {ex}')
+scan_time = time.time() - start
+
+driver_modules = len([name for name in sys.modules if name.split('.')[0] == 'hardware' and name.split('.')[-1].endswith(('_sensor','_relay','_button','_webcam','_display'))])
+
+print(f'Imported hardware packages in {import_time:.3f} seconds')
+print(f'Listed {drivers} hardware drivers in {registry_time:.3f} seconds')
+print(f'Loaded {scan_drivers} drivers for scanning in {scan_time:.3f} seconds')
+print(f'Loaded {len(sys.modules) - modules} modules in total, of which {driver_modules} driver modules')
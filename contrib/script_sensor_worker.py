@@ -0,0 +1,16 @@
+#!/usr/bin/env python
+# terrariumpi-worker
+# This script keeps running, and answers the requests of TerrariumPI with line delimited JSON on stdin/stdout
+
+import sys
+import json
+import random
+
+for line in sys.stdin:
+  request = json.loads(line)
+  try:
+    response = {'id' : request['id'], 'result' : random.randint(10,30)}
+  except Exception as ex:
+    response = {'id' : request['id'], 'error' : str(ex)}
+
+  print(json.dumps(response), flush=True)
@@ -11,18 +11,15 @@ Returns:
 import terrariumLogging
 logger = terrariumLogging.logging.getLogger(__name__)
 
-from pathlib import Path
-import inspect
-from importlib import import_module
-import sys
 from hashlib import md5
 import RPi.GPIO as GPIO
 import threading
-from gevent import sleep
+from gevent import sleep, spawn, get_hub
 
 from terrariumUtils import terrariumUtils, terrariumCache, classproperty
+from hardware.driver_registry import terrariumHardwareRegistry
 
-from hardware.io_expander import terrariumIOExpander
+from hardware.io_expander import terrariumIOExpander, terrariumIOExpanderInputPoller
 
 
 class terrariumButtonException(TypeError):
@@ -42,6 +39,11 @@ class terrariumButton(object):
   HARDWARE = None
   NAME = None
 
+  _POLL_INTERVAL = 0.1  # in seconds
+  _DEBOUNCE_TIME = 50   # in milliseconds
+  # Buttons that measure their state in their own thread, and report changes with _update_state()
+  _SELF_UPDATING = False
+
   RELEASED = 0
   PRESSED  = 1
 
@@ -52,18 +54,8 @@ class terrariumButton(object):
 
     data = cache.get_data(__CACHE_KEY)
     if data is None:
-      data = {}
-      # Start dynamically loading sensors (based on: https://www.bnmetrics.com/blog/dynamic-import-in-python3)
-      for file in sorted(Path(__file__).parent.glob('*_button.py')):
-        imported_module = import_module( '.' + file.stem, package='{}'.format(__name__))
-
-        for i in dir(imported_module):
-          attribute = getattr(imported_module, i)
-
-          if inspect.isclass(attribute) and attribute != terrariumButton and issubclass(attribute, terrariumButton):
-            setattr(sys.modules[__name__], file.stem, attribute)
-            data[attribute.HARDWARE] = attribute
-
+      # Only the registry is loaded here. The driver modules are imported when a device needs them
+      data = terrariumHardwareRegistry.drivers(__name__, terrariumButton, '*_button.py')
       cache.set_data(__CACHE_KEY,data,-1)
 
     return data
@@ -83,7 +75,7 @@ class terrariumButton(object):
     if hardware_type not in known_buttons:
       raise terrariumButtonException(f'Button of hardware type {hardware_type} is unknown.')
 
-    return super(terrariumButton, cls).__new__(known_buttons[hardware_type])
+    return super(terrariumButton, cls).__new__(known_buttons[hardware_type].load())
 
   def __init__(self, id, _, address, name = '', callback = None):
     "Create a new button based on type"
@@ -96,7 +88,10 @@ class terrariumButton(object):
 
     self._checker = {
       'running' : False,
-      'thread'  : None
+      'thread'  : None,
+      'mode'    : None,
+      'hub'     : None,
+      'pending' : False
     }
 
     self.id       = id
@@ -115,21 +110,75 @@ class terrariumButton(object):
     """
     return f'{self.NAME} named \'{self.name}\' at address \'{self.address}\''
 
+  def _update_state(self, new_state):
+    if new_state != self._device['state']:
+      self._device['state'] = new_state
+      if self.callback is not None:
+        self.callback(self.id, self._device['state'])
+
   def _run(self):
+    # Polling fallback
     self._checker['running'] = True
     while self._checker['running']:
-      new_state = self._get_state()
-      if new_state != self._device['state']:
-        self._device['state'] = new_state
-        if self.callback is not None:
-          self.callback(self.id, self._device['state'])
+      self._update_state(self._get_state())
+      sleep(self._POLL_INTERVAL)
+
+  def __check_state(self, *args):
+    # Called by the IO expander poller
+    self._update_state(self._get_state())
+
+  def __edge_detected(self, *args):
+    # Called by RPi.GPIO in its own OS thread, which is not managed by gevent. So only hand the edge over to the gevent hub
+    try:
+      self._checker['hub'].loop.run_callback_threadsafe(self.__schedule_check)
+    except Exception as ex:
+      logger.debug(f'Could not process an edge of {self}: {ex}')
+
+  def __schedule_check(self):
+    # Runs in the gevent hub. All the edges within the debounce time result in a single state check
+    if self._checker['running'] and not self._checker['pending']:
+      self._checker['pending'] = True
+      spawn(self.__debounced_check)
+
+  def __debounced_check(self):
+    # Wait for the pin to settle, so the last edge within the debounce time is not missed
+    sleep(self._DEBOUNCE_TIME / 1000)
+    self._checker['pending'] = False
+    if self._checker['running']:
+      self._update_state(self._get_state())
+
+  def _start_monitoring(self):
+    self._checker['running'] = True
+
+    if self._SELF_UPDATING:
+      self._checker['mode'] = 'self'
+      return
 
-      sleep(.1)
+    if isinstance(self._device['device'], terrariumIOExpander):
+      # All the buttons on the same expander chip share a single poller
+      self._checker['mode'] = 'expander'
+      terrariumIOExpanderInputPoller.subscribe(self._device['device'], self.__check_state)
+      return
+
+    if isinstance(self._device['device'], int):
+      try:
+        self._checker['hub'] = get_hub()
+        GPIO.add_event_detect(self._device['device'], GPIO.BOTH, callback=self.__edge_detected, bouncetime=self._DEBOUNCE_TIME)
+        self._checker['mode'] = 'interrupt'
+        # Load the initial state
+        self._update_state(self._get_state())
+        return
+      except Exception as ex:
+        logger.warning(f'Could not use edge detection for {self}. Falling back to polling: {ex}')
+
+    self._checker['mode'] = 'polling'
+    self._checker['thread'] = threading.Thread(target=self._run)
+    self._checker['thread'].start()
 
   def _get_state(self):
     if isinstance(self._device['device'], terrariumIOExpander):
-      # IO Expander in use
-      state = self._device['device'].state
+      # IO Expander in use. The pins are read by the shared poller
+      state = self._device['device'].input_state
       if state is None:
         # Device in error...
         return None
@@ -153,16 +202,14 @@ class terrariumButton(object):
       elif address[0].lower().startswith('pcf8574-'):
         self._device['device'] = terrariumIOExpander('PCF8574',','.join(address[1:]))
 
-      self._device['device'].set_pin(int(address[0].split('-')[1]))
+      self._device['device'].set_port(int(address[0].split('-')[1]))
 
     else:
       self._device['device'] = terrariumUtils.to_BCM_port_number(address[0])
       GPIO.setup(self._device['device'], GPIO.IN, pull_up_down=GPIO.PUD_UP)  # Data in
 
     self._load_hardware()
-
-    self._checker['thread'] = threading.Thread(target=self._run)
-    self._checker['thread'].start()
+    self._start_monitoring()
 
   @property
   def id(self):
@@ -222,7 +269,20 @@ class terrariumButton(object):
 
   def stop(self):
     self._checker['running'] = False
-    self._checker['thread'].join()
+
+    if self._checker['mode'] == 'expander':
+      terrariumIOExpanderInputPoller.unsubscribe(self._device['device'], self.__check_state)
+    elif self._checker['mode'] == 'interrupt':
+      try:
+        GPIO.remove_event_detect(self._device['device'])
+      except Exception:
+        pass
+
+    if self._checker['thread'] is not None:
+      self._checker['thread'].join()
+      self._checker['thread'] = None
+
+    self._checker['mode'] = None
 
     if not isinstance(self._device['device'], terrariumIOExpander):
       try:
@@ -14,6 +14,8 @@ class terrariumLDRSensor(terrariumButton):
 
   __CAPACITOR = 1 # in uF
 
+  _SELF_UPDATING = True
+
   def __run(self):
     self._checker['running'] = True
     while self._checker['running']:
@@ -34,6 +36,7 @@ class terrariumLDRSensor(terrariumButton):
           count += 1
 
         self._device['internal_state'] = self.PRESSED if count <= (self.__CAPACITOR * 10000) else self.RELEASED
+        self._update_state(self._device['internal_state'])
         sleep(.1)
 
       except KeyboardInterrupt as ex:
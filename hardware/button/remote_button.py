@@ -13,6 +13,8 @@ class terrariumRemoteButton(terrariumButton):
 
   __TIMEOUT = 10
 
+  _SELF_UPDATING = True
+
   def __run(self):
     self._checker['running'] = True
     while self._checker['running']:
@@ -21,6 +23,7 @@ class terrariumRemoteButton(terrariumButton):
         if self.__reverse:
           value = 1 if value == 0 else 0
         self._device['internal_state'] = value
+        self._update_state(self._device['internal_state'])
       except Exception as ex:
         logger.warning(f'Could not update remote button: {ex}')
 
@@ -2,10 +2,6 @@
 import terrariumLogging
 logger = terrariumLogging.logging.getLogger(__name__)
 
-from pathlib import Path
-import inspect
-from importlib import import_module
-import sys
 from hashlib import md5
 import threading
 from gevent import sleep
@@ -14,6 +10,7 @@ import textwrap
 from retry import retry
 
 from terrariumUtils import terrariumUtils, terrariumCache, classproperty
+from hardware.driver_registry import terrariumHardwareRegistry
 
 class terrariumDisplayLoadingException(TypeError):
   '''There is a problem with loading a hardware display.'''
@@ -38,18 +35,8 @@ class terrariumDisplay(object):
 
     data = cache.get_data(__CACHE_KEY)
     if data is None:
-      data = {}
-      # Start dynamically loading sensors (based on: https://www.bnmetrics.com/blog/dynamic-import-in-python3)
-      for file in sorted(Path(__file__).parent.glob('*_display.py')):
-        imported_module = import_module( '.' + file.stem, package='{}'.format(__name__))
-
-        for i in dir(imported_module):
-          attribute = getattr(imported_module, i)
-
-          if inspect.isclass(attribute) and attribute != terrariumDisplay and issubclass(attribute, terrariumDisplay):
-            setattr(sys.modules[__name__], file.stem, attribute)
-            data[attribute.HARDWARE] = attribute
-
+      # Only the registry is loaded here. The driver modules are imported when a device needs them
+      data = terrariumHardwareRegistry.drivers(__name__, terrariumDisplay, '*_display.py')
       cache.set_data(__CACHE_KEY,data,-1)
 
     return data
@@ -69,7 +56,7 @@ class terrariumDisplay(object):
     if hardware_type not in known_displays:
       raise terrariumDisplayException(f'Dislay of hardware type {hardware_type} is unknown.')
 
-    return super(terrariumDisplay, cls).__new__(known_displays[hardware_type])
+    return super(terrariumDisplay, cls).__new__(known_displays[hardware_type].load())
 
 
   def __init__(self, device_id, _, address, title = None, width = 16, height = 2):
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+import terrariumLogging
+logger = terrariumLogging.logging.getLogger(__name__)
+
+import inspect
+import json
+import sys
+import threading
+from importlib import import_module
+from pathlib import Path
+
+
+class terrariumHardwareDriver(object):
+  """
+  Description of a hardware driver from the registry. The driver module (and all the libraries it needs) is only
+  imported when the driver class is really needed.
+  """
+
+  def __init__(self, package, data):
+    self.package    = package
+    self.module     = data['module']
+    self.class_name = data['class']
+    # The driver can scan for new devices
+    self.scannable  = data.get('scannable', False)
+
+    for attribute, value in data['attributes'].items():
+      setattr(self, attribute, value)
+
+    self.__driver = None
+
+  def __repr__(self):
+    return f'Hardware driver {self.HARDWARE} ({self.module}.{self.class_name})'
+
+  def load(self):
+    """
+    Import the driver module and return the driver class.
+
+    Returns:
+        class: The hardware driver class
+    """
+    if self.__driver is None:
+      driver = getattr(import_module(self.module), self.class_name)
+      # Drivers without their own types (remote, script) can handle all the known types
+      if hasattr(driver, 'TYPES') and len(driver.TYPES) == 0:
+        driver.TYPES = getattr(self, 'TYPES', [])
+
+      setattr(sys.modules[self.package], self.module.split('.')[-1], driver)
+      self.__driver = driver
+
+    return self.__driver
+
+
+class terrariumHardwareRegistry(object):
+  """
+  Static registry of all the hardware drivers per hardware package. The registry is generated once by importing all
+  the driver modules, and is regenerated when the driver files change. After that, the drivers can be listed without
+  importing them.
+  """
+
+  __REGISTRY_FILE = Path(__file__).parent.parent.joinpath('data/hardware_registry.json')
+  __ATTRIBUTES = ['HARDWARE', 'NAME', 'TYPES']
+
+  __lock = threading.Lock()
+
+  @staticmethod
+  def __fingerprint(files):
+    return [[file.name, file.stat().st_size, file.stat().st_mtime_ns] for file in files]
+
+  @staticmethod
+  def __scan(package, base_class, files, attributes, scan):
+    drivers = []
+    for file in files:
+      imported_module = import_module(f'.{file.stem}', package=package)
+
+      for i in dir(imported_module):
+        attribute = getattr(imported_module, i)
+
+        if inspect.isclass(attribute) and attribute != base_class and issubclass(attribute, base_class) and attribute.__module__ == imported_module.__name__:
+          if attribute.HARDWARE is None:
+            continue
+
+          drivers.append({
+            'module'     : attribute.__module__,
+            'class'      : attribute.__name__,
+            'scannable'  : scan is not None and hasattr(attribute, scan),
+            'attributes' : { name : getattr(attribute, name) for name in attributes if hasattr(attribute, name) }
+          })
+
+    return drivers
+
+  @staticmethod
+  def drivers(package, base_class, pattern, attributes = [], update = None, scan = None):
+    """
+    Get all the hardware drivers of a package, without importing them.
+
+    Args:
+        package (str): Name of the hardware package
+        base_class (class): Base class of the drivers
+        pattern (str): File pattern of the driver modules
+        attributes (list): Extra class attributes to store in the registry
+        update (function): Optional function to update the driver data before it is stored
+        scan (str): Optional name of the static method that scans for new devices. Only drivers with this method are scannable
+
+    Returns:
+        dict: terrariumHardwareDriver objects with the hardware type as key
+    """
+    attributes = terrariumHardwareRegistry.__ATTRIBUTES + attributes
+
+    with terrariumHardwareRegistry.__lock:
+      files = sorted(Path(sys.modules[package].__file__).parent.glob(pattern))
+      fingerprint = terrariumHardwareRegistry.__fingerprint(files)
+
+      try:
+        registry = json.loads(terrariumHardwareRegistry.__REGISTRY_FILE.read_text())
+      except Exception:
+        registry = {}
+
+      if registry.get(package, {}).get('fingerprint') != fingerprint or registry[package].get('attributes') != attributes or registry[package].get('scan') != scan:
+        logger.info(f'Generating the hardware driver registry for {package}.')
+        drivers = terrariumHardwareRegistry.__scan(package, base_class, files, attributes, scan)
+        if update is not None:
+          update(drivers)
+
+        registry[package] = {'fingerprint' : fingerprint, 'attributes' : attributes, 'scan' : scan, 'drivers' : drivers}
+
+        try:
+          terrariumHardwareRegistry.__REGISTRY_FILE.write_text(json.dumps(registry, indent=2))
+        except Exception as ex:
+          logger.warning(f'Could not save the hardware driver registry to {terrariumHardwareRegistry.__REGISTRY_FILE}: {ex}')
+
+    return { driver['attributes']['HARDWARE'] : terrariumHardwareDriver(package, driver) for driver in registry[package]['drivers'] }
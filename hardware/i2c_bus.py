@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+import terrariumLogging
+logger = terrariumLogging.logging.getLogger(__name__)
+
+import threading
+from contextlib import contextmanager
+
+# pip install smbus2
+import smbus2
+
+
+class terrariumI2CBus(object):
+  """
+  Shared I2C bus. There is only one open handle per bus, which is used by all the sensors and relays on that bus. All
+  the access is serialized with a lock, and the channels of TCA9548A multiplexers are only switched when needed.
+  """
+
+  __lock = threading.Lock()
+  __buses = {}
+
+  def __init__(self, bus):
+    self.bus = bus
+    self.__lock = threading.RLock()
+    self.__handle = None
+    # Last written control register per multiplexer address
+    self.__mux = {}
+
+  def __repr__(self):
+    return f'I2C bus {self.bus}'
+
+  @staticmethod
+  def get(bus = 1):
+    """
+    Get the shared bus object for a bus number.
+
+    Args:
+        bus (int): The I2C bus number (/dev/i2c-N)
+
+    Returns:
+        terrariumI2CBus: The shared bus
+    """
+    bus = int(bus)
+    with terrariumI2CBus.__lock:
+      if bus not in terrariumI2CBus.__buses:
+        terrariumI2CBus.__buses[bus] = terrariumI2CBus(bus)
+
+      return terrariumI2CBus.__buses[bus]
+
+  @staticmethod
+  def parse_mux(value):
+    """
+    Parse a multiplexer address in the format [mux_address]-[channel], like 0x70-3.
+
+    Args:
+        value (str): The multiplexer address
+
+    Returns:
+        tuple: (mux address, channel) or None when there is no multiplexer
+    """
+    if value is None or '-' not in str(value):
+      return None
+
+    address, channel = str(value).strip().lower().split('-')
+    if not address.startswith('0x'):
+      address = '0x' + address
+
+    return (int(address, 16), int(channel))
+
+  def __close(self):
+    if self.__handle is not None:
+      try:
+        self.__handle.close()
+      except Exception as ex:
+        logger.debug(f'Error closing {self}: {ex}')
+
+    self.__handle = None
+    # After an error the multiplexer state is unknown
+    self.__mux = {}
+
+  def select_channel(self, mux_address, channel):
+    """
+    Enable a single channel of a TCA9548A multiplexer. The control register is only written when it changes.
+
+    Args:
+        mux_address (int): The multiplexer address
+        channel (int): The channel (0-7)
+    """
+    register = 1 << channel
+    with self.__lock:
+      if self.__mux.get(mux_address) != register:
+        self.handle.write_byte(mux_address, register)
+        self.__mux[mux_address] = register
+
+  def mux_register(self, mux_address):
+    """
+    Get the last written control register of a multiplexer, and only read it from the chip when it is unknown.
+
+    Args:
+        mux_address (int): The multiplexer address
+
+    Returns:
+        int: The control register value
+    """
+    with self.__lock:
+      if mux_address not in self.__mux:
+        self.__mux[mux_address] = self.handle.read_byte(mux_address)
+
+      return self.__mux[mux_address]
+
+  def set_mux_register(self, mux_address, value):
+    with self.__lock:
+      self.handle.write_byte(mux_address, value)
+      self.__mux[mux_address] = value
+
+  @property
+  def handle(self):
+    with self.__lock:
+      if self.__handle is None:
+        self.__handle = smbus2.SMBus(self.bus)
+
+      return self.__handle
+
+  @contextmanager
+  def open(self, mux = None):
+    """
+    Get exclusive access to the bus. When a multiplexer is given, that channel is selected first.
+
+    Args:
+        mux (tuple): Optional (mux address, channel)
+
+    Yields:
+        smbus2.SMBus: The shared bus handle. Do not close it
+    """
+    with self.__lock:
+      try:
+        if mux is not None:
+          self.select_channel(*mux)
+
+        yield self.handle
+
+      except OSError:
+        # Reopen the bus on the next use
+        self.__close()
+        raise
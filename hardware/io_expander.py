@@ -4,6 +4,8 @@ from terrariumUtils import classproperty, terrariumCache, terrariumUtils
 
 logger = terrariumLogging.logging.getLogger(__name__)
 
+import threading
+
 # pip install pcf8574 (pcf8574-0.1.3)
 from pcf8574 import PCF8574
 # pip install pcf8575
@@ -63,8 +65,12 @@ class terrariumIOExpander(object):
 
     return address
 
+  @property
+  def hardware_key(self):
+    return f'IO_{self.HARDWARE}_{self.address}'
+
   def load_hardware(self):
-    hardware_key = f'IO_{self.HARDWARE}_{self.address}'
+    hardware_key = self.hardware_key
     loaded_hardware = self.__hardware_cache.get_data(hardware_key,None)
 
     if loaded_hardware is None:
@@ -73,6 +79,7 @@ class terrariumIOExpander(object):
       if loaded_hardware is not None:
         # All off is all True
         loaded_hardware.states = [True,True,True,True,True,True,True,True]
+        loaded_hardware.inputs = None
         self.__hardware_cache.set_data(hardware_key, loaded_hardware, -1)
 
     return loaded_hardware
@@ -88,6 +95,57 @@ class terrariumIOExpander(object):
       logger.error(f'Got an error reading {self}: {ex}')
       return None
 
+  @staticmethod
+  def set_states(changes):
+    """
+    Change multiple ports of the same expander chip with a single write.
+
+    Args:
+        changes (list): (terrariumIOExpander, state) tuples. All the expanders should be on the same chip
+
+    Returns:
+        bool: True when the ports are changed
+    """
+    if len(changes) == 0:
+      return True
+
+    device = changes[0][0].__device
+    try:
+      for (expander, state) in changes:
+        state = terrariumUtils.is_true(state)
+        device.states[expander.port] = not state if expander.active_high else state
+
+      device.port = device.states
+      return True
+    except Exception as ex:
+      logger.error(f'Got an error setting {len(changes)} ports of {changes[0][0]}: {ex}')
+      return None
+
+  def read_inputs(self):
+    """
+    Read all the pins of the expander chip with a single I2C read. The values are shared by all the expander objects on
+    the same chip.
+
+    Returns:
+        bool: True when the pins are read
+    """
+    try:
+      # Iterating the library port does an I2C read per pin, so the chip is read directly
+      self.__device.inputs = self._read_port(self.__device)
+      return True
+    except Exception as ex:
+      logger.error(f'Got an error reading the inputs of {self}: {ex}')
+      self.__device.inputs = None
+      return False
+
+  @property
+  def input_state(self):
+    # The pin level from the last read_inputs() call
+    try:
+      return self.__device.inputs[self.port]
+    except Exception:
+      return None
+
   @state.setter
   def state(self, state):
     try:
@@ -102,6 +160,66 @@ class terrariumIOExpander(object):
       return None
 
 
+class terrariumIOExpanderInputPoller(object):
+  """
+  Reads all the inputs of an IO expander chip once per interval, and notifies all the subscribers on that chip. So
+  multiple buttons on the same chip only need a single I2C read per interval.
+  """
+
+  __POLL_INTERVAL = 0.1 # in seconds
+
+  __lock = threading.Lock()
+  __pollers = {}
+
+  def __init__(self, expander):
+    self.expander = expander
+    self.subscribers = {}
+    self.__exit = threading.Event()
+    self.__thread = threading.Thread(target=self.__run)
+    self.__thread.start()
+
+  def __run(self):
+    while not self.__exit.is_set():
+      self.expander.read_inputs()
+      for callback in list(self.subscribers.keys()):
+        try:
+          callback()
+        except Exception as ex:
+          logger.error(f'Error processing the inputs of {self.expander}: {ex}')
+
+      self.__exit.wait(terrariumIOExpanderInputPoller.__POLL_INTERVAL)
+
+  def stop(self):
+    self.__exit.set()
+    if threading.current_thread() != self.__thread:
+      self.__thread.join()
+
+  @staticmethod
+  def subscribe(expander, callback):
+    with terrariumIOExpanderInputPoller.__lock:
+      poller = terrariumIOExpanderInputPoller.__pollers.get(expander.hardware_key)
+      if poller is None:
+        poller = terrariumIOExpanderInputPoller(expander)
+        terrariumIOExpanderInputPoller.__pollers[expander.hardware_key] = poller
+
+      poller.subscribers[callback] = expander
+
+  @staticmethod
+  def unsubscribe(expander, callback):
+    with terrariumIOExpanderInputPoller.__lock:
+      poller = terrariumIOExpanderInputPoller.__pollers.get(expander.hardware_key)
+      if poller is None:
+        return
+
+      poller.subscribers.pop(callback, None)
+      if len(poller.subscribers) > 0:
+        return
+
+      del(terrariumIOExpanderInputPoller.__pollers[expander.hardware_key])
+
+    poller.stop()
+
+
 class terrariumPCF8574IOExpander(terrariumIOExpander):
   HARDWARE = 'PCF8574'
   NAME = 'PCF8574 Expander (8 ports)'
@@ -109,9 +227,17 @@ class terrariumPCF8574IOExpander(terrariumIOExpander):
   def _load_device(self, address):
     return PCF8574(address[1], address[0])
 
+  def _read_port(self, device):
+    state = device.bus.read_byte(device.address)
+    return [bool(state & 1 << 7 - pin) for pin in range(8)]
+
 class terrariumPCF8575IOExpander(terrariumIOExpander):
   HARDWARE = 'PCF8575'
   NAME = 'PCF8575 Expander (16 ports)'
 
   def _load_device(self, address):
-    return PCF8575(address[1], address[0])
\ No newline at end of file
+    return PCF8575(address[1], address[0])
+
+  def _read_port(self, device):
+    state = device.bus.read_word_data(device.address, 0)
+    return [bool(state & 1 << 15 - pin) for pin in range(16)]
\ No newline at end of file
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+import terrariumLogging
+from terrariumUtils import terrariumCache, terrariumUtils
+
+logger = terrariumLogging.logging.getLogger(__name__)
+
+import json
+import threading
+from time import time
+from urllib.parse import urlparse, unquote
+
+# pip install paho-mqtt
+import paho.mqtt.client as mqtt
+
+
+class terrariumMQTTClientException(TypeError):
+  '''There is a problem with loading a MQTT broker connection.'''
+  pass
+
+class terrariumMQTTClient(object):
+  """
+  Shared MQTT broker connection for hardware that pushes its data. There is only one connection per broker, which
+  is used by all the sensors and relays that subscribe to a topic on that broker. Received messages are kept in
+  memory, so reading a value does not need any network traffic.
+  """
+
+  def __init__(self, host, port = 1883, username = None, password = None, ssl = False):
+    self.host     = host
+    self.port     = port
+    self.username = username
+    self.password = password
+    self.ssl      = ssl
+
+    self.__lock = threading.Lock()
+    self.__subscriptions = {}
+    self.__values = {}
+
+    self.__client = mqtt.Client(client_id=f'TerrariumPI-{terrariumUtils.generate_uuid()}')
+    self.__client.on_connect = self.__on_connect
+    self.__client.on_message = self.__on_message
+    if self.ssl:
+      self.__client.tls_set(tls_version=mqtt.ssl.PROTOCOL_TLS)
+
+    if self.username is not None:
+      self.__client.username_pw_set(self.username, self.password)
+
+    self.__client.reconnect_delay_set(min_delay=1, max_delay=60)
+    # Connect in the background, paho will keep on reconnecting when the broker is not available
+    self.__client.connect_async(self.host, self.port, 30)
+    self.__client.loop_start()
+    logger.info(f'Connecting to MQTT Broker at address: {self.host}:{self.port} ...')
+
+  def __repr__(self):
+    return f'MQTT Broker connection at address \'{self.host}:{self.port}\''
+
+  @staticmethod
+  def parse_address(address):
+    """
+    Parse a MQTT address in the format: mqtt(s)://[username:password@]host[:port]/topic/name[#json/path]
+
+    Returns:
+        dict: Broker, topic and JSON path information
+    """
+    address = urlparse(str(address).strip())
+    if address.scheme not in ['mqtt','mqtts'] or address.hostname is None or '' == address.path.strip('/'):
+      raise terrariumMQTTClientException(f'Invalid MQTT address: {address.geturl()}')
+
+    return {
+      'host'      : address.hostname,
+      'port'      : address.port or (8883 if 'mqtts' == address.scheme else 1883),
+      'username'  : None if address.username is None else unquote(address.username),
+      'password'  : None if address.password is None else unquote(address.password),
+      'ssl'       : 'mqtts' == address.scheme,
+      'topic'     : address.path.strip('/'),
+      'json_path' : [] if '' == address.fragment else address.fragment.strip('/').split('/')
+    }
+
+  @staticmethod
+  def connect(address):
+    """
+    Get the shared broker connection for the given MQTT address. A new connection is only created once per broker.
+
+    Returns:
+        tuple: The shared terrariumMQTTClient and the parsed address data
+    """
+    address = terrariumMQTTClient.parse_address(address)
+    cache = terrariumCache()
+    cache_key = f'MQTT_{address["host"]}_{address["port"]}_{address["username"]}'
+
+    client = cache.get_data(cache_key)
+    if client is None:
+      client = terrariumMQTTClient(address['host'], address['port'], address['username'], address['password'], address['ssl'])
+      cache.set_data(cache_key, client, -1)
+
+    return (client, address)
+
+  @staticmethod
+  def decode(payload, json_path = []):
+    """
+    Decode a MQTT payload to a value. Payloads can be plain values or JSON, where the json_path is used to traverse
+    the JSON data.
+    """
+    value = payload.decode('utf-8').strip() if isinstance(payload, bytes) else payload
+
+    if len(json_path) > 0:
+      value = json.loads(value)
+      for item in json_path:
+        # Dirty hack to process array data....
+        try:
+          item = int(item)
+        except Exception:
+          item = str(item)
+
+        value = value[item]
+
+    return value
+
+  def __on_connect(self, client, userdata, flags, rc):
+    if rc != 0:
+      logger.error(f'Error! Login to MQTT Broker at address: {self.host}:{self.port} failed! Error code: {rc}')
+      return
+
+    logger.info(f'Logged in to MQTT Broker at address: {self.host}:{self.port}.')
+    # (Re)subscribe to all the topics, as the broker does not remember them after a reconnect
+    with self.__lock:
+      topics = list(self.__subscriptions.keys())
+
+    for topic in topics:
+      self.__client.subscribe(topic, qos=1)
+
+  def __on_message(self, client, userdata, message):
+    callbacks = []
+    with self.__lock:
+      for topic in self.__subscriptions:
+        if mqtt.topic_matches_sub(topic, message.topic):
+          self.__values[topic] = (message.payload, time())
+          callbacks += list(self.__subscriptions[topic])
+
+    for callback in callbacks:
+      try:
+        callback(message.payload)
+      except Exception as ex:
+        logger.error(f'Error processing message from topic {message.topic} at {self}: {ex}')
+
+  def subscribe(self, topic, callback = None):
+    with self.__lock:
+      new_topic = topic not in self.__subscriptions
+      if new_topic:
+        self.__subscriptions[topic] = set()
+
+      if callback is not None:
+        self.__subscriptions[topic].add(callback)
+
+    if new_topic and self.__client.is_connected():
+      self.__client.subscribe(topic, qos=1)
+
+  def unsubscribe(self, topic, callback = None):
+    with self.__lock:
+      if topic not in self.__subscriptions:
+        return
+
+      self.__subscriptions[topic].discard(callback)
+      if len(self.__subscriptions[topic]) > 0:
+        return
+
+      del(self.__subscriptions[topic])
+      if topic in self.__values:
+        del(self.__values[topic])
+
+    if self.__client.is_connected():
+      self.__client.unsubscribe(topic)
+
+  def publish(self, topic, payload, retain = False):
+    if not self.__client.is_connected():
+      logger.error(f'Could not publish to topic {topic}, as we are not connected to {self}')
+      return False
+
+    result = self.__client.publish(topic, payload=payload, qos=1, retain=retain)
+    return result.rc == mqtt.MQTT_ERR_SUCCESS
+
+  def get_value(self, topic, max_age = None):
+    """
+    Get the last received payload of a topic from memory.
+
+    Returns:
+        bytes: Last payload or None when there is no (recent) message
+    """
+    with self.__lock:
+      value = self.__values.get(topic)
+
+    if value is None or (max_age is not None and time() - value[1] > max_age):
+      return None
+
+    return value[0]
+
+  def stop(self):
+    self.__client.loop_stop()
+    self.__client.disconnect()
@@ -15,6 +15,12 @@ sys.path.insert(0, str((Path(__file__).parent / Path('../../3rdparty/4relay-rpi/
 sys.path.insert(0, str((Path(__file__).parent / Path('../../3rdparty/8relind-rpi/python/8relind')).resolve()))
 sys.path.insert(0, str((Path(__file__).parent / Path('../../3rdparty/4relind-rpi/python/4relind')).resolve()))
 
+import relay8
+import lib4relay
+import lib8relay
+import lib4relind
+import lib8relind
+
 from relay8 import set as relay8SetV1
 from relay8 import get as relay8GetV1
 
@@ -35,6 +41,11 @@ class terrariumRelay8Stack(terrariumRelay):
   HARDWARE = '8relay-stack_v1'
   NAME = 'Sequent Microsystems 8 Relay Card Ver. 1 - 2'
 
+  # Library functions to read and write all the relays of a board as a bit mask (relay 1 is bit 0)
+  _LIBRARY = relay8
+  _GET_ALL = 'get_all'
+  _SET_ALL = 'set_all'
+
   def _device_set(self, device, nr, action):
     return relay8SetV1(device, nr, action)
 
@@ -63,10 +74,40 @@ class terrariumRelay8Stack(terrariumRelay):
 
     return self.ON if terrariumUtils.is_true(data) else self.OFF
 
+  @property
+  def board_key(self):
+    # Older library versions can only switch a single relay
+    if self.device is None or getattr(self._LIBRARY, self._GET_ALL, None) is None or getattr(self._LIBRARY, self._SET_ALL, None) is None:
+      return None
+
+    return f'{self.HARDWARE}-{self.device[0]}'
+
+  def _get_board_value(self):
+    return getattr(self._LIBRARY, self._GET_ALL)(self.device[0])
+
+  def _board_channel_value(self, data):
+    return self.ON if int(data) & (1 << (self.device[1] - 1)) else self.OFF
+
+  def _set_board_value(self, changes):
+    stack = self.device[0]
+    data = int(getattr(self._LIBRARY, self._GET_ALL)(stack))
+    for (relay, state) in changes:
+      if state == self.ON:
+        data |=  (1 << (relay.device[1] - 1))
+      else:
+        data &= ~(1 << (relay.device[1] - 1))
+
+    getattr(self._LIBRARY, self._SET_ALL)(stack, data)
+    return True
+
 class terrariumRelay8StackV3(terrariumRelay8Stack):
   HARDWARE = '8relay-stack_v3'
   NAME = 'Sequent Microsystems 8 Relay Card Ver. 3'
 
+  _LIBRARY = lib8relay
+  _GET_ALL = 'get_all'
+  _SET_ALL = 'set_all'
+
   def _device_set(self, device, nr, action):
     return relay8SetV3(device, nr, action)
 
@@ -77,6 +118,10 @@ class terrariumRelay4Stack(terrariumRelay8Stack):
   HARDWARE = '4relay-stack'
   NAME = 'Sequent Microsystems 4 Relay Card'
 
+  _LIBRARY = lib4relay
+  _GET_ALL = 'get_all'
+  _SET_ALL = 'set_all'
+
   def _device_set(self, device, nr, action):
     return relay4Set(device, nr, action)
 
@@ -87,6 +132,10 @@ class terrariumRelay4StackV4(terrariumRelay8Stack):
   HARDWARE = '4relind-stack'
   NAME = 'Sequent Microsystems 4 Relay Card Ver. 4'
 
+  _LIBRARY = lib4relind
+  _GET_ALL = 'get_relay_all'
+  _SET_ALL = 'set_relay_all'
+
   def _device_set(self, device, nr, action):
     return relay4SetV4(device, nr, action)
 
@@ -97,6 +146,10 @@ class terrariumRelay8StackV4(terrariumRelay8Stack):
   HARDWARE = '8relind-stack'
   NAME = 'Sequent Microsystems 8 Relay Card Ver. 4'
 
+  _LIBRARY = lib8relind
+  _GET_ALL = 'get_all'
+  _SET_ALL = 'set_all'
+
   def _device_set(self, device, nr, action):
     return relay8SetV4(device, nr, action)
 
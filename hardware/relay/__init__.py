@@ -3,11 +3,8 @@ import terrariumLogging
 logger = terrariumLogging.logging.getLogger(__name__)
 
 import threading
-import inspect
-from importlib import import_module
-import sys
+import time
 
-from pathlib import Path
 from hashlib import md5
 from operator import itemgetter
 from func_timeout import func_timeout, FunctionTimedOut
@@ -15,7 +12,8 @@ from func_timeout import func_timeout, FunctionTimedOut
 # pip install retry
 from retry import retry
 
-from terrariumUtils import terrariumUtils, terrariumCache, classproperty
+from terrariumUtils import terrariumUtils, terrariumCache, terrariumAsync, classproperty
+from hardware.driver_registry import terrariumHardwareRegistry
 
 class terrariumRelayException(TypeError):
   '''There is a problem with loading a hardware switch. Invalid power switch action.'''
@@ -33,6 +31,133 @@ class terrariumRelayUpdateException(terrariumRelayException):
 class terrariumRelayActionException(terrariumRelayException):
   pass
 
+class terrariumRelayBoard(object):
+  """
+  A physical relay board with multiple channels, where every channel is a separate relay object. The board state is
+  read once and shared by all the channels, and channel changes that are requested at the same time are written to the
+  board in a single action.
+  """
+
+  __READ_MAX_AGE = 5    # in seconds
+  __WRITE_WINDOW = 0.05 # in seconds
+
+  __lock = threading.Lock()
+  __boards = {}
+
+  def __init__(self, key):
+    self.key = key
+
+    self.__bus = threading.RLock()
+    self.__data = None
+    self.__timestamp = 0
+
+    self.__batch_lock = threading.Lock()
+    self.__pending = {}
+    self.__batch = None
+
+  def __repr__(self):
+    return f'Relay board {self.key}'
+
+  @staticmethod
+  def get(key):
+    """
+    Get the shared relay board object for a board key.
+
+    Args:
+        key (str): The unique board key
+
+    Returns:
+        terrariumRelayBoard: The relay board
+    """
+    with terrariumRelayBoard.__lock:
+      if key not in terrariumRelayBoard.__boards:
+        terrariumRelayBoard.__boards[key] = terrariumRelayBoard(key)
+
+      return terrariumRelayBoard.__boards[key]
+
+  def read(self, relay):
+    """
+    Get the state of a single channel. The board is only read when the last board state is too old.
+
+    Args:
+        relay (terrariumRelay): The relay of the channel
+
+    Returns:
+        float: The relay state, or None on errors
+    """
+    with self.__bus:
+      if self.__data is None or time.time() - self.__timestamp > terrariumRelayBoard.__READ_MAX_AGE:
+        self.__data = relay._get_board_value()
+        self.__timestamp = time.time()
+
+      data = self.__data
+
+    return None if data is None else relay._board_channel_value(data)
+
+  def prefetch(self, data):
+    """
+    Store a board state that is read outside the board object, like the concurrent async updates.
+
+    Args:
+        data (any): The board state as returned by _get_board_value()
+    """
+    with self.__bus:
+      self.__data = data
+      self.__timestamp = time.time()
+
+  def write(self, relay, state):
+    """
+    Change the state of a single channel. All the changes that come in during a short window are written together by
+    the first caller, the other callers wait for that result.
+
+    Args:
+        relay (terrariumRelay): The relay of the channel
+        state (float): The new relay state
+
+    Returns:
+        bool: True when the board is updated
+    """
+    with self.__batch_lock:
+      self.__pending[relay.id] = (relay, state)
+      batch = self.__batch
+      leader = batch is None
+      if leader:
+        batch = self.__batch = {'done' : threading.Event(), 'result' : False, 'error' : None}
+
+    if not leader:
+      batch['done'].wait()
+
+    else:
+      try:
+        time.sleep(terrariumRelayBoard.__WRITE_WINDOW)
+        with self.__batch_lock:
+          changes = list(self.__pending.values())
+          self.__pending = {}
+          self.__batch = None
+
+        with self.__bus:
+          # The board state is changed, so read it again on the next update
+          self.__data = None
+          batch['result'] = relay._set_board_value(changes)
+
+        if len(changes) > 1:
+          logger.debug(f'Changed {len(changes)} channels of {self} in a single action.')
+
+      except Exception as ex:
+        batch['error'] = ex
+
+      finally:
+        with self.__batch_lock:
+          if self.__batch is batch:
+            self.__batch = None
+
+        batch['done'].set()
+
+    if batch['error'] is not None:
+      raise batch['error']
+
+    return batch['result']
+
 # Factory class
 class terrariumRelay(object):
   HARDWARE = None
@@ -51,18 +176,8 @@ class terrariumRelay(object):
 
     data = cache.get_data(__CACHE_KEY)
     if data is None:
-      data = {}
-      # Start dynamically loading sensors (based on: https://www.bnmetrics.com/blog/dynamic-import-in-python3)
-      for file in sorted(Path(__file__).parent.glob('*_relay.py')):
-        imported_module = import_module( '.' + file.stem, package='{}'.format(__name__))
-
-        for i in dir(imported_module):
-          attribute = getattr(imported_module, i)
-
-          if inspect.isclass(attribute) and attribute != __cls__ and issubclass(attribute, __cls__):
-            setattr(sys.modules[__name__], file.stem, attribute)
-            data[attribute.HARDWARE] = attribute
-
+      # Only the registry is loaded here. The driver modules are imported when a device needs them
+      data = terrariumHardwareRegistry.drivers(__name__, terrariumRelay, '*_relay.py', scan='_scan_relays')
       cache.set_data(__CACHE_KEY,data,-1)
 
     return data
@@ -83,7 +198,7 @@ class terrariumRelay(object):
     if hardware_type not in known_relays:
       raise terrariumRelayException(f'Relay of hardware type {hardware_type} is unknown.')
 
-    return super(terrariumRelay, cls).__new__(known_relays[hardware_type])
+    return super(terrariumRelay, cls).__new__(known_relays[hardware_type].load())
 
   def __init__(self, device_id, _, address, name = '', prev_state = None, callback = None):
     self._device = {'device'      : None,
@@ -133,7 +248,7 @@ class terrariumRelay(object):
   @retry(terrariumRelayActionException, tries=3, delay=0.5, max_delay=2, logger=logger)
   def __set_hardware_value(self, state):
     try:
-      action_ok = func_timeout(self._UPDATE_TIME_OUT, self._set_hardware_value,(state,))
+      action_ok = func_timeout(self._UPDATE_TIME_OUT, self.__write_hardware_value,(state,))
       if action_ok:
         # Update ok, store the new state
         self._device['value'] = state
@@ -149,7 +264,7 @@ class terrariumRelay(object):
   def __get_hardware_value(self):
     data = None
     try:
-      data = func_timeout(self._UPDATE_TIME_OUT, self._get_hardware_value)
+      data = func_timeout(self._UPDATE_TIME_OUT, self.__read_hardware_value)
 
     except FunctionTimedOut:
       logger.error(f'Error getting new data from relay {self}: Timed out after {self._UPDATE_TIME_OUT} seconds.')
@@ -161,6 +276,30 @@ class terrariumRelay(object):
 
     return data
 
+  def __write_hardware_value(self, state):
+    if self.board_key is None:
+      return self._set_hardware_value(state)
+
+    return terrariumRelayBoard.get(self.board_key).write(self, state)
+
+  def __read_hardware_value(self):
+    if self.board_key is None:
+      return self._get_hardware_value()
+
+    return terrariumRelayBoard.get(self.board_key).read(self)
+
+  @property
+  def board_key(self):
+    """
+    Relays that are a channel of a multi channel board return a board key that is unique per physical board. Those
+    relays implement _get_board_value(), _board_channel_value(data) and _set_board_value(changes), and are read and
+    written through a shared terrariumRelayBoard.
+
+    Returns:
+        str: The board key, or None when the relay is not part of a shared board
+    """
+    return None
+
   @property
   def id(self):
     if self._device['id'] is None and self.address is not None:
@@ -204,7 +343,7 @@ class terrariumRelay(object):
   def state(self):
     return self._device['value']
 
-  def set_state(self, new_state, force = False):
+  def set_state(self, new_state, force = False, notify = True):
     if new_state is None or not (self.OFF <= new_state <= self.ON):
       logger.error(f'Illegal value for relay {self}: {new_state}')
       return False
@@ -225,7 +364,7 @@ class terrariumRelay(object):
         # Fix is to add power and water usage in constructor
         changed = old_state != self.state
 
-    if changed and self.callback is not None:
+    if changed and notify and self.callback is not None:
       self.callback(self.id, new_state)
 
     return changed
@@ -288,52 +427,172 @@ class terrariumRelay(object):
       self._timer.cancel()
       self._timer.join()
 
+  @staticmethod
+  def update_async(relays):
+    """
+    Read all the boards of async relays (_async_get_board_value()) at the same time on the shared asyncio runtime, so a
+    full update round only takes a single network round trip. The relays use the fetched board state on their next update.
+
+    Args:
+        relays (list): terrariumRelay objects
+    """
+    boards = {}
+    for relay in relays:
+      if relay.board_key is not None and hasattr(relay, '_async_get_board_value'):
+        boards.setdefault(relay.board_key, relay)
+
+    if len(boards) == 0:
+      return
+
+    start = time.time()
+    results = terrariumAsync().gather([relay._async_get_board_value() for relay in boards.values()], timeout=terrariumRelay._UPDATE_TIME_OUT)
+    for (board_key, relay), data in zip(boards.items(), results):
+      if data is None or isinstance(data, BaseException):
+        logger.warning(f'Error getting new data from relay {relay}: {data}')
+        continue
+
+      terrariumRelayBoard.get(board_key).prefetch(data)
+
+    logger.debug(f'Updated {len(boards)} async relay boards in {time.time()-start:.2f} seconds.')
+
   # Auto discovery of running/connected power switches
   @staticmethod
   def scan_relays(callback = None, **kwargs):
     for (hardware_type,relay_device) in terrariumRelay.available_hardware.items():
+      # Only import the drivers that can scan
+      if not relay_device.scannable:
+        continue
+
       logger.debug(f'Scanning for {hardware_type} at {relay_device}')
       try:
-        for relay in relay_device._scan_relays(callback, **kwargs):
+        for relay in relay_device.load()._scan_relays(callback, **kwargs):
           yield relay
       except AttributeError as ex:
         # The relay does not support scanning. Just ignore
         logger.debug(f'Relay {relay_device} does not support scanning: {ex}')
 
+class terrariumRelayDimmerFader(object):
+  """
+  Runs the transitions of all the fading dimmers in a single thread. Every tick the new value is calculated from the
+  elapsed time and written to the hardware, but the new state is only reported to the engine (callback) every report
+  interval and at the end of the transition. So a long sunrise does not flood the database and the websockets.
+  """
+
+  __TICK = 0.1              # in seconds
+  __REPORT_INTERVAL = 30.0  # in seconds
+
+  __lock = threading.Lock()
+  __fades = {}
+  __thread = None
+
+  @staticmethod
+  def start(dimmer, to, duration):
+    """
+    Start a transition of a dimmer. A running transition of the same dimmer is replaced.
+
+    Args:
+        dimmer (terrariumRelayDimmer): The dimmer
+        to (float): The end value
+        duration (float): The transition time in seconds
+    """
+    now = time.time()
+    fade = {'dimmer'   : dimmer,
+            'from'     : dimmer.state,
+            'to'       : to,
+            'start'    : now,
+            'duration' : max(terrariumRelayDimmerFader.__TICK, float(duration)),
+            'reported' : now}
+
+    with terrariumRelayDimmerFader.__lock:
+      terrariumRelayDimmerFader.__fades[dimmer.id] = fade
+      if terrariumRelayDimmerFader.__thread is None:
+        terrariumRelayDimmerFader.__thread = threading.Thread(target=terrariumRelayDimmerFader.__run, name='terrariumRelayDimmerFader')
+        terrariumRelayDimmerFader.__thread.start()
+
+  @staticmethod
+  def stop(dimmer):
+    """
+    Stop the running transition of a dimmer at its current value.
+
+    Args:
+        dimmer (terrariumRelayDimmer): The dimmer
+    """
+    with terrariumRelayDimmerFader.__lock:
+      fade = terrariumRelayDimmerFader.__fades.pop(dimmer.id, None)
+
+    if fade is not None:
+      dimmer._fade_step(dimmer.state, True)
+
+  @staticmethod
+  def target(dimmer):
+    """
+    Get the end value of the running transition of a dimmer.
+
+    Args:
+        dimmer (terrariumRelayDimmer): The dimmer
+
+    Returns:
+        float: The end value, or None when the dimmer is not fading
+    """
+    fade = terrariumRelayDimmerFader.__fades.get(dimmer.id)
+    return None if fade is None else fade['to']
+
+  @staticmethod
+  def __run():
+    while True:
+      with terrariumRelayDimmerFader.__lock:
+        if len(terrariumRelayDimmerFader.__fades) == 0:
+          terrariumRelayDimmerFader.__thread = None
+          return
+
+        fades = list(terrariumRelayDimmerFader.__fades.values())
+
+      start = time.time()
+      for fade in fades:
+        progress = min(1.0, (start - fade['start']) / fade['duration'])
+        value = fade['from'] + ((fade['to'] - fade['from']) * progress)
+        finished = progress >= 1.0
+        report = finished or start - fade['reported'] >= terrariumRelayDimmerFader.__REPORT_INTERVAL
+
+        try:
+          fade['dimmer']._fade_step(fade['to'] if finished else value, report)
+        except Exception as ex:
+          logger.error(f'Error fading dimmer {fade["dimmer"]}: {ex}')
+
+        if report:
+          fade['reported'] = start
+
+        if finished:
+          with terrariumRelayDimmerFader.__lock:
+            if terrariumRelayDimmerFader.__fades.get(fade['dimmer'].id) is fade:
+              del(terrariumRelayDimmerFader.__fades[fade['dimmer'].id])
+
+      time.sleep(max(0.0, terrariumRelayDimmerFader.__TICK - (time.time() - start)))
+
 class terrariumRelayDimmer(terrariumRelay):
   TYPE = None
   _DIMMER_MAXDIM = None
+  # Smallest change that is written to the hardware during a transition. Network dimmers use whole percentages
+  _FADE_STEP = 0.1
 
   def __init__(self, id, _, address, name = '', prev_state = None, callback = None):
     self._dimmer_offset = 0
     self._dimmer_state = 0
     self._legacy = False
 
-    self.running = False
-    self.__running = threading.Event()
-    self.__thread = None
     super().__init__(id, _, address, name, prev_state, callback)
 
-  def __run(self, to, duration):
-    self.running = True
-    self.__running.clear()
-
-    current_state = self.state
-    steps = abs(to - current_state)
-    direction = 1 if current_state < to else -1
-    pause_time = duration / steps
-
-    for _ in range(int(steps)):
-      if not self.running:
-        break
+  @property
+  def running(self):
+    return terrariumRelayDimmerFader.target(self) is not None
 
-      current_state += direction
-      self.set_state(current_state)
-      self.__running.wait(timeout=pause_time)
+  def _fade_step(self, value, report):
+    value = round(round(value / self._FADE_STEP) * self._FADE_STEP, 1)
+    if value != self.state:
+      self.set_state(value, notify = False)
 
-    self.__running.set()
-    self.running = False
-    self.__thread = None
+    if report and self.callback is not None:
+      self.callback(self.id, self.state)
 
   def calibrate(self, data):
     dimmer_offset = data.get('dimmer_offset', self._dimmer_offset)
@@ -357,7 +616,7 @@ class terrariumRelayDimmer(terrariumRelay):
     if self._timer is not None and self._timer.is_alive():
       return False
 
-    if self.__thread is not None and self.__thread.is_alive():
+    if self.running:
       return False
 
     changed = self.state != value
@@ -374,10 +633,8 @@ class terrariumRelayDimmer(terrariumRelay):
         self._timer = None
         return self.set_state(value)
 
-      # Start the thread for the dimmer to go to the requested value in duration time
-      self.__thread = threading.Thread(target=self.__run,args=(value, duration))
-      self.__thread.name = f'End_{value}'
-      self.__thread.start()
+      # Let the fader bring the dimmer to the requested value in duration time
+      terrariumRelayDimmerFader.start(self, value, duration)
 
     return changed
 
@@ -386,25 +643,20 @@ class terrariumRelayDimmer(terrariumRelay):
 
   def is_on(self):
     on = super().is_on()
-    if self.__thread is not None and self.__thread.is_alive():
-      thread_on = float(self.__thread.name.split('_')[1])
-      on = (thread_on == self.ON)
+    fade_on = terrariumRelayDimmerFader.target(self)
+    if fade_on is not None:
+      on = (fade_on == self.ON)
 
     return on
 
   def is_off(self):
     off = super().is_off()
-    if self.__thread is not None and self.__thread.is_alive():
-      thread_off = float(self.__thread.name.split('_')[1])
-      off = (thread_off == self.OFF)
+    fade_off = terrariumRelayDimmerFader.target(self)
+    if fade_off is not None:
+      off = (fade_off == self.OFF)
 
     return off
 
   def stop(self):
-    self.running = False
-    self.__running.set()
-
-    if self.__thread is not None:
-      self.__thread.join()
-
+    terrariumRelayDimmerFader.stop(self)
     super().stop()
\ No newline at end of file
@@ -1,9 +1,8 @@
 from . import terrariumRelay
-from terrariumUtils import terrariumUtils, terrariumCache
+from terrariumUtils import terrariumUtils
 
 import subprocess
 import re
-from hashlib import md5
 
 class terrariumRelayDenkoviV2(terrariumRelay):
   HARDWARE = 'denkovi_v2'
@@ -18,11 +17,7 @@ class terrariumRelayDenkoviV2(terrariumRelay):
   def __get_board_type(self):
     return '{}{}'.format(self.__get_relay_count(), self._device['type'])
 
-  def __relay_cache_key(self):
-    return md5(f'{self._device["device"]}'.encode()).hexdigest()
-
   def _load_hardware(self):
-    self.__cache = terrariumCache()
     address = self._address
     if len(address) == 1:
        address.append(1)
@@ -66,32 +61,29 @@ class terrariumRelayDenkoviV2(terrariumRelay):
 
     return self._device['device']
 
-  def _get_hardware_value(self):
-    cache_key = self.__relay_cache_key()
-    data = self.__cache.get_data(cache_key)
-
-    if data is None and not self.__cache.is_running(cache_key):
-      self.__cache.set_running(cache_key)
-      cmd = self.__CMD + [self._device['device'], self.__get_board_type(), 'all', 'status']
+  @property
+  def board_key(self):
+    if self._device['device'] is None:
+      return None
 
-      data = subprocess.check_output(cmd).strip().decode('utf-8').strip()
-      self.__cache.set_data(cache_key, data, cache_timeout = 20)
-      self.__cache.clear_running(cache_key)
+    return f'{self.HARDWARE}-{self._device["device"]}'
 
-    if data is None:
-      return None
+  def _get_board_value(self):
+    cmd = self.__CMD + [self._device['device'], self.__get_board_type(), 'all', 'status']
+    data = subprocess.check_output(cmd).strip().decode('utf-8').strip()
 
     # Make string '0000' to list ['0','0','0','0']
-    data = list(data)
+    return list(data) if '' != data else None
+
+  def _board_channel_value(self, data):
     return self.ON if terrariumUtils.is_true(data[self._device['switch']-1]) else self.OFF
 
-  def _set_hardware_value(self, state):
-    cache_key = self.__relay_cache_key()
-    cmd = self.__CMD + [self._device['device'], self.__get_board_type(), str(self._device['switch']), str(1 if state == self.ON else 0)]
+  def _set_board_value(self, changes):
+    # The command line tool can only switch a single relay per call
+    for (relay, state) in changes:
+      cmd = self.__CMD + [relay._device['device'], relay.__get_board_type(), str(relay._device['switch']), str(1 if state == self.ON else 0)]
+      subprocess.check_output(cmd)
 
-    data = subprocess.check_output(cmd).strip().decode('utf-8').strip()
-    # Data should contain the current relay status for all relais...
-    self.__cache.set_data(cache_key, data, cache_timeout = 20)
     return True
 
 class terrariumRelayDenkoviV2_4(terrariumRelayDenkoviV2):
@@ -3,13 +3,12 @@ import terrariumLogging
 logger = terrariumLogging.logging.getLogger(__name__)
 
 from . import terrariumRelay, terrariumRelayLoadingException, terrariumRelayUpdateException
-from terrariumUtils import terrariumUtils, terrariumCache
+from terrariumUtils import terrariumUtils
 
 import subprocess
 import re
 import sys
 from pathlib import Path
-from hashlib import md5
 
 # Dirty hack to include someone his code... to lazy to make it myself :)
 # https://github.com/perryflynn/energenie-connect0r
@@ -48,33 +47,47 @@ class terrariumRelayEnergenieUSB(terrariumRelay):
 
     raise terrariumRelayLoadingException(f'Could not find the relay {self}.')
 
-  def _set_hardware_value(self, state):
-    action = ('-o' if state == self.ON else '-f')
-    cmd = f'{self.device} -n {action} {self._address[0]}'
+  def _get_hardware_value(self):
+    cmd = f'{self.device} -n -g {self._address[0]}'
     data = terrariumUtils.get_script_data(cmd)
     if data is None:
-      return False
+      return None
 
     data = data.decode('utf-8').strip()
     relay_data = self.__STATUS_REGEX.search(data)
     if relay_data is not None and int(relay_data.group('relay_nr')) == int(self._address[0]):
-      return state == (self.ON if terrariumUtils.is_true(relay_data.group('status')) else self.OFF)
+      return self.ON if terrariumUtils.is_true(relay_data.group('status')) else self.OFF
 
-    return False
+    return None
 
+  @property
+  def board_key(self):
+    if self.device is None:
+      return None
 
-  def _get_hardware_value(self):
-    cmd = f'{self.device} -n -g {self._address[0]}'
-    data = terrariumUtils.get_script_data(cmd)
+    return f'{self.HARDWARE}-{self.device}'
+
+  def _get_board_value(self):
+    data = terrariumUtils.get_script_data(f'{self.device} -n -g all')
     if data is None:
       return None
 
     data = data.decode('utf-8').strip()
-    relay_data = self.__STATUS_REGEX.search(data)
-    if relay_data is not None and int(relay_data.group('relay_nr')) == int(self._address[0]):
-      return self.ON if terrariumUtils.is_true(relay_data.group('status')) else self.OFF
+    return { int(relay_data.group('relay_nr')) : self.ON if terrariumUtils.is_true(relay_data.group('status')) else self.OFF for relay_data in self.__STATUS_REGEX.finditer(data) }
 
-    return None
+  def _board_channel_value(self, data):
+    return data.get(int(self._address[0]))
+
+  def _set_board_value(self, changes):
+    # Switch all the outlets with a single command
+    actions = ' '.join([f'{"-o" if state == self.ON else "-f"} {relay._address[0]}' for (relay, state) in changes])
+    data = terrariumUtils.get_script_data(f'{self.device} -n {actions}')
+    if data is None:
+      return False
+
+    data = data.decode('utf-8').strip()
+    switched = { int(relay_data.group('relay_nr')) : self.ON if terrariumUtils.is_true(relay_data.group('status')) else self.OFF for relay_data in self.__STATUS_REGEX.finditer(data) }
+    return all([switched.get(int(relay._address[0])) == state for (relay, state) in changes])
 
   @staticmethod
   def _scan_relays(callback=None, **kwargs):
@@ -165,45 +178,41 @@ class terrariumRelayEnergenieLAN(terrariumRelay):
     if not self.__connect():
       raise terrariumRelayLoadingException(f'Failed loading relay {self}. Unable to login')
 
-    # Create the cache key for caching the relay states.
-    # This is usefull when there are more then 1 relay per hardware device.
-    self.__cache_key = md5(f'{self.HARDWARE}{address["host"]}'.encode()).hexdigest()
-    self.__cache = terrariumCache()
-
     self.__logout()
 
     return self._device['device']
 
-  def _set_hardware_value(self, state):
-    if not self.__connect():
-      raise terrariumRelayUpdateException(f'Failed changing relay {self}. Unable to login')
-
+  @property
+  def board_key(self):
+    # All the sockets of the same power strip share the status information
     address = self._address
-    toggle_ok = self.device.changesocket(address['nr'], ( 1 if state == self.ON else 0 ))
-    self.__logout()
+    if address is None:
+      return None
 
-    return toggle_ok
+    return f'{self.HARDWARE}-{address["host"]}'
 
-  def _get_hardware_value(self):
-    data = self.__cache.get_data(self.__cache_key)
-    if data is None:
-      # Cache is expired, so we update with new data
-      # Get the overall state information
-      if not self.__connect():
-        raise terrariumRelayUpdateException(f'Failed updating relay {self}. Unable to login')
+  def _get_board_value(self):
+    if not self.__connect():
+      raise terrariumRelayUpdateException(f'Failed updating relay {self}. Unable to login')
+
+    # Get the overall state information
+    data = self.device.getstatus()
+    self.__logout()
 
-      data = self.device.getstatus()
+    return data
 
-      if data is None:
-        return None
+  def _board_channel_value(self, data):
+    return self.ON if terrariumUtils.is_true(data['sockets'][self._address['nr']-1]) else self.OFF
 
-      self.__cache.set_data(self.__cache_key, data, self._CACHE_TIMEOUT)
+  def _set_board_value(self, changes):
+    if not self.__connect():
+      raise terrariumRelayUpdateException(f'Failed changing relay {self}. Unable to login')
 
-    address = self._address
-    status = self.ON if terrariumUtils.is_true(data['sockets'][address['nr']-1]) else self.OFF
+    # Change all the sockets in a single login session
+    toggle_ok = all([self.device.changesocket(relay._address['nr'], ( 1 if state == self.ON else 0 )) for (relay, state) in changes])
     self.__logout()
 
-    return status
+    return toggle_ok
 
   def stop(self):
     self.__logout()
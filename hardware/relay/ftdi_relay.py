@@ -54,6 +54,17 @@ class terrariumRelayFTDI(terrariumRelay):
 
       return (serial,device_type)
 
+  @property
+  def board_key(self):
+    # The bit bang boards can read and write all the relays at once. The serial boards can only switch a single relay
+    if self.device is None or self.device[1] != terrariumRelayFTDI.BITBANG:
+      return None
+
+    return f'{self.HARDWARE}-{self.device[0]}'
+
+  def __bitbang_mask(self):
+    return int(terrariumRelayFTDI.BITBANG_ADDRESSES[str(self._address[0])], 16)
+
   def _set_hardware_value(self, state):
     (device, device_type) = self.device
 
@@ -63,56 +74,33 @@ class terrariumRelayFTDI(terrariumRelay):
         cmd = chr(0xff) + chr(0x0 + self._address[0]) + chr(0x0 + (1 if state == self.ON else 0))
         device.write(cmd)
 
-    elif device_type == terrariumRelayFTDI.BITBANG:
-      with BitBangDevice(device) as device:
-        device.baudrate = 9600
-        if state == self.ON:
-          device.port |=  int(terrariumRelayFTDI.BITBANG_ADDRESSES[str(self._address[0])], 16)
-        else:
-          device.port &= ~int(terrariumRelayFTDI.BITBANG_ADDRESSES[str(self._address[0])], 16)
-
     return True
 
   def _get_hardware_value(self):
+    # As we cannot read out the serial devices, we borrow the current state as the new state....
+    return self.ON if self.state == self.ON else self.OFF
+
+  def _get_board_value(self):
+    with BitBangDevice(self.device[0]) as device:
+      device.baudrate = 9600
+      return device.port
+
+  def _board_channel_value(self, data):
+    return self.ON if data & self.__bitbang_mask() else self.OFF
+
+  def _set_board_value(self, changes):
+    with BitBangDevice(self.device[0]) as device:
+      device.baudrate = 9600
+      data = device.port
+      for (relay, state) in changes:
+        if state == self.ON:
+          data |=  relay.__bitbang_mask()
+        else:
+          data &= ~relay.__bitbang_mask()
 
-    def get_relay_state(data, relay):
-
-      def testBit(int_type, offset):
-        mask = 1 << offset
-        return(int_type & mask)
-
-      if relay == "1":
-        return testBit(data, 1)
-      if relay == "2":
-        return testBit(data, 3)
-      if relay == "3":
-        return testBit(data, 5)
-      if relay == "4":
-        return testBit(data, 7)
-      if relay == "5":
-        return testBit(data, 2)
-      if relay == "6":
-        return testBit(data, 4)
-      if relay == "7":
-        return testBit(data, 6)
-      if relay == "8":
-        return testBit(data, 8)
-
-    data = None
-    (device, device_type) = self.device
-    if device_type == terrariumRelayFTDI.SERIAL:
-      # As we cannot read out this device, we borrow the current state as the new state....
-      data = 1 if self.state == self.ON else 0
-
-    elif device_type == terrariumRelayFTDI.BITBANG:
-      with BitBangDevice(device) as device:
-        device.baudrate = 9600
-        data = int(get_relay_state(device.port, str(self._address[0])))
-
-    if data is None:
-      return None
+      device.port = data
 
-    return self.ON if data > 0 else self.OFF
+    return True
 
   @staticmethod
   def _scan_relays(callback = None, **kwargs):
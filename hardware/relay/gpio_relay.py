@@ -55,6 +55,24 @@ class terrariumRelayGPIO(terrariumRelay):
     else:
       return self.ON if terrariumUtils.is_true(self.device.is_lit) else self.OFF
 
+  @property
+  def board_key(self):
+    # All the relays on the same IO expander chip are written together
+    if not isinstance(self.device, terrariumIOExpander):
+      return None
+
+    return self.device.hardware_key
+
+  def _get_board_value(self):
+    # The expander port states are kept in memory, so there is no need to read the chip
+    return True
+
+  def _board_channel_value(self, data):
+    return self._get_hardware_value()
+
+  def _set_board_value(self, changes):
+    return terrariumIOExpander.set_states([(relay.device, state == self.ON) for (relay, state) in changes])
+
   def stop(self):
     self.device.close()
     super().stop()
@@ -1,12 +1,13 @@
 from . import terrariumRelayDimmer, terrariumRelayLoadingException
 
 # https://www.tindie.com/products/bugrovs2012/i2c-4ch-ac-led-dimmer-module/
-# pip install smbus2
-import smbus2
+from hardware.i2c_bus import terrariumI2CBus
 
 class terrariumDimmerI2C4CH(terrariumRelayDimmer):
   HARDWARE = 'i2c_4ch-dimmer'
   NAME = 'I2C 4Channel LED AC dimmer'
+  # The dimmer only supports whole percentages
+  _FADE_STEP = 1
 
   def _load_hardware(self):
     self._dimmer_state = 0
@@ -31,7 +32,7 @@ class terrariumDimmerI2C4CH(terrariumRelayDimmer):
     return address
 
   def _set_hardware_value(self, state):
-    with smbus2.SMBus(self.device[2]) as bus:
+    with terrariumI2CBus.get(self.device[2]).open() as bus:
       # Select channel
       bus.write_byte(self.device[1], self.device[0])
       # Set dim value
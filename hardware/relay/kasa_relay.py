@@ -4,7 +4,7 @@ logger = terrariumLogging.logging.getLogger(__name__)
 import asyncio
 
 from . import terrariumRelay
-from terrariumUtils import terrariumUtils, terrariumAsync, terrariumCache
+from terrariumUtils import terrariumUtils, terrariumAsync
 
 # pip install python-kasa
 from kasa import Discover, SmartStrip, SmartPlug
@@ -18,71 +18,47 @@ class terrariumRelayTPLinkKasa(terrariumRelay):
     # Input format should be either:
     # - [IP],[POWER_SWITCH_NR]
 
-    # Use an internal caching for speeding things up.
-    self.__state_cache = terrariumCache()
-    self._async = terrariumAsync()
-
     address = self._address
     if len(address) == 1:
       self._device['device'] = SmartPlug(address[0])
-      self._device['switch'] = 0
     else:
       self._device['device'] = SmartStrip(address[0])
-      self._device['switch'] = int(address[1])-1
 
     return self._device['device']
 
+  @property
+  def __switch(self):
+    address = self._address
+    return 0 if len(address) == 1 else int(address[1])-1
 
-  def _set_hardware_value(self, state):
-
-    async def __set_hardware_state(state):
-      await self.device.update()
-      plug = self.device if len(self._address) == 1 else self.device.children[self._device['switch']]
-
-      if state != 0.0:
-        await plug.turn_on()
-      else:
-        await plug.turn_off()
+  @property
+  def board_key(self):
+    # All the plugs of a power strip are read and switched with a single device update
+    return f'{self.HARDWARE}-{self._address[0]}'
 
-      return state
+  def __plugs(self):
+    return [self.device] if len(self._address) == 1 else self.device.children
 
+  async def _async_get_board_value(self):
+    await self.device.update()
+    return [plug.is_on for plug in self.__plugs()]
 
-    data = self.__state_cache.get_data(self._address[0])
-    if data is not None and terrariumUtils.is_true(data[self._device['switch']]) == (state != 0.0):
-      return True
+  def _get_board_value(self):
+    return terrariumAsync().run(self._async_get_board_value(), self._UPDATE_TIME_OUT)
 
-    toggle = asyncio.run_coroutine_threadsafe(__set_hardware_state(state), self._async.async_loop)
-    data = toggle.result()
-    return data == state
+  def _board_channel_value(self, data):
+    return self.ON if len(data) > self.__switch and terrariumUtils.is_true(data[self.__switch]) else self.OFF
 
-  def _get_hardware_value(self):
+  def _set_board_value(self, changes):
 
-    async def __get_hardware_state():
-      data = []
+    async def __set_board_state():
       await self.device.update()
+      plugs = self.__plugs()
+      await asyncio.gather(*[plugs[relay.__switch].turn_on() if state != self.OFF else plugs[relay.__switch].turn_off() for (relay, state) in changes])
 
-      plugs = [self.device] if len(self._address) == 1 else self.device.children
-      for plug in plugs:
-        data.append(plug.is_on)
-
-      return data
-
-    try:
-      data = self.__state_cache.get_data(self._address[0])
-
-      if data is None:
-        toggle = asyncio.run_coroutine_threadsafe(__get_hardware_state(), self._async.async_loop)
-        data = toggle.result()
-
-        self.__state_cache.set_data(self._address[0],data,cache_timeout=20)
-
-      return self.ON if len(data) >= self._device['switch'] and terrariumUtils.is_true(data[self._device['switch']]) else self.OFF
-    except RuntimeError as err:
-      logger.exception(err)
-    except Exception as ex:
-      logger.exception(ex)
+      return True
 
-    return None
+    return terrariumAsync().run(__set_board_state(), self._UPDATE_TIME_OUT)
 
   @staticmethod
   def _scan_relays(callback=None):
@@ -117,10 +93,7 @@ class terrariumRelayTPLinkKasa(terrariumRelay):
 
       return found_devices
 
-    found_devices = []
-    _async_loop = terrariumAsync()
-    data = asyncio.run_coroutine_threadsafe(__scan(), _async_loop.async_loop)
-    found_devices = data.result()
+    found_devices = terrariumAsync().run(__scan())
 
     for device in found_devices:
        yield device
\ No newline at end of file
@@ -2,8 +2,7 @@ from . import terrariumRelayDimmer, terrariumRelayLoadingException
 from terrariumUtils import terrariumCache
 
 # https://github.com/codemercs-com/lw18/blob/main/src/rpi/python/lw18.py
-# pip install smbus2
-import smbus2
+from hardware.i2c_bus import terrariumI2CBus
 
 class terrariumRelayDimmerLEDWarrior18(terrariumRelayDimmer):
   HARDWARE = 'led-warrior18-dimmer'
@@ -20,7 +19,7 @@ class terrariumRelayDimmerLEDWarrior18(terrariumRelayDimmer):
   def ReadPwm16(self):
     #Read 4 byte from device
     buffer = [0,0,0,0]
-    with smbus2.SMBus(self.device[2]) as bus:
+    with terrariumI2CBus.get(self.device[2]).open() as bus:
       buffer = bus.read_i2c_block_data(self.device[1], self.LW18_REG_PWM16, 4)
 
     #Calc INT values for return
@@ -41,7 +40,7 @@ class terrariumRelayDimmerLEDWarrior18(terrariumRelayDimmer):
     buffer[2] = (v2 & 0x00FF)
     buffer[3] = (v2 & 0xFF00) >> 8
 
-    with smbus2.SMBus(self.device[2]) as bus:
+    with terrariumI2CBus.get(self.device[2]).open() as bus:
       bus.write_i2c_block_data(self.device[1], self.LW18_REG_PWM16, buffer)
 
     return 0
@@ -57,7 +56,7 @@ class terrariumRelayDimmerLEDWarrior18(terrariumRelayDimmer):
     buffer[2] = (v2 & 0x00FF)       #LSB
     buffer[3] = (v2 & 0xFF00) >> 8  #MSB
 
-    with smbus2.SMBus(self.device[2]) as bus:
+    with terrariumI2CBus.get(self.device[2]).open() as bus:
       bus.write_i2c_block_data(self.device[1], self.LW18_REG_FREQUENCY, buffer)
 
     return 0
@@ -107,10 +106,12 @@ class terrariumRelayDimmerLEDWarrior18(terrariumRelayDimmer):
     return address
 
   def _set_hardware_value(self, state):
-    pwm = self.ReadPwm16()
-    pwm[self.__relay_nr] = int((float(state) / 100.0) * float(self._DIMMER_DIM))
+    # Keep the bus locked between reading and writing, as both channels are written at once
+    with terrariumI2CBus.get(self.device[2]).open():
+      pwm = self.ReadPwm16()
+      pwm[self.__relay_nr] = int((float(state) / 100.0) * float(self._DIMMER_DIM))
 
-    self.WritePwm16(pwm[0],pwm[1])
+      self.WritePwm16(pwm[0],pwm[1])
 
     return True
 
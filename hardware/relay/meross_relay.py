@@ -5,7 +5,7 @@ logger = terrariumLogging.logging.getLogger(__name__)
 import os
 
 from . import terrariumRelay
-from terrariumUtils import terrariumUtils, terrariumCache
+from terrariumUtils import terrariumUtils
 from terrariumCloud import TerrariumMerossCloud
 
 class terrariumRelayMeross(terrariumRelay):
@@ -13,8 +13,6 @@ class terrariumRelayMeross(terrariumRelay):
   NAME = 'Meross power switches'
 
   def _load_hardware(self):
-    # Use an internal caching for speeding things up.
-    self.__state_cache = terrariumCache()
     EMAIL    = terrariumUtils.decrypt(os.environ.get('MEROSS_EMAIL',''))
     PASSWORD = terrariumUtils.decrypt(os.environ.get('MEROSS_PASSWORD',''))
 
@@ -52,8 +50,17 @@ class terrariumRelayMeross(terrariumRelay):
       logger.error('Meross credentials are not set!')
       return None
 
-    data = self.__state_cache.get_data(self._device['device'])
+    # The cloud keeps the last pushed state of all the devices, so there is no request here
+    cloud = TerrariumMerossCloud.instance
+    if cloud is None:
+      return None
+
+    info = cloud.device_info(self._device['device'])
+    if info is not None and info['expired']:
+      logger.warning(f'The state of {self} is {info["age"]:.0f} seconds old, and could not be refreshed from the Meross cloud.')
+      return None
 
+    data = cloud.get_device_data(self._device['device'])
     if data is None:
       return None
 
@@ -0,0 +1,85 @@
+import terrariumLogging
+logger = terrariumLogging.logging.getLogger(__name__)
+
+from . import terrariumRelay, terrariumRelayDimmer, terrariumRelayLoadingException
+from terrariumUtils import terrariumUtils
+from hardware.mqtt_client import terrariumMQTTClient
+
+class relayMQTTMixin():
+  # Address format: mqtt(s)://[username:password@]host[:port]/state/topic[#json/path][,command/topic]
+  # When there is no command topic, '/set' is added to the state topic
+
+  def _load_hardware(self):
+    address = self._address
+    try:
+      client, mqtt_address = terrariumMQTTClient.connect(address[0])
+    except Exception as ex:
+      raise terrariumRelayLoadingException(f'Invalid MQTT address for relay {self}: {ex}')
+
+    command_topic = address[1].strip('/') if len(address) > 1 and '' != address[1].strip('/') else f'{mqtt_address["topic"]}/set'
+
+    return (client, mqtt_address['topic'], mqtt_address['json_path'], command_topic)
+
+  def load_hardware(self):
+    super().load_hardware()
+    self.device[0].subscribe(self.device[1], self.__push)
+
+  def __decode(self, payload):
+    try:
+      value = terrariumMQTTClient.decode(payload, self.device[2])
+    except Exception as ex:
+      logger.debug(f'Invalid payload {payload} for relay {self}: {ex}')
+      return None
+
+    if terrariumUtils.is_float(value):
+      value = float(value)
+    elif str(value).lower() in ['on','off','true','false']:
+      value = self.ON if terrariumUtils.is_true(value) else self.OFF
+    else:
+      return None
+
+    if not self.is_dimmer:
+      value = self.ON if value != self.OFF else self.OFF
+
+    return value
+
+  def __push(self, payload):
+    # The relay reports its (new) state. When it is changed outside TerrariumPI, report it directly
+    value = self.__decode(payload)
+    if value is None or value == self.state:
+      return
+
+    self._device['value'] = value
+    if self.callback is not None:
+      self.callback(self.id, value)
+
+  def _set_hardware_value(self, state):
+    return self.device[0].publish(self.device[3], f'{state:.0f}')
+
+  def _get_hardware_value(self):
+    # No I/O here. Only the last received state is used
+    payload = self.device[0].get_value(self.device[1])
+
+    # When the relay never reported its state, return the current state from memory
+    if payload is None:
+      return self.state
+
+    return self.__decode(payload)
+
+  def stop(self):
+    if self.device is not None:
+      self.device[0].unsubscribe(self.device[1], self.__push)
+
+    super().stop()
+
+
+class terrariumRelayMQTT(relayMQTTMixin, terrariumRelay):
+  HARDWARE = 'mqtt'
+  NAME = 'MQTT power switch (push)'
+
+
+class terrariumRelayDimmerMQTT(relayMQTTMixin, terrariumRelayDimmer):
+  HARDWARE = 'mqtt-dimmer'
+  NAME = 'MQTT dimmer (push)'
+  # Network dimmer, so do not send more than whole percentages
+  _FADE_STEP = 1
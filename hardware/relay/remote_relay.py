@@ -26,6 +26,8 @@ class terrariumRelayRemote(terrariumRelay):
 class terrariumRelayDimmerRemote(terrariumRelayDimmer):
   HARDWARE = 'remote-dimmer'
   NAME = 'Remote dimmer (API)'
+  # Network dimmer, so do not send more than whole percentages
+  _FADE_STEP = 1
 
   def _load_hardware(self):
     if terrariumUtils.parse_url(self.address):
@@ -53,4 +53,6 @@ class terrariumRelayScript(relayScriptMixin, terrariumRelay):
 
 class terrariumDimmerScript(relayScriptMixin, terrariumRelayDimmer):
   HARDWARE = 'script-dimmer'
-  NAME = 'Script dimmer'
\ No newline at end of file
+  NAME = 'Script dimmer'
+  # Every change starts the script, so do not run it for less than whole percentages
+  _FADE_STEP = 1
\ No newline at end of file
@@ -96,6 +96,8 @@ class terrariumRelaySonoff(terrariumRelay):
 class terrariumRelayDimmerSonoffD1(terrariumRelayDimmer):
   HARDWARE = 'sonoff_d1-dimmer'
   NAME = 'Sonoff D1 Dimmer (Tasmota)'
+  # Network dimmer, so do not send more than whole percentages
+  _FADE_STEP = 1
 
   __URL_REGEX = re.compile(r'^(?P<protocol>https?):\/\/((?P<user>[^:]+):(?P<passwd>[^@]+)@)?(?P<host>[^#\/]+)(\/)?(#(?P<nr>\d+))?$',re.IGNORECASE)
 
@@ -1,7 +1,91 @@
+import terrariumLogging
+logger = terrariumLogging.logging.getLogger(__name__)
+
 from . import terrariumSensor, terrariumSensorLoadingException
 
 from pathlib import Path
+from time import time, sleep
 import re
+import threading
+
+class terrarium1WireBus(object):
+  """
+  Reads all the temperature sensors on a 1-Wire bus master at once. A single bulk conversion is started on the whole
+  bus, and then the values of all the sensors are read, so the bus only waits for one conversion instead of one per sensor.
+  """
+
+  __MAX_AGE = 10 # in seconds
+  __CONVERSION_TIMEOUT = 2.0 # in seconds
+
+  __lock = threading.Lock()
+  __buses = {}
+
+  def __init__(self, master):
+    self.master = master
+    self.__lock = threading.Lock()
+    self.__values = {}
+    self.__timestamp = 0
+
+  @staticmethod
+  def get(device):
+    """
+    Get the bus of a 1-Wire sensor, when the bus master supports bulk conversions.
+
+    Args:
+        device (Path): Path to the w1_slave file of the sensor
+
+    Returns:
+        terrarium1WireBus: The bus, or None when the sensor can not be read in bulk
+    """
+    # The sensor folder is a child of the bus master folder
+    sensor = device.parent.resolve()
+    master = sensor.parent
+    if not master.joinpath('therm_bulk_read').exists() or not sensor.joinpath('temperature').exists():
+      return None
+
+    with terrarium1WireBus.__lock:
+      if master not in terrarium1WireBus.__buses:
+        terrarium1WireBus.__buses[master] = terrarium1WireBus(master)
+
+      return terrarium1WireBus.__buses[master]
+
+  def __bulk_read(self):
+    start = time()
+    bulk = self.master.joinpath('therm_bulk_read')
+    bulk.write_text('trigger\n')
+
+    # -1 means that at least one sensor is still converting
+    while '-1' == bulk.read_text().strip() and time() - start < terrarium1WireBus.__CONVERSION_TIMEOUT:
+      sleep(0.05)
+
+    values = {}
+    for sensor in self.master.glob('[0-9a-f][0-9a-f]-*'):
+      try:
+        # Reading the temperature after a bulk conversion returns the converted value without a new conversion
+        values[sensor.name] = float(sensor.joinpath('temperature').read_text().strip()) / 1000.0
+      except Exception as ex:
+        logger.debug(f'Could not read 1-Wire sensor {sensor.name} on {self.master.name}: {ex}')
+
+    logger.debug(f'Read {len(values)} 1-Wire sensors on {self.master.name} in {time()-start:.2f} seconds.')
+    return values
+
+  def temperature(self, sensor):
+    """
+    Get the temperature of a sensor on this bus. A new bulk conversion is only done when the last values are too old,
+    so a sensor that could not be read does not trigger new conversions for all the other sensors on the bus.
+
+    Args:
+        sensor (str): The sensor id (folder name)
+
+    Returns:
+        float: The temperature, or None when the sensor could not be read in the last bulk conversion
+    """
+    with self.__lock:
+      if time() - self.__timestamp > terrarium1WireBus.__MAX_AGE:
+        self.__values = self.__bulk_read()
+        self.__timestamp = time()
+
+      return self.__values.get(sensor)
 
 class terrarium1WireSensor(terrariumSensor):
   HARDWARE = '1wire'
@@ -23,6 +107,12 @@ class terrarium1WireSensor(terrariumSensor):
     raise terrariumSensorLoadingException(f'Unable to load sensor {self.HARDWARE} {self.name} at address {self.address}: Invalid path.')
 
   def _get_data(self):
+    if 'temperature' == self.sensor_type:
+      bus = terrarium1WireBus.get(self.device)
+      if bus is not None:
+        value = bus.temperature(self.device.parent.name)
+        return None if value is None else {'temperature' : value}
+
     data = None
     with self.device.open('r') as sensor:
       sensor_data = terrarium1WireSensor.__W1_TEMP_REGEX.search(sensor.read())
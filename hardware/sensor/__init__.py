@@ -2,12 +2,12 @@
 import terrariumLogging
 logger = terrariumLogging.logging.getLogger(__name__)
 
-from pathlib import Path
-import inspect
-from importlib import import_module
-import sys
 import statistics
+import threading
+from collections import deque
+from contextlib import contextmanager, nullcontext
 from hashlib import md5
+from struct import unpack, calcsize
 from time import time, sleep
 from operator import itemgetter
 from func_timeout import func_timeout, FunctionTimedOut
@@ -15,14 +15,10 @@ from func_timeout import func_timeout, FunctionTimedOut
 import RPi.GPIO as GPIO
 # pip install retry
 from retry import retry
-# For analog sensors
-from gpiozero import MCP3008
-# For I2C sensors
-import smbus2
-# Bluetooth sensors
-from bluepy.btle import Scanner
 
 from terrariumUtils import terrariumUtils, terrariumCache, classproperty
+from hardware.driver_registry import terrariumHardwareRegistry
+from hardware.i2c_bus import terrariumI2CBus
 
 class terrariumSensorException(TypeError):
   '''There is a problem with loading a hardware sensor.'''
@@ -58,31 +54,20 @@ class terrariumSensor(object):
 
     known_sensors = cache.get_data(__CACHE_KEY)
     if known_sensors is None:
-      known_sensors = {}
-      all_types = []
-      # Start dynamically loading sensors (based on: https://www.bnmetrics.com/blog/dynamic-import-in-python3)
-      for file in sorted(Path(__file__).parent.glob('*_sensor.py')):
-        imported_module = import_module( '.' + file.stem, package='{}'.format(__name__))
-
-        for i in dir(imported_module):
-          attribute = getattr(imported_module, i)
-
-          if inspect.isclass(attribute) and attribute != __cls__ and issubclass(attribute, __cls__):
-            setattr(sys.modules[__name__], file.stem, attribute)
-            if attribute.HARDWARE is not None:
-              known_sensors[attribute.HARDWARE] = attribute
-              all_types += attribute.TYPES
-
-      # Update sensors that do not have a known type. Those are remote and scripts sensors
-      all_types = list(set(all_types))
-      for hardware in known_sensors:
-        if len(known_sensors[hardware].TYPES) == 0:
-          known_sensors[hardware].TYPES = all_types
-
+      # Only the registry is loaded here. The driver modules are imported when a sensor needs them
+      known_sensors = terrariumHardwareRegistry.drivers(__name__, terrariumSensor, '*_sensor.py', update=terrariumSensor.__update_driver_types, scan='_scan_sensors')
       cache.set_data(__CACHE_KEY,known_sensors,-1)
 
     return known_sensors
 
+  @staticmethod
+  def __update_driver_types(drivers):
+    # Update sensors that do not have a known type. Those are remote and scripts sensors
+    all_types = list(set([sensor_type for driver in drivers for sensor_type in driver['attributes']['TYPES']]))
+    for driver in drivers:
+      if len(driver['attributes']['TYPES']) == 0:
+        driver['attributes']['TYPES'] = all_types
+
   # Return a list with type and names of supported switches
   @classproperty
   def available_sensors(__cls__):
@@ -120,7 +105,7 @@ class terrariumSensor(object):
     if sensor_type not in known_sensors[hardware_type].TYPES:
       raise terrariumSensorInvalidSensorTypeException(f'Hardware does not have a {sensor_type} sensor at address {address} with name {name}')
 
-    return super(terrariumSensor, cls).__new__(known_sensors[hardware_type])
+    return super(terrariumSensor, cls).__new__(known_sensors[hardware_type].load())
 
   def __init__(self, id, _, sensor_type, address, name = '', unit_value_callback = None, trigger_callback = None):
     self._device = {'id'             : None,
@@ -291,6 +276,10 @@ class terrariumSensor(object):
 
     return data
 
+  def _push_data(self, data):
+    # For hardware that pushes its values. Merge the new values in the shared cache, so the next update does not need to read the hardware
+    cached_data = self._sensor_cache.get_data(self.__sensor_cache_key, {})
+    self._sensor_cache.set_data(self.__sensor_cache_key, {**cached_data, **data}, self._CACHE_TIMEOUT)
 
   def update(self, force = False):
     if self._device['device'] is None:
@@ -319,6 +308,16 @@ class terrariumSensor(object):
       self._device['value'] = current
       return current
 
+  @property
+  def update_group(self):
+    """
+    Sensors with the same update group share hardware (like an I2C bus or multiplexer channel), and are updated after each other.
+
+    Returns:
+        str: The update group
+    """
+    return ''
+
   def stop(self):
     if self._device['power_mngt'] is not None:
       GPIO.cleanup(self._device['power_mngt'])
@@ -331,41 +330,175 @@ class terrariumSensor(object):
   @staticmethod
   def scan_sensors(unit_value_callback = None, trigger_callback = None, **kwargs):
     for (_,sensor_device) in terrariumSensor.available_hardware.items():
+      # Only import the drivers that can scan
+      if not sensor_device.scannable:
+        continue
+
       try:
-        for sensor in sensor_device._scan_sensors(unit_value_callback, trigger_callback, **kwargs):
+        for sensor in sensor_device.load()._scan_sensors(unit_value_callback, trigger_callback, **kwargs):
           yield sensor
       except AttributeError:
         # Scanning not supported, just ignore
         pass
 
+class terrariumAnalogSampler(object):
+  """
+  Samples all the used channels of an MCP3008 analog converter continuously in the background into ring buffers. Analog
+  sensors get a filtered value from the buffer right away, instead of waiting for new samples on every update.
+  """
+
+  __BUFFER_SIZE = 25 # amount of samples per channel
+  __TRIM = 0.2       # part of the lowest and the highest samples that is ignored for the trimmed mean
+
+  __lock = threading.Lock()
+  __samplers = {}
+
+  def __init__(self, device, interval):
+    self.device = device
+    self.interval = interval
+
+    self.__lock = threading.Lock()
+    self.__channels = {}
+    self.__exit = threading.Event()
+
+    self.__thread = threading.Thread(target=self.__run, name=f'terrariumAnalogSampler_spi{device}', daemon=True)
+    self.__thread.start()
+
+  def __repr__(self):
+    return f'MCP3008 analog sampler on SPI device {self.device}'
+
+  @staticmethod
+  def get(device = 0, interval = 0.2):
+    """
+    Get the sampler of an analog converter. The sampler is started when it is not running yet.
+
+    Args:
+        device (int): The SPI chip select number of the analog converter
+        interval (float): Time in seconds between two samples of a channel. The shortest requested interval is used
+
+    Returns:
+        terrariumAnalogSampler: The sampler
+    """
+    with terrariumAnalogSampler.__lock:
+      if device not in terrariumAnalogSampler.__samplers:
+        terrariumAnalogSampler.__samplers[device] = terrariumAnalogSampler(device, interval)
+
+      sampler = terrariumAnalogSampler.__samplers[device]
+      sampler.interval = min(sampler.interval, interval)
+      return sampler
+
+  def __sample(self, channel):
+    value = self.__channels[channel]['adc'].value
+    if terrariumUtils.is_float(value):
+      self.__channels[channel]['samples'].append(float(value))
+
+  def __run(self):
+    while not self.__exit.wait(self.interval):
+      with self.__lock:
+        for channel in self.__channels:
+          try:
+            self.__sample(channel)
+          except Exception as ex:
+            logger.debug(f'Could not sample channel {channel} of {self}: {ex}')
+
+  def add(self, channel):
+    """
+    Start sampling a channel.
+
+    Args:
+        channel (int): The analog channel (0-7)
+    """
+    # For analog sensors. Only imported when an analog sensor is used
+    from gpiozero import MCP3008
+
+    with self.__lock:
+      if channel not in self.__channels:
+        self.__channels[channel] = {
+          'adc'     : MCP3008(channel=channel, device=self.device),
+          'samples' : deque(maxlen=terrariumAnalogSampler.__BUFFER_SIZE)
+        }
+
+  def remove(self, channel):
+    with self.__lock:
+      channel = self.__channels.pop(channel, None)
+
+    if channel is not None:
+      channel['adc'].close()
+
+  def value(self, channel, median = False):
+    """
+    Get the filtered value of a channel from the sample buffer. When there are no samples yet, a sample is taken directly.
+
+    Args:
+        channel (int): The analog channel (0-7)
+        median (bool): Return the median instead of the trimmed mean
+
+    Returns:
+        float: The filtered value between 0 and 1, or None when the channel could not be sampled
+    """
+    self.add(channel)
+
+    with self.__lock:
+      if len(self.__channels[channel]['samples']) == 0:
+        self.__sample(channel)
+
+      values = sorted(self.__channels[channel]['samples'])
+
+    if len(values) == 0:
+      return None
+
+    if median:
+      return statistics.median(values)
+
+    # Calculate average. Exclude the lowest and highest values
+    trim = int(len(values) * terrariumAnalogSampler.__TRIM)
+    return statistics.mean(values[trim:len(values)-trim])
+
+  @staticmethod
+  def stop():
+    with terrariumAnalogSampler.__lock:
+      samplers = list(terrariumAnalogSampler.__samplers.values())
+      terrariumAnalogSampler.__samplers = {}
+
+    for sampler in samplers:
+      sampler.__exit.set()
+      sampler.__thread.join()
+      for channel in list(sampler.__channels.keys()):
+        sampler.remove(channel)
+
 class terrariumAnalogSensor(terrariumSensor):
   HARDWARE = None
   TYPES = []
   NAME = None
 
-  __AMOUNT_OF_MEASUREMENTS = 5
+  # Sampling of the analog converter in the background
+  _SAMPLE_INTERVAL = 0.2 # in seconds
+  _SAMPLE_MEDIAN   = False
+
+  @property
+  def __channel(self):
+    return int(self._address[0])
 
   def _load_hardware(self):
     address = self._address
-    # Load the analog converter here
-    device = MCP3008(channel=int(address[0]), device=0 if len(address) == 1 or int(address[1]) < 0 else int(address[1]))
+    # Load the sampler of the analog converter here
+    device = terrariumAnalogSampler.get(0 if len(address) == 1 or int(address[1]) < 0 else int(address[1]), self._SAMPLE_INTERVAL)
+    device.add(self.__channel)
     return device
 
   def _get_data(self):
     # This will return the measured voltage of the analog device.
-    values = []
-    for _ in range(self.__AMOUNT_OF_MEASUREMENTS):
-      value = self.device.value
-      if terrariumUtils.is_float(value):
-        values.append(float(value))
-      sleep(0.2)
-
-    # sort values from low to high
-    values.sort()
-    # Calculate average. Exclude the min and max value.
-    return statistics.mean(values[1:-1])
+    return self.device.value(self.__channel, self._SAMPLE_MEDIAN)
+
+  def stop(self):
+    if self.device is not None:
+      self.device.remove(self.__channel)
+
+    super().stop()
 
 class terrariumI2CSensor(terrariumSensor):
+  # Address part with an optional TCA9548A multiplexer ([mux_address]-[channel]). None is no multiplexer support
+  _I2C_MUX_INDEX = None
 
   @property
   def _address(self):
@@ -377,14 +510,35 @@ class terrariumI2CSensor(terrariumSensor):
 
     return address
 
-  def _open_hardware(self):
+  @property
+  def _i2c_bus(self):
     address = self._address
+    return 1 if len(address) == 1 or int(address[1]) < 1 else int(address[1])
+
+  @property
+  def _i2c_mux(self):
+    if self._I2C_MUX_INDEX is None:
+      return None
 
-    return smbus2.SMBus(1 if len(address) == 1 or int(address[1]) < 1 else int(address[1]))
+    address = self._address
+    return terrariumI2CBus.parse_mux(address[self._I2C_MUX_INDEX]) if len(address) > self._I2C_MUX_INDEX else None
+
+  @property
+  def update_group(self):
+    try:
+      mux = self._i2c_mux
+      return f'i2c-{self._i2c_bus}' + ('' if mux is None else f'-{mux[0]:#04x}-{mux[1]}')
+    except Exception as ex:
+      logger.debug(f'Invalid I2C address for sensor {self}: {ex}')
+      return 'i2c'
+
+  def _open_hardware(self):
+    # Exclusive access to the shared bus handle, with the multiplexer channel selected
+    return terrariumI2CBus.get(self._i2c_bus).open(self._i2c_mux)
 
   def _load_hardware(self):
     address = self._address
-    device  = (address[0], smbus2.SMBus(1 if len(address) == 1 or int(address[1]) < 1 else int(address[1])))
+    device  = (address[0], terrariumI2CBus.get(self._i2c_bus))
     return device
 
 class terrariumI2CSensorMixin():
@@ -443,11 +597,11 @@ Added option for different I2C bus
 
 class TCA9548A(object):
     def __init__(self, address, bus = 1):
-        """Init smbus channel and tca driver on specified address."""
+        """Init shared I2C bus and tca driver on specified address."""
         try:
             self.PORTS_COUNT = 8     # number of switches
 
-            self.i2c_bus = smbus2.SMBus(bus)
+            self.i2c_bus = terrariumI2CBus.get(bus)
             self.i2c_address = address
             if self.get_control_register() is None:
                 raise ValueError
@@ -460,9 +614,9 @@ class TCA9548A(object):
             self.i2c_bus = None
 
     def get_control_register(self):
-        """Read value (length: 1 byte) from control register."""
+        """Get value (length: 1 byte) of control register. Only read from the chip when it is not known yet."""
         try:
-            value = self.i2c_bus.read_byte(self.i2c_address)
+            value = self.i2c_bus.mux_register(self.i2c_address)
             return value
         except:
             return None
@@ -482,7 +636,8 @@ class TCA9548A(object):
         try:
             if value < 0 or value > 255:
                 return False
-            self.i2c_bus.write_byte(self.i2c_address, value)
+            if value != self.get_control_register():
+                self.i2c_bus.set_mux_register(self.i2c_address, value)
             return True
         except:
             return False
@@ -507,6 +662,320 @@ class TCA9548A(object):
         """Driver destructor."""
         self.i2c_bus = None
 
+class terrariumBluetoothHelpers(object):
+  """
+  Keeps track of the bluepy-helper processes that are started for the bluetooth sensors. Hanging helper processes can
+  then be killed based on their age, without scanning the full process tree.
+  """
+
+  __MAX_AGE = 60 # in seconds
+
+  __lock = threading.Lock()
+  __processes = {}
+  __installed = False
+
+  @staticmethod
+  def install():
+    # The helper processes are started inside bluepy (also when used through btlewrap), so register them when they are started and stopped
+    with terrariumBluetoothHelpers.__lock:
+      if terrariumBluetoothHelpers.__installed:
+        return
+
+      # Bluetooth sensors. Only imported when a bluetooth sensor is used
+      from bluepy.btle import BluepyHelper
+
+      bluepy_start_helper = BluepyHelper._startHelper
+      bluepy_stop_helper  = BluepyHelper._stopHelper
+
+      def tracked_start_helper(self, *args, **kwargs):
+        bluepy_start_helper(self, *args, **kwargs)
+        terrariumBluetoothHelpers.track(getattr(self, '_helper', None))
+
+      def tracked_stop_helper(self, *args, **kwargs):
+        helper = getattr(self, '_helper', None)
+        bluepy_stop_helper(self, *args, **kwargs)
+        terrariumBluetoothHelpers.untrack(helper)
+
+      BluepyHelper._startHelper = tracked_start_helper
+      BluepyHelper._stopHelper  = tracked_stop_helper
+      terrariumBluetoothHelpers.__installed = True
+
+  @staticmethod
+  def track(process):
+    if process is None:
+      return
+
+    with terrariumBluetoothHelpers.__lock:
+      terrariumBluetoothHelpers.__processes[process.pid] = (process, time())
+
+  @staticmethod
+  def untrack(process):
+    if process is None:
+      return
+
+    with terrariumBluetoothHelpers.__lock:
+      terrariumBluetoothHelpers.__processes.pop(process.pid, None)
+
+  @staticmethod
+  def reap(max_age = None):
+    """
+    Kill the helper processes that are running longer than max_age seconds, and forget the stopped ones.
+
+    Returns:
+        int: Amount of killed helper processes
+    """
+    max_age = terrariumBluetoothHelpers.__MAX_AGE if max_age is None else max_age
+    now = time()
+    killed = 0
+
+    with terrariumBluetoothHelpers.__lock:
+      processes = list(terrariumBluetoothHelpers.__processes.items())
+
+    for pid, (process, start) in processes:
+      if process.poll() is None:
+        if now - start < max_age:
+          continue
+
+        try:
+          logger.warning(f'Killing hanging bluetooth helper process {pid}')
+          process.kill()
+          process.wait(1)
+          killed += 1
+        except Exception as ex:
+          logger.error(f'Error killing hanging bluetooth helper process {pid}: {ex}')
+          continue
+
+      with terrariumBluetoothHelpers.__lock:
+        if pid in terrariumBluetoothHelpers.__processes and terrariumBluetoothHelpers.__processes[pid][0] is process:
+          del(terrariumBluetoothHelpers.__processes[pid])
+
+    return killed
+
+class terrariumBluetoothCollector(object):
+  """
+  Passive Bluetooth LE scanner that runs continuously per adapter and decodes the advertisement frames of the Xiaomi
+  sensors (MiBeacon, and the ATC/pvvx custom firmware) into a shared cache. The bluetooth sensors read their values
+  from this cache, and only connect to the sensor when the broadcasted data is not complete (like encrypted frames).
+  """
+
+  __SCAN_INTERVAL = 1.0 # in seconds
+  __RETRY_TIMEOUT = 30  # in seconds
+  __MAX_AGE = 5 * 60    # in seconds
+
+  # 16 bit service data UUIDs (little endian)
+  __UUID_MIBEACON = b'\x95\xfe'
+  __UUID_ENVIRONMENTAL = b'\x1a\x18'
+
+  # MiBeacon object type: (name, struct format, divider)
+  __MIBEACON_OBJECTS = {
+    0x1004 : [('temperature', '<h', 10.0)],
+    0x1006 : [('humidity',    '<H', 10.0)],
+    0x1007 : [('light',       '<I', 1.0)],
+    0x1008 : [('moisture',    '<B', 1.0)],
+    0x1009 : [('fertility',   '<H', 1.0)],
+    0x100A : [('battery',     '<B', 1.0)],
+    0x100D : [('temperature', '<h', 10.0), ('humidity', '<H', 10.0)],
+  }
+
+  __lock = threading.Lock()
+  __collectors = {}
+  __data = {}
+
+  def __init__(self, adapter):
+    self.adapter = adapter
+
+    self.__exit = threading.Event()
+    self.__condition = threading.Condition()
+    self.__paused = 0
+    self.__scanning = False
+
+    self.__thread = threading.Thread(target=self.__run, name=f'terrariumBluetoothCollector_hci{adapter}', daemon=True)
+    self.__thread.start()
+
+  @staticmethod
+  def _store(address, values):
+    if len(values) == 0:
+      return
+
+    now = time()
+    with terrariumBluetoothCollector.__lock:
+      data = terrariumBluetoothCollector.__data.setdefault(address.lower(), {})
+      for key, value in values.items():
+        data[key] = (value, now)
+
+  @staticmethod
+  def _decode(service_data):
+    """
+    Decode the 16 bit service data of an advertisement frame.
+
+    Args:
+        service_data (bytes): The service data, starting with the 16 bit UUID
+
+    Returns:
+        dict: The decoded sensor values
+    """
+    values = {}
+    uuid, payload = service_data[:2], service_data[2:]
+
+    if terrariumBluetoothCollector.__UUID_MIBEACON == uuid and len(payload) >= 5:
+      frame_control = unpack('<H', payload[:2])[0]
+      if frame_control & 0x08:
+        # Encrypted frame, only readable with the bind key
+        return values
+
+      position = 5
+      if frame_control & 0x10:
+        # MAC address included
+        position += 6
+      if frame_control & 0x20:
+        # Capability included
+        position += 1
+
+      if frame_control & 0x40 and len(payload) >= position + 3:
+        object_type, length = unpack('<HB', payload[position:position+3])
+        value = payload[position+3:position+3+length]
+        for (offset, (name, struct_format, divider)) in zip([0, 2], terrariumBluetoothCollector.__MIBEACON_OBJECTS.get(object_type, [])):
+          # Pad the 24 bit illuminance value
+          size = calcsize(struct_format)
+          values[name] = unpack(struct_format, value[offset:offset+size].ljust(size, b'\x00'))[0] / divider
+
+    elif terrariumBluetoothCollector.__UUID_ENVIRONMENTAL == uuid:
+      if len(payload) == 13:
+        # ATC firmware: big endian
+        temperature, humidity, battery = unpack('>hBB', payload[6:10])
+        values = {'temperature' : temperature / 10.0, 'humidity' : float(humidity), 'battery' : float(battery)}
+      elif len(payload) in [15, 16]:
+        # pvvx firmware: little endian
+        temperature, humidity, _, battery = unpack('<hHHB', payload[6:13])
+        values = {'temperature' : temperature / 100.0, 'humidity' : humidity / 100.0, 'battery' : float(battery)}
+
+    if 'fertility' in values:
+      values['conductivity'] = values['fertility']
+
+    return values
+
+  def __run(self):
+    from bluepy.btle import Scanner, DefaultDelegate
+
+    class BroadcastDelegate(DefaultDelegate):
+      def handleDiscovery(self, device, is_new_device, is_new_data):
+        if not is_new_data:
+          return
+
+        service_data = device.getValueText(0x16)
+        if service_data is None:
+          return
+
+        try:
+          terrariumBluetoothCollector._store(device.addr, terrariumBluetoothCollector._decode(bytes.fromhex(service_data)))
+        except Exception as ex:
+          logger.debug(f'Could not decode bluetooth advertisement from {device.addr}: {ex}')
+
+    scanner = None
+    while not self.__exit.is_set():
+      with self.__condition:
+        # Wait while there are active connections on this adapter
+        self.__condition.wait_for(lambda: self.__paused == 0 or self.__exit.is_set())
+        self.__scanning = True
+
+      try:
+        if scanner is None:
+          scanner = Scanner(self.adapter).withDelegate(BroadcastDelegate())
+          scanner.start(passive=True)
+          # The scanner helper runs as long as the collector, so it should not be killed as a hanging helper
+          terrariumBluetoothHelpers.untrack(getattr(scanner, '_helper', None))
+
+        scanner.process(terrariumBluetoothCollector.__SCAN_INTERVAL)
+
+      except Exception as ex:
+        logger.debug(f'Bluetooth collector on hci{self.adapter} stopped scanning: {ex}')
+        scanner = self.__stop_scanner(scanner)
+        self.__exit.wait(terrariumBluetoothCollector.__RETRY_TIMEOUT)
+
+      if self.__paused > 0 or self.__exit.is_set():
+        scanner = self.__stop_scanner(scanner)
+
+      with self.__condition:
+        self.__scanning = scanner is not None
+        self.__condition.notify_all()
+
+    self.__stop_scanner(scanner)
+
+  def __stop_scanner(self, scanner):
+    if scanner is not None:
+      try:
+        scanner.stop()
+      except Exception as ex:
+        logger.debug(f'Error stopping the bluetooth collector on hci{self.adapter}: {ex}')
+
+    return None
+
+  @contextmanager
+  def __pause(self):
+    with self.__condition:
+      self.__paused += 1
+      self.__condition.wait_for(lambda: not self.__scanning, timeout=terrariumBluetoothCollector.__SCAN_INTERVAL * 5)
+
+    try:
+      yield
+    finally:
+      with self.__condition:
+        self.__paused -= 1
+        self.__condition.notify_all()
+
+  @staticmethod
+  def start(adapter = 0):
+    with terrariumBluetoothCollector.__lock:
+      if adapter not in terrariumBluetoothCollector.__collectors:
+        terrariumBluetoothCollector.__collectors[adapter] = terrariumBluetoothCollector(adapter)
+
+      return terrariumBluetoothCollector.__collectors[adapter]
+
+  @staticmethod
+  def get(address, adapter = 0):
+    """
+    Get the broadcasted values of a sensor. The collector of the adapter is started when it is not running yet.
+
+    Args:
+        address (str): The MAC address of the sensor
+        adapter (int): The bluetooth adapter number
+
+    Returns:
+        dict: The values that are not too old
+    """
+    terrariumBluetoothCollector.start(adapter)
+    now = time()
+    with terrariumBluetoothCollector.__lock:
+      data = terrariumBluetoothCollector.__data.get(address.lower(), {})
+      return { key : value for key, (value, timestamp) in data.items() if now - timestamp <= terrariumBluetoothCollector.__MAX_AGE }
+
+  @staticmethod
+  def active_connection(adapter = 0):
+    """
+    Pause the passive scanning on an adapter during an active connection or scan.
+
+    Args:
+        adapter (int): The bluetooth adapter number
+
+    Returns:
+        contextmanager: Context in which the adapter is free
+    """
+    collector = terrariumBluetoothCollector.__collectors.get(adapter)
+    return nullcontext() if collector is None else collector.__pause()
+
+  @staticmethod
+  def stop():
+    with terrariumBluetoothCollector.__lock:
+      collectors = list(terrariumBluetoothCollector.__collectors.values())
+      terrariumBluetoothCollector.__collectors = {}
+
+    for collector in collectors:
+      collector.__exit.set()
+      with collector.__condition:
+        collector.__condition.notify_all()
+
+      collector.__thread.join()
+
 class terrariumBluetoothSensor(terrariumSensor):
 
   __MIN_DB = -90
@@ -522,13 +991,33 @@ class terrariumBluetoothSensor(terrariumSensor):
 
     return address
 
+  def load_hardware(self, reload = False):
+    terrariumBluetoothHelpers.install()
+    with terrariumBluetoothCollector.active_connection(self._address[1]):
+      super().load_hardware(reload)
+
+  def _get_data(self):
+    # Use the broadcasted values when they are complete. Only connect to the sensor when they are not
+    address = self._address
+    data = terrariumBluetoothCollector.get(address[0], address[1])
+    if all([sensor_type in data for sensor_type in self.TYPES]):
+      return data
+
+    with terrariumBluetoothCollector.active_connection(address[1]):
+      return self._get_active_data()
+
   @staticmethod
   def _scan_bt_sensors(sensorclass, ids = [], unit_value_callback = None, trigger_callback = None):
+    from bluepy.btle import Scanner
+    terrariumBluetoothHelpers.install()
+
     # Due to multiple bluetooth dongles, we are looping 10 times to see which devices can scan. Exit after first success
     ok = True
     for counter in range(10):
       try:
-        devices = Scanner(counter).scan(terrariumBluetoothSensor.__SCAN_TIME)
+        with terrariumBluetoothCollector.active_connection(counter):
+          devices = Scanner(counter).scan(terrariumBluetoothSensor.__SCAN_TIME)
+
         for device in devices:
           if device.rssi > terrariumBluetoothSensor.__MIN_DB and device.getValueText(9) is not None and device.getValueText(9).lower() in ids:
             for sensor_type in sensorclass.TYPES:
@@ -12,6 +12,8 @@ class terrariumAM2320Sensor(terrariumI2CSensor):
   HARDWARE = 'am2320'
   TYPES    = ['temperature','humidity']
   NAME     = 'AM2320 sensor'
+  # [i2c_address],[i2c_bus],[mux_address]-[channel]
+  _I2C_MUX_INDEX = 2
 
   __PARAM_AM2320_READ = 0x03
   __REG_AM2320_HUMIDITY_MSB = 0x00
@@ -6,6 +6,8 @@ class terrariumBH1750Sensor(terrariumI2CSensor):
   HARDWARE = 'bh1750'
   TYPES    = ['light',]
   NAME     = 'BH1750 LUX light sensor'
+  # [i2c_address],[i2c_bus],[mux_address]-[channel]
+  _I2C_MUX_INDEX = 2
 
   # Start measurement at 4lx resolution. Time typically 16ms.
   CONTINUOUS_LOW_RES_MODE = 0x13
@@ -7,6 +7,8 @@ class terrariumBME280Sensor(terrariumI2CSensor):
   HARDWARE = 'bme280'
   TYPES    = ['temperature','humidity','altitude','pressure']
   NAME     = 'BME280 sensor'
+  # [i2c_address],[i2c_bus],[mux_address]-[channel]
+  _I2C_MUX_INDEX = 2
 
   def _get_data(self):
     data = None
@@ -7,6 +7,8 @@ class terrariumBME680Sensor(terrariumI2CSensor):
   HARDWARE = 'bme680'
   TYPES    = ['temperature','humidity','altitude','pressure']
   NAME     = 'BME680 sensor'
+  # [i2c_address],[i2c_bus],[mux_address]-[channel]
+  _I2C_MUX_INDEX = 2
 
   def _get_data(self):
     data = None
@@ -13,6 +13,8 @@ class terrariumChirpSensor(terrariumI2CSensor):
   # Light is disabled, as we cannot use it
   TYPES    = ['temperature','moisture']
   NAME     = 'CHIRP sensor'
+  # [i2c_address],[i2c_bus],[mux_address]-[channel]
+  _I2C_MUX_INDEX = 2
 
   # Some basic calibration values which should be overruled in the interface
   __MIN_MOIST    = 160
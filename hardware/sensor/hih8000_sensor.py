@@ -6,6 +6,8 @@ class terrariumHIH8000Sensor(terrariumI2CSensor):
   HARDWARE = 'hih8000'
   TYPES    = ['temperature','humidity']
   NAME     = 'Honeywell HumidIcon HIH8000'
+  # [i2c_address],[i2c_bus],[mux_address]-[channel]
+  _I2C_MUX_INDEX = 2
 
   def _get_data(self):
     data = None
@@ -4,6 +4,8 @@ class terrariumHTU21DSensor(terrariumI2CSensor, terrariumI2CSensorMixin):
   HARDWARE = 'htu21d'
   TYPES    = ['temperature','humidity']
   NAME     = 'HTU21D sensor'
+  # [i2c_address],[i2c_bus],[mux_address]-[channel]
+  _I2C_MUX_INDEX = 2
 
   # Datasheet - https://datasheet.octopart.com/HPP845E131R5-TE-Connectivity-datasheet-15137552.pdf
   TEMPERATURE_WAIT_TIME = 0.059 # (datasheet: typ=44, max=58 in ms)
@@ -20,7 +20,7 @@ class terrariumLywsd03mmcSensor(terrariumBluetoothSensor):
     logger.debug("Finished connecting")
     return device
 
-  def _get_data(self):
+  def _get_active_data(self):
     data = {}
 
     logger.debug("starting to fetch data")
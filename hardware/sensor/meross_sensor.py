@@ -5,7 +5,7 @@ logger = terrariumLogging.logging.getLogger(__name__)
 import os
 
 from . import terrariumSensor, terrariumSensorLoadingException
-from terrariumUtils import terrariumUtils, terrariumCache
+from terrariumUtils import terrariumUtils
 from terrariumCloud import TerrariumMerossCloud
 
 class terrariumMS100Sensor(terrariumSensor):
@@ -15,28 +15,29 @@ class terrariumMS100Sensor(terrariumSensor):
 
   def _load_hardware(self):
     if TerrariumMerossCloud.is_enabled:
-      self.__state_cache = terrariumCache()
-      try:
-        self.__state_cache.get_data(self.address)
-      except Exception:
-        raise terrariumSensorLoadingException('Sensor is not found at the Meross cloud.')
+      cloud = TerrariumMerossCloud.instance
+      if cloud is None:
+        raise terrariumSensorLoadingException('Meross cloud is not connected.')
+
+      if cloud.get_device_data(self.address) is None:
+        logger.warning(f'Sensor {self} is not (yet) found at the Meross cloud.')
 
       return self.address
 
   def _get_data(self):
     if TerrariumMerossCloud.is_enabled:
-      try:
-        return self.__state_cache.get_data(self.address)
+      # The cloud keeps the last pushed data of all the devices, so there is no request here
+      cloud = TerrariumMerossCloud.instance
+      if cloud is None:
+        logger.error(f'Error getting new data for {self}: Meross cloud is not connected')
+        return None
 
-      except Exception:
-        logger.warning(f'Strange bug... just ignore for now: {self}')
-        try:
-          self.__state_cache = terrariumCache()
-          return self.__state_cache.get_data(self.address)
+      info = cloud.device_info(self.address)
+      if info is not None and info['expired']:
+        logger.warning(f'The data of {self} is {info["age"]:.0f} seconds old, and could not be refreshed from the Meross cloud.')
+        return None
 
-        except Exception as ex:
-          logger.error(f'Error getting new data for {self}: {ex}')
-          return None
+      return cloud.get_device_data(self.address)
 
   @staticmethod
   def _scan_sensors(unit_value_callback = None, trigger_callback = None):
@@ -28,7 +28,7 @@ class terrariumMiFloraSensor(terrariumBluetoothSensor):
       # Return the device
       return device
 
-  def _get_data(self):
+  def _get_active_data(self):
     try:
       data = {}
       with self.device as sensor:
@@ -14,7 +14,7 @@ class terrariumMiTempSensor(terrariumBluetoothSensor):
     device = MiTempBtPoller(address[0], BluepyBackend, 10, adapter=f'hci{address[1]}')
     return device
 
-  def _get_data(self):
+  def _get_active_data(self):
     data = {}
 
     # BUG: Firmware data en battery will only be set at the first measurement.
@@ -1,8 +1,8 @@
 from . import terrariumI2CSensor
+from hardware.i2c_bus import terrariumI2CBus
 
 # pip install PyMLX90614
 import mlx90614
-import smbus2
 
 class terrariumMLX90614Sensor(terrariumI2CSensor):
   HARDWARE = 'mlx90614'
@@ -24,7 +24,7 @@ class terrariumMLX90614Sensor(terrariumI2CSensor):
     except ValueError:
       pass
 
-    device  = (address[0], smbus2.SMBus(1 if len(address) == 1 or int(address[1]) < 1 else int(address[1])))
+    device  = (address[0], terrariumI2CBus.get(self._i2c_bus))
     return device
 
   def _get_data(self):
@@ -0,0 +1,60 @@
+import terrariumLogging
+logger = terrariumLogging.logging.getLogger(__name__)
+
+from . import terrariumSensor, terrariumSensorLoadingException
+from terrariumUtils import terrariumUtils
+from hardware.mqtt_client import terrariumMQTTClient
+
+class terrariumMQTTSensor(terrariumSensor):
+  HARDWARE = 'mqtt'
+  # Empty TYPES list as this will be filled with all available hardware TYPES
+  TYPES    = []
+  NAME     = 'MQTT sensor (push)'
+
+  # Values older then 5 minutes are too old to use
+  __MAX_VALUE_AGE = 5 * 60
+
+  def _load_hardware(self):
+    try:
+      client, address = terrariumMQTTClient.connect(self.address)
+    except Exception as ex:
+      raise terrariumSensorLoadingException(f'Invalid MQTT address for sensor {self}: {ex}')
+
+    return (client, address['topic'], address['json_path'])
+
+  def load_hardware(self, reload = False):
+    super().load_hardware(reload)
+    # The hardware is shared between sensors with the same address, so every sensor subscribes with its own callback
+    self.device[0].subscribe(self.device[1], self.__push)
+
+  def __push(self, payload):
+    value = self.__decode(payload)
+    if value is not None:
+      self._push_data({ self.sensor_type : value })
+
+  def __decode(self, payload):
+    try:
+      value = terrariumMQTTClient.decode(payload, self.device[2])
+      return float(value) if terrariumUtils.is_float(value) else None
+    except Exception as ex:
+      logger.debug(f'Invalid payload {payload} for sensor {self}: {ex}')
+
+    return None
+
+  def _get_data(self):
+    # No I/O here. Only the last received message is used
+    payload = self.device[0].get_value(self.device[1], self.__MAX_VALUE_AGE)
+    if payload is None:
+      return None
+
+    value = self.__decode(payload)
+    if value is None:
+      return None
+
+    return { self.sensor_type : value }
+
+  def stop(self):
+    if self.device is not None:
+      self.device[0].unsubscribe(self.device[1], self.__push)
+
+    super().stop()
@@ -3,6 +3,9 @@ logger = terrariumLogging.logging.getLogger(__name__)
 
 from . import terrariumSensor, terrariumSensorUpdateException
 
+from time import time
+import threading
+
 # pip install pyownet
 from pyownet import protocol
 class terrariumOWFSSensor(terrariumSensor):
@@ -13,6 +16,17 @@ class terrariumOWFSSensor(terrariumSensor):
   __HOST = 'localhost'
   __PORT = 4304
 
+  # All the temperature sensors on the bus are converted at once, and the result is used for this long
+  __SIMULTANEOUS_MAX_AGE = 10 # in seconds
+  __simultaneous = {'lock' : threading.Lock(), 'timestamp' : 0}
+
+  def __simultaneous_conversion(self):
+    with terrariumOWFSSensor.__simultaneous['lock']:
+      if time() - terrariumOWFSSensor.__simultaneous['timestamp'] > terrariumOWFSSensor.__SIMULTANEOUS_MAX_AGE:
+        # Start the temperature conversion on all the sensors at the same time. OWFS waits for the conversion to finish
+        self.device.write('/simultaneous/temperature', b'1')
+        terrariumOWFSSensor.__simultaneous['timestamp'] = time()
+
   def _load_hardware(self):
     # For now, we use/depend on the OWFS defaults
     device = protocol.proxy(self.__HOST, self.__PORT)
@@ -22,9 +36,14 @@ class terrariumOWFSSensor(terrariumSensor):
     data = {}
 
     try:
-      data['temperature'] = float(self.device.read('/{}/temperature'.format(self.address.strip('/'))))
-    except protocol.OwnetError as ex:
-       terrariumSensorUpdateException(ex)
+      # Read the value of the last simultaneous conversion, which does not start a new conversion
+      self.__simultaneous_conversion()
+      data['temperature'] = float(self.device.read('/{}/latesttemp'.format(self.address.strip('/'))))
+    except protocol.OwnetError:
+      try:
+        data['temperature'] = float(self.device.read('/{}/temperature'.format(self.address.strip('/'))))
+      except protocol.OwnetError as ex:
+         terrariumSensorUpdateException(ex)
 
     try:
       data['humidity'] = float(self.device.read('/{}/humidity'.format(self.address.strip('/'))))
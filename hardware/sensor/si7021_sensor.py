@@ -4,6 +4,8 @@ class terrariumSi7021Sensor(terrariumI2CSensor, terrariumI2CSensorMixin):
   HARDWARE = 'si7021'
   TYPES    = ['temperature','humidity']
   NAME     = 'SI7021 sensor'
+  # [i2c_address],[i2c_bus],[mux_address]-[channel]
+  _I2C_MUX_INDEX = 2
 
   # Datasheet - https://www.silabs.com/documents/public/data-sheets/Si7021-A20.pdf
   TEMPERATURE_WAIT_TIME = 0.012 # (datasheet: typ=7, max=10.8 in ms)
@@ -7,6 +7,8 @@ class terrariumVEML6075Sensor(terrariumI2CSensor):
   HARDWARE = 'veml6075'
   TYPES    = ['uva','uvb','uvi']
   NAME     = 'VEML6075 UVA and UVB light sensor'
+  # [i2c_address],[i2c_bus],[mux_address]-[channel]
+  _I2C_MUX_INDEX = 2
 
   def _get_data(self):
     data = None
@@ -2,9 +2,6 @@
 import terrariumLogging
 logger = terrariumLogging.logging.getLogger(__name__)
 
-import inspect
-from importlib import import_module
-import sys
 
 from pathlib import Path
 from hashlib import md5
@@ -27,6 +24,7 @@ from PIL import Image, ImageDraw, ImageFont
 import piexif
 
 from terrariumUtils import terrariumUtils, terrariumCache, classproperty
+from hardware.driver_registry import terrariumHardwareRegistry
 
 class terrariumWebcamException(TypeError):
 
@@ -77,18 +75,8 @@ class terrariumWebcam(object):
 
     data = cache.get_data(__CACHE_KEY)
     if data is None:
-      data = {}
-      # Start dynamically loading sensors (based on: https://www.bnmetrics.com/blog/dynamic-import-in-python3)
-      for file in sorted(Path(__file__).parent.glob('*_webcam.py')):
-        imported_module = import_module( '.' + file.stem, package='{}'.format(__name__))
-
-        for i in dir(imported_module):
-          attribute = getattr(imported_module, i)
-
-          if inspect.isclass(attribute) and attribute != terrariumWebcam and issubclass(attribute, terrariumWebcam):
-            setattr(sys.modules[__name__], file.stem, attribute)
-            data[attribute.HARDWARE] = attribute
-
+      # Only the registry is loaded here. The driver modules are imported when a device needs them
+      data = terrariumHardwareRegistry.drivers(__name__, terrariumWebcam, '*_webcam.py', ['VALID_SOURCE'])
       cache.set_data(__CACHE_KEY,data,-1)
 
     return data
@@ -108,7 +96,7 @@ class terrariumWebcam(object):
     # Check based on entered address, not type
     for webcam_device in known_webcams:
       if re.search(known_webcams[webcam_device].VALID_SOURCE, address, re.IGNORECASE):
-        return super(terrariumWebcam, cls).__new__(known_webcams[webcam_device])
+        return super(terrariumWebcam, cls).__new__(known_webcams[webcam_device].load())
 
     raise terrariumWebcamException(f'Webcam url \'{address}\' is not valid! Please check your source')
 
@@ -0,0 +1,21 @@
+CREATE TABLE IF NOT EXISTS "SensorAverageHistory" (
+	"source"	TEXT NOT NULL,
+	"timestamp"	DATETIME NOT NULL,
+	"value_total"	REAL NOT NULL,
+	"alarm_min_total"	REAL NOT NULL,
+	"alarm_max_total"	REAL NOT NULL,
+	"amount"	INTEGER NOT NULL,
+	PRIMARY KEY("source","timestamp")
+);
+INSERT OR REPLACE INTO "SensorAverageHistory" ("source", "timestamp", "value_total", "alarm_min_total", "alarm_max_total", "amount")
+  SELECT 'type:' || "Sensor"."type", "SensorHistory"."timestamp", TOTAL("SensorHistory"."value"), TOTAL("SensorHistory"."alarm_min"), TOTAL("SensorHistory"."alarm_max"), COUNT(*)
+    FROM "SensorHistory"
+    JOIN "Sensor" ON "Sensor"."id" = "SensorHistory"."sensor"
+   WHERE "SensorHistory"."exclude_avg" = 0
+GROUP BY "Sensor"."type", "SensorHistory"."timestamp";
+INSERT OR REPLACE INTO "SensorAverageHistory" ("source", "timestamp", "value_total", "alarm_min_total", "alarm_max_total", "amount")
+  SELECT 'area:' || "Area"."id", "SensorHistory"."timestamp", TOTAL("SensorHistory"."value"), TOTAL("SensorHistory"."alarm_min"), TOTAL("SensorHistory"."alarm_max"), COUNT(*)
+    FROM "Area", json_each("Area"."setup", '$.sensors') AS "AreaSensor"
+    JOIN "SensorHistory" ON "SensorHistory"."sensor" = "AreaSensor"."value"
+   WHERE "SensorHistory"."exclude_avg" = 0
+GROUP BY "Area"."id", "SensorHistory"."timestamp";
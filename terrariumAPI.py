@@ -3,6 +3,7 @@ import terrariumLogging
 logger = terrariumLogging.logging.getLogger(__name__)
 
 from datetime import datetime, timezone, timedelta
+from time import time
 from pony import orm
 from bottle import request, response, static_file, HTTPError
 from json import dumps
@@ -10,11 +11,10 @@ from pathlib import Path
 from ffprobe import FFProbe
 from hashlib import md5
 from uuid import uuid4
-from ansi2html import Ansi2HTMLConverter
 
 from terrariumArea         import terrariumArea
 from terrariumAudio        import terrariumAudio
-from terrariumDatabase     import Area, Audiofile, Button, Enclosure, Playlist, NotificationMessage, NotificationService, Relay, Sensor, SensorHistory, Setting, Webcam
+from terrariumDatabase     import Area, Audiofile, Button, Enclosure, Playlist, NotificationMessage, NotificationService, Relay, Sensor, SensorAverageHistory, SensorHistory, Setting, Webcam
 from terrariumEnclosure    import terrariumEnclosure
 from terrariumNotification import terrariumNotification, terrariumNotificationService
 
@@ -30,15 +30,67 @@ from terrariumUtils import terrariumUtils
 DEBUG = False
 
 class terrariumAPI(object):
+  # Cached list responses are valid till the data changes, with a maximum of 1 minute (same as the browser cache)
+  __CACHE_TIMEOUT = 60
+
+  # Non GET requests to these API paths will change the cached data of the group
+  __CACHE_GROUPS = ['areas','buttons','enclosures','relays','sensors','webcams']
 
   def __init__(self, webserver):
     self.webserver = webserver
 
+    self.__response_cache = {}
+    self.__cache_versions = {}
+
+  def invalidate_cache(self, *groups):
+    """
+    Invalidate the cached responses of the given groups. Without groups, all cached responses are invalidated.
+    """
+    for group in (groups if len(groups) > 0 else self.__CACHE_GROUPS):
+      self.__cache_versions[group] = self.__cache_versions.get(group, 0) + 1
+
+  def __invalidate_changed_cache(self):
+    if request.method.upper() in ['GET','HEAD','OPTIONS'] or not request.path.startswith('/api/'):
+      return
+
+    group = request.path.strip('/').split('/')
+    group = group[1] if len(group) > 1 else None
+    if group in self.__CACHE_GROUPS:
+      self.invalidate_cache(group)
+    elif 'settings' == group:
+      # Settings can change the excluded items and units
+      self.invalidate_cache()
+
+  def __cached_response(self, groups, builder, *parameters):
+    # The cache is only valid as long as the versions of all the groups that the response depends on are not changed
+    now = time()
+    version   = tuple(self.__cache_versions.get(group, 0) for group in groups)
+    cache_key = f'{builder.__name__}:{parameters}'
+
+    cached = self.__response_cache.get(cache_key)
+    if cached is None or cached['version'] != version or cached['expire'] <= now:
+      data = builder(*parameters)
+      cached = {
+        'version' : version,
+        'expire'  : now + self.__CACHE_TIMEOUT,
+        'data'    : data,
+        'etag'    : f'"{md5(dumps(data, default=str).encode()).hexdigest()}"'
+      }
+      self.__response_cache[cache_key] = cached
+
+    response.set_header('ETag', cached['etag'])
+    if request.get_header('If-None-Match') == cached['etag']:
+      response.status = 304
+      return ''
+
+    return cached['data']
+
   # Always (force = True) enable authentication on the API
   def authentication(self, force = True):
     return self.webserver.authenticate(force)
 
   def routes(self,bottle_app):
+    bottle_app.add_hook('after_request', self.__invalidate_changed_cache)
 
     # Area API
     bottle_app.route('/api/areas/types/',       'GET',    self.area_types,  apply=self.authentication(False), name='api:area_types')
@@ -94,6 +146,7 @@ class terrariumAPI(object):
 
     # Logfile API
     bottle_app.route('/api/logfile/download/', 'GET', self.logfile_download, apply=self.authentication(), name='api:logfile_download')
+    bottle_app.route('/api/logfile/',          'GET', self.logfile_lines,    apply=self.authentication(), name='api:logfile_lines')
 
 
     # Notification API
@@ -201,11 +254,16 @@ class terrariumAPI(object):
   def area_types(self):
     return { 'data' : terrariumArea.available_areas }
 
-  @orm.db_session(sql_debug=DEBUG,show_values=DEBUG)
   def area_list(self):
+    return self.__cached_response(['areas'], self.__area_list)
+
+  @orm.db_session(sql_debug=DEBUG,show_values=DEBUG)
+  def __area_list(self):
     data = []
     for area in Area.select(lambda r: not r.id in self.webserver.engine.settings['exclude_ids']):
-      data.append(self.area_detail(area.id))
+      area_data = area.to_dict(exclude='enclosure')
+      area_data['enclosure'] = area.enclosure.id
+      data.append(area_data)
 
     return { 'data' : data }
 
@@ -221,9 +279,10 @@ class terrariumAPI(object):
     except Exception as ex:
       raise HTTPError(status=500, body=f'Error getting area {area} detail. {ex}')
 
+  @orm.db_session(sql_debug=DEBUG,show_values=DEBUG)
   def area_detail_history(self, area):
     area = self.area_detail(area)
-    return self.sensor_history(list(area['setup']['sensors']))
+    return self.sensor_history(f'area:{area["id"]}')
 
   def __area_relay_check(self, api_data):
     update_ids = []
@@ -257,6 +316,9 @@ class terrariumAPI(object):
       request.json['id'] = new_area.id
 
       area = Area(**request.json)
+      orm.commit()
+      Area.clear_sensor_areas()
+      SensorAverageHistory.rebuild(f'area:{area.id}')
 
       return self.area_detail(area.id)
     except orm.core.ObjectNotFound:
@@ -271,9 +333,14 @@ class terrariumAPI(object):
 
       self.__area_relay_check(request.json)
 
+      old_sensors = list((area.setup or {}).get('sensors', []))
       area.set(**request.json)
       orm.commit()
 
+      if old_sensors != list((area.setup or {}).get('sensors', [])):
+        Area.clear_sensor_areas()
+        SensorAverageHistory.rebuild(f'area:{area.id}')
+
       self.webserver.engine.update(terrariumArea,**request.json)
 
       return self.area_detail(area.id)
@@ -291,7 +358,9 @@ class terrariumAPI(object):
       area_id = area.id
       enclosure_id = area.enclosure.id
       area.delete()
+      SensorAverageHistory.delete_source(f'area:{area_id}')
       orm.commit()
+      Area.clear_sensor_areas()
 
       self.webserver.engine.delete(terrariumArea, area_id, enclosure_id)
       return {'message' : message}
@@ -418,11 +487,17 @@ class terrariumAPI(object):
     except Exception as ex:
       raise HTTPError(status=500, body=f'Error getting history for button {button}: {ex}')
 
-  @orm.db_session(sql_debug=DEBUG,show_values=DEBUG)
   def button_list(self):
+    return self.__cached_response(['buttons'], self.__button_list)
+
+  @orm.db_session(sql_debug=DEBUG,show_values=DEBUG)
+  def __button_list(self):
+    # Load all the latest values with a single query
+    latest_values = Button.latest_values()
+
     data = []
     for button in Button.select(lambda r: not r.id in self.webserver.engine.settings['exclude_ids']):
-      data.append(self.button_detail(button.id))
+      data.append(button.to_dict(exclude='enclosure', latest_values=latest_values))
 
     return { 'data' : data }
 
@@ -430,9 +505,7 @@ class terrariumAPI(object):
   def button_detail(self, button):
     try:
       button = Button[button]
-      button_data = button.to_dict(exclude='enclosure')
-      button_data['value']  = button.value
-      return button_data
+      return button.to_dict(exclude='enclosure')
     except orm.core.ObjectNotFound:
       raise HTTPError(status=404, body=f'Button with id {button} does not exists.')
     except Exception as ex:
@@ -574,38 +647,34 @@ class terrariumAPI(object):
 
 
   # Enclosure
-  @orm.db_session(sql_debug=DEBUG,show_values=DEBUG)
   def enclosure_list(self):
-    data = []
-    for enclosure in Enclosure.select(lambda e: not e.id in self.webserver.engine.settings['exclude_ids']):
-      data.append(self.enclosure_detail(enclosure.id))
-
-    return { 'data' : data }
+    return self.__cached_response(['enclosures', 'areas', 'buttons', 'webcams'], self.__enclosure_list)
 
   @orm.db_session(sql_debug=DEBUG,show_values=DEBUG)
-  def enclosure_detail(self, enclosure):
-    try:
-      enclosure = Enclosure[enclosure]
-      enclosure_data = enclosure.to_dict(with_collections=True, related_objects=True)
-
-      for area in list(enclosure_data['areas']):
-        enclosure_data['areas'].remove(area)
-        enclosure_data['areas'].append(area.to_dict(exclude='enclosure'))
+  def __enclosure_list(self):
+    # Load all the related data and the latest door values at once
+    door_values = Button.latest_values()
+    enclosures  = Enclosure.select(lambda e: not e.id in self.webserver.engine.settings['exclude_ids']).prefetch(Enclosure.areas, Enclosure.doors, Enclosure.webcams)
 
-      for door in list(enclosure_data['doors']):
-        enclosure_data['doors'].remove(door)
+    data = []
+    for enclosure in enclosures:
+      data.append(self.__enclosure_data(enclosure, door_values))
 
-        door_data = door.to_dict(exclude='enclosure')
-        door_data['value'] = door.value
+    return { 'data' : data }
 
-        enclosure_data['doors'].append(door_data)
+  def __enclosure_data(self, enclosure, door_values = None):
+    enclosure_data = enclosure.to_dict(with_collections=True, related_objects=True)
 
+    enclosure_data['areas']   = [area.to_dict(exclude='enclosure') for area in enclosure_data['areas']]
+    enclosure_data['doors']   = [door.to_dict(exclude='enclosure', latest_values=door_values) for door in enclosure_data['doors']]
+    enclosure_data['webcams'] = [webcam.to_dict(exclude='enclosure') for webcam in enclosure_data['webcams']]
 
-      for webcam in list(enclosure_data['webcams']):
-        enclosure_data['webcams'].remove(webcam)
-        enclosure_data['webcams'].append(webcam.to_dict(exclude='enclosure'))
+    return enclosure_data
 
-      return enclosure_data
+  @orm.db_session(sql_debug=DEBUG,show_values=DEBUG)
+  def enclosure_detail(self, enclosure):
+    try:
+      return self.__enclosure_data(Enclosure[enclosure])
     except orm.core.ObjectNotFound:
       raise HTTPError(status=404, body=f'Enclosure with id {enclosure} does not exists.')
     except Exception as ex:
@@ -669,6 +738,8 @@ class terrariumAPI(object):
       message = f'Enclosure {Enclosure[enclosure]} is deleted.'
       Enclosure[enclosure].delete()
       orm.commit()
+      # The areas of the enclosure are deleted as well
+      Area.clear_sensor_areas()
  #     self.webserver.engine.delete(terrariumEnclosure,enclosure)
       return {'message' : message}
     except orm.core.ObjectNotFound:
@@ -680,9 +751,20 @@ class terrariumAPI(object):
   # Logfile
   def logfile_download(self):
     # https://stackoverflow.com/a/26017181
-    logfile = Path(terrariumLogging.logging.getLogger().handlers[1].baseFilename)
+    logfile = Path(terrariumLogging.log_file())
     return static_file(logfile.name, root='log', mimetype='text/text', download=logfile.name)
 
+  def logfile_lines(self):
+    # Read the latest log lines from memory. Use 'start' with the last received sequence number to only get the newer lines
+    start = int(request.query.get('start')) if terrariumUtils.is_float(request.query.get('start')) else 0
+    limit = int(request.query.get('limit')) if terrariumUtils.is_float(request.query.get('limit')) else None
+    level = terrariumLogging.logging.getLevelName(str(request.query.get('level', 'NOTSET')).upper())
+    if not isinstance(level, int):
+      raise HTTPError(status=400, body=f'Invalid log level {request.query.get("level")}.')
+
+    lines = terrariumLogging.log_buffer().lines(start, level, limit)
+    return {'data' : [line[2] for line in lines], 'last' : lines[-1][0] if len(lines) > 0 else start}
+
 
   # Notifications
   def notification_message_types(self):
@@ -991,11 +1073,17 @@ class terrariumAPI(object):
     new = len(self.webserver.engine.relays) - current_amount
     return { 'message' : f'Found {new} new relays' }
 
-  @orm.db_session(sql_debug=DEBUG,show_values=DEBUG)
   def relay_list(self):
+    return self.__cached_response(['relays'], self.__relay_list)
+
+  @orm.db_session(sql_debug=DEBUG,show_values=DEBUG)
+  def __relay_list(self):
+    # Load all the latest values with a single query
+    latest_values = Relay.latest_values()
+
     data = []
     for relay in Relay.select(lambda r: not r.id in self.webserver.engine.settings['exclude_ids']):
-      data.append(self.relay_detail(relay.id))
+      data.append(relay.to_dict(exclude='webcam', latest_values=latest_values))
 
     return { 'data' : data }
 
@@ -1074,22 +1162,14 @@ class terrariumAPI(object):
     else:
       period = 1
 
-    if isinstance(filter, list):
-      # Get history based on selected sensor IDs
-      query = orm.select((sh.timestamp,
-                          orm.avg(sh.value),
-                          orm.avg(sh.alarm_min),
-                          orm.avg(sh.alarm_max)) for sh in SensorHistory if  sh.sensor.id in filter
-                                                                         and sh.exclude_avg == False
-                                                                         and sh.timestamp >= datetime.now() - timedelta(days=period))
-
-    elif filter in terrariumSensor.sensor_types:
-      query = orm.select((sh.timestamp,
-                          orm.avg(sh.value),
-                          orm.avg(sh.alarm_min),
-                          orm.avg(sh.alarm_max)) for sh in SensorHistory if  sh.sensor.type == filter
-                                                                         and sh.exclude_avg == False
-                                                                         and sh.timestamp >= datetime.now() - timedelta(days=period))
+    if filter in terrariumSensor.sensor_types or str(filter).startswith('area:'):
+      # The averages are already materialized per sensor type and area, so this is a simple range read
+      source = filter if str(filter).startswith('area:') else f'type:{filter}'
+      query = orm.select((sah.timestamp,
+                          sah.value_total / sah.amount,
+                          sah.alarm_min_total / sah.amount,
+                          sah.alarm_max_total / sah.amount) for sah in SensorAverageHistory if  sah.source == source
+                                                                                       and sah.timestamp >= datetime.now() - timedelta(days=period)).order_by(1)
 
     else:
       query = orm.select((sh.timestamp,
@@ -1140,12 +1220,18 @@ class terrariumAPI(object):
     new = len(self.webserver.engine.sensors) - current_amount
     return { 'message' : f'Found {new} new sensors' }
 
-  @orm.db_session(sql_debug=DEBUG,show_values=DEBUG)
   def sensor_list(self, filter = None):
+    return self.__cached_response(['sensors'], self.__sensor_list, filter)
+
+  @orm.db_session(sql_debug=DEBUG,show_values=DEBUG)
+  def __sensor_list(self, filter = None):
+    # Load all the latest values with a single query
+    latest_values = Sensor.latest_values()
+
     data = []
     for sensor in Sensor.select(lambda s: not s.id in self.webserver.engine.settings['exclude_ids']):
       if filter is None or filter == sensor.type:
-        data.append(self.sensor_detail(sensor.id))
+        data.append(sensor.to_dict(latest_values=latest_values))
 
     return { 'data' : data }
 
@@ -1203,8 +1289,13 @@ class terrariumAPI(object):
   def sensor_delete(self, sensor):
     try:
       message = f'Sensor {Sensor[sensor]} is deleted.'
+      sources = [f'type:{Sensor[sensor].type}'] + [f'area:{area.id}' for area in Area.select() if sensor in (area.setup or {}).get('sensors', [])]
       Sensor[sensor].delete()
       orm.commit()
+
+      # Remove the history of the deleted sensor from the averages
+      for source in sources:
+        SensorAverageHistory.rebuild(source)
       self.webserver.engine.delete(terrariumSensor,sensor)
       return {'message' : message}
     except orm.core.ObjectNotFound:
@@ -1341,10 +1432,7 @@ class terrariumAPI(object):
   # System
   def system_status(self):
     data = self.webserver.engine.system_stats()
-    conv = Ansi2HTMLConverter()
-    motd_text = Path('motd.sh').read_text().split('\n')
-    motd_text = motd_text[1:-1]
-    data['summary'] = conv.convert("\n".join(motd_text).replace('echo "','').replace('\`','`'), full=True)
+    data['summary'] = self.webserver.engine.motd_html
     return data
 
 
@@ -1403,11 +1491,17 @@ class terrariumAPI(object):
     except Exception as ex:
       raise HTTPError(status=500, body=f'Error getting webcam {webcam} archive images. {ex}')
 
-  @orm.db_session(sql_debug=DEBUG,show_values=DEBUG)
   def webcam_list(self):
+    return self.__cached_response(['webcams'], self.__webcam_list)
+
+  @orm.db_session(sql_debug=DEBUG,show_values=DEBUG)
+  def __webcam_list(self):
     data = []
-    for webcam in Webcam.select(lambda w: not w.id in self.webserver.engine.settings['exclude_ids']):
-      data.append(self.webcam_detail(webcam.id))
+    # Load the flash relays of all the webcams at once
+    for webcam in Webcam.select(lambda w: not w.id in self.webserver.engine.settings['exclude_ids']).prefetch(Webcam.flash):
+      webcam_data = webcam.to_dict(exclude='enclosure',with_collections=True)
+      webcam_data['is_live'] = webcam.is_live
+      data.append(webcam_data)
 
     return { 'data' : data }
 
@@ -3,6 +3,7 @@ import terrariumLogging
 logger = terrariumLogging.logging.getLogger(__name__)
 
 from operator import itemgetter
+import bisect
 import copy
 import datetime
 import time
@@ -25,6 +26,76 @@ class terrariumAreaException(TypeError):
   '''There is a problem with loading a hardware sensor.'''
   pass
 
+class terrariumAreaSchedule(object):
+  """
+  Precomputed on/off schedule of an area period over multiple days. The on periods are sorted and merged, so the
+  current state and the next transition can be found with a binary search.
+  """
+
+  def __init__(self, periods = [], expires = None):
+    self.__begins = []
+    self.__ends   = []
+
+    for begin, end in sorted(periods):
+      if end <= begin:
+        continue
+
+      if len(self.__ends) > 0 and begin <= self.__ends[-1]:
+        # Overlapping or connecting periods are merged into one period
+        self.__ends[-1] = max(self.__ends[-1], end)
+        continue
+
+      self.__begins.append(begin)
+      self.__ends.append(end)
+
+    # After this moment the schedule should be rebuild with new data. By default when the last period has ended
+    self.expires = expires if expires is not None else (0 if len(self.__ends) == 0 else self.__ends[-1])
+
+  def __len__(self):
+    return len(self.__begins)
+
+  def __index(self, timestamp):
+    # Index of the last period that started at or before the timestamp
+    return bisect.bisect_right(self.__begins, timestamp) - 1
+
+  @property
+  def periods(self):
+    return list(zip(self.__begins, self.__ends))
+
+  @property
+  def expired(self):
+    return int(time.time()) >= self.expires
+
+  def is_on(self, timestamp = None):
+    """
+    Check if the schedule is on at the given timestamp (default now)
+
+    Returns:
+        bool: True when the timestamp is within an on period
+    """
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    index = self.__index(timestamp)
+
+    return index >= 0 and timestamp < self.__ends[index]
+
+  def next_transition(self, timestamp = None):
+    """
+    Get the moment the schedule changes state after the given timestamp (default now)
+
+    Returns:
+        int: Timestamp of the next transition or None when there are no more transitions
+    """
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    index = self.__index(timestamp)
+
+    if index >= 0 and timestamp < self.__ends[index]:
+      return self.__ends[index]
+
+    if index + 1 < len(self.__begins):
+      return self.__begins[index + 1]
+
+    return None
+
 class terrariumArea(object):
 
   __TYPES = {
@@ -97,6 +168,10 @@ class terrariumArea(object):
 
   PERIODS = ['low','high']
 
+  # Areas are only evaluated when one of their inputs has changed, or when a timer is due. As a safety net for inputs
+  # that cannot be tracked, an area is evaluated at least once every 5 minutes
+  __MAX_IDLE_TIME = 5 * 60
+
   @classproperty
   def available_areas(__cls__):
     data = []
@@ -127,6 +202,9 @@ class terrariumArea(object):
 
     self.enclosure = enclosure
 
+    self._dirty = True
+    self._next_update = 0
+
     self.state = {}
     self.load_setup(setup)
 
@@ -208,6 +286,11 @@ class terrariumArea(object):
 
       return data
 
+    def repeat_periods(periods, days):
+      # Repeat the periods on other days. Use local time, so daylight saving time changes are handled
+      return [(int((datetime.datetime.fromtimestamp(begin) + datetime.timedelta(days=day)).timestamp()),
+               int((datetime.datetime.fromtimestamp(end)   + datetime.timedelta(days=day)).timestamp())) for day in days for begin, end in periods]
+
     timetable = {}
     if 'main_lights' == self.mode:
       # We copy the timetable from the area with the toggle 'main lights' on. We follow that area its timetable
@@ -217,7 +300,8 @@ class terrariumArea(object):
           if period not in self.setup:
             continue
 
-          self.setup[period]['timetable'] = copy.deepcopy(main_lights.setup['day' if 'low' == period else 'night']['timetable'])
+          # The schedule is never changed, so it can be shared with the main lights area
+          self.setup[period]['timetable'] = main_lights.setup['day' if 'low' == period else 'night']['timetable']
 
           self.state[period]['begin']    = main_lights.state['day' if 'low' == period else 'night']['begin']
           self.state[period]['end']      = main_lights.state['day' if 'low' == period else 'night']['end']
@@ -280,6 +364,12 @@ class terrariumArea(object):
       if datetime.datetime.now() < sunrise:
         timetable['night'] = make_time_table(sunset - datetime.timedelta(hours=24), sunrise)
 
+      # Schedules for yesterday, today and tomorrow, so the day changes do not need a new time table directly
+      timetable['day']['schedule']   = [(sunrise, sunset), (next_sunrise, next_sunset)]
+      timetable['night']['schedule'] = [(sunset - datetime.timedelta(hours=24), sunrise), (sunset, next_sunrise), (next_sunset, next_sunrise + datetime.timedelta(hours=24))]
+      for period in timetable:
+        timetable[period]['schedule'] = [(int(begin.timestamp()), int(end.timestamp())) for begin, end in timetable[period]['schedule']]
+
     elif 'timer' == self.mode:
       for period in self.PERIODS:
         if period not in self.setup:
@@ -291,21 +381,26 @@ class terrariumArea(object):
         off_period = max(0.0,self.setup[period]['off_duration']) * 60.0
 
         timetable[period] = make_time_table(begin, end, on_period, off_period)
+        # Schedules for yesterday, today and tomorrow, so the day changes do not need a new time table directly
+        timetable[period]['schedule'] = repeat_periods(timetable[period]['periods'], [-1,0,1])
 
     for period in timetable:
       if period not in self.setup:
         continue
 
-      self.setup[period]['timetable'] = copy.deepcopy(timetable[period]['periods'])
+      # The time table is valid till the end of the current (or upcoming) period. After that a new time table is made
+      self.setup[period]['timetable'] = terrariumAreaSchedule(timetable[period]['schedule'] + timetable[period]['periods'], timetable[period]['periods'][-1][1])
 
-      self.state[period]['begin']    = self.setup[period]['timetable'][0][0]
-      self.state[period]['end']      = self.setup[period]['timetable'][-1][1]
+      self.state[period]['begin']    = timetable[period]['periods'][0][0]
+      self.state[period]['end']      = timetable[period]['periods'][-1][1]
       self.state[period]['duration'] = timetable[period]['duration']
 
     return True
 
   def load_setup(self, data):
     self.setup = copy.deepcopy(data)
+    # New setup, so the area has to be evaluated in the next round
+    self._dirty = True
     if self.state.get('last_update', None) is None:
       self.state = {
         'is_day'      : self.setup.get('is_day', None),
@@ -438,18 +533,13 @@ class terrariumArea(object):
       logger.debug(f'Area {self} does not have a timer table')
       return False
 
-    now = int(datetime.datetime.now().timestamp())
-    for time_schedule in self.setup[period]['timetable']:
-      if now < time_schedule[0]:
-        logger.debug(f'Area {self} is not time yet. Period has to start first.')
-        return False
-
-      elif time_schedule[0] <= now < time_schedule[1]:
-        logger.debug(f'Area {self} is in period, so toggle on: {time_schedule[0]} <= {now} <= {time_schedule[1]}')
-        return True
+    if self.setup[period]['timetable'].expired:
+      logger.info(f'Refreshing timer table for {self} period: {period}')
+      self._time_table()
 
-    logger.debug(f'Area {self} does not know if it is time.... Should update new timetable for next day?')
-    return None
+    is_timer_time = self.setup[period]['timetable'].is_on()
+    logger.debug(f'Area {self} is {"in" if is_timer_time else "not in"} period {period}. Next change at {self.setup[period]["timetable"].next_transition()}')
+    return is_timer_time
 
   def _update_variation(self):
     # !! This variation updates will interfere with the 'day/night difference' setting !!
@@ -464,7 +554,8 @@ class terrariumArea(object):
       value = None
 
       if self.state['variation']['script']:
-        value = float(terrariumUtils.get_script_data(self.state['variation']['source'])) + self.state['variation']['offset']
+        # Areas with the same variation script share the output for a short time
+        value = float(terrariumUtils.get_script_data(self.state['variation']['source'], 10)) + self.state['variation']['offset']
 
       elif self.state['variation']['external']:
         # Here we get data from an external source. We cache this data for 10 minutes
@@ -582,7 +673,99 @@ class terrariumArea(object):
     # Default day period is from 07:00 till 19:00
     return 700 < int(time.strftime('%H%M')) < 1900
 
+  def _next_day_night_change(self):
+    light_mode = self.setup.get('day_night_source', '')
+    now = datetime.datetime.now()
+
+    if 'weather' == light_mode and self.enclosure.weather is not None:
+      changes = [self.enclosure.weather.sunrise, self.enclosure.weather.sunset, self.enclosure.weather.next_sunrise, self.enclosure.weather.next_sunset]
+
+    elif 'lights' == light_mode and self.enclosure.main_lights is not None and self.enclosure.main_lights.mode != 'disabled':
+      changes = [datetime.datetime.fromtimestamp(self.enclosure.main_lights.state['day'][key]) for key in ['begin','end']]
+
+    else:
+      changes = []
+      for day in [0,1]:
+        changes.append(now.replace(hour=7,  minute=1, second=0, microsecond=0) + datetime.timedelta(days=day))
+        changes.append(now.replace(hour=19, minute=0, second=0, microsecond=0) + datetime.timedelta(days=day))
+
+    changes = [change for change in changes if change > now]
+    return None if len(changes) == 0 else min(changes).timestamp()
+
+  def _next_timer_change(self, period):
+    if period not in self.setup or 'timetable' not in self.setup[period]:
+      return None
+
+    now = int(datetime.datetime.now().timestamp())
+    schedule = self.setup[period]['timetable']
+    changes = [change for change in [schedule.next_transition(now), schedule.expires] if change is not None and change > now]
+
+    return None if len(changes) == 0 else min(changes)
+
+  def _wake_up_at(self, timestamp):
+    self._next_update = min(self._next_update, timestamp)
+
+  def _schedule_next_update(self):
+    # Day and night changes can change the sensor limits
+    next_change = self._next_day_night_change()
+    if next_change is not None:
+      self._wake_up_at(next_change)
+
+    if 'sensors' != self.mode:
+      for period in self.PERIODS:
+        if period not in self.setup:
+          continue
+
+        next_change = self._next_timer_change(period)
+        # When there is no next change, the timer table has to be refreshed in the next round
+        self._wake_up_at(0 if next_change is None else next_change)
+
+    # Variations are changing the sensor limits continuously
+    if 'variation' in self.state and self.state['variation']['active']:
+      self._wake_up_at(0)
+
+  def notify(self):
+    """
+    Mark the area as changed, so it will be evaluated in the next update round
+    """
+    self._dirty = True
+
+  def depends_on_input(self, sensors = [], relays = []):
+    """
+    Check if one of the given sensors or relays is used by this area
+
+    Returns:
+        bool: True when the area uses at least one of the sensors or relays
+    """
+    if len(set(sensors) & set(self.setup.get('sensors', []))) > 0:
+      return True
+
+    for period in self.PERIODS:
+      if period in self.setup and len(set(relays) & set(self.setup[period]['relays'])) > 0:
+        return True
+
+    return False
+
+  def needs_update(self, read_only = False):
+    """
+    Check if the area has to be evaluated. This is only needed when one of the inputs has changed, or a timer is due
+
+    Returns:
+        bool: True when the area should be updated
+    """
+    if self._dirty:
+      return True
+
+    # Timers are only handled in a full update
+    return not read_only and time.time() >= self._next_update
+
   def update(self, read_only = False):
+    # Only a full update will handle all the changed inputs and timers
+    full_update = not read_only
+    if full_update:
+      self._dirty = False
+      self._next_update = time.time() + terrariumArea.__MAX_IDLE_TIME
+
     if self.mode == 'disabled':
       # Make it readonly, so sensors and relay changes are still shown
       read_only = True
@@ -682,11 +865,6 @@ class terrariumArea(object):
         toggle_relay = self._is_timer_time(period)
         logger.debug(f'Need to toggle the relays for {self} period {period}? {toggle_relay}')
 
-        if toggle_relay is None:
-          logger.info(f'Refreshing timer table for {self} period: {period}')
-          self._time_table()
-          toggle_relay = False
-
         if toggle_relay is True and 'sensors' in self.setup and len(self.setup['sensors']) > 0:
           # We are in timer mode. But when there are sensors configured, they act as a second check
           # If there is NOT an alarm with the period name, then skip the toggle action.
@@ -726,6 +904,7 @@ class terrariumArea(object):
         time_elapsed = abs(int(datetime.datetime.now().timestamp()) - self.state[period]['last_powered_on'])
         if time_elapsed <= self.setup[period]['settle_time']:
           logger.info(f'Relays for {self} period {period} are not switched on because we have to wait for {self.setup[period]["settle_time"]-time_elapsed} more seconds of the total settle time of {self.setup[period]["settle_time"]} seconds.')
+          self._wake_up_at(self.state[period]['last_powered_on'] + self.setup[period]['settle_time'] + 1)
           continue
 
         other_period = list(self.setup.keys())
@@ -735,11 +914,14 @@ class terrariumArea(object):
           time_elapsed = abs(int(datetime.datetime.now().timestamp()) - self.state[other_period]['last_powered_on'])
           if time_elapsed <= self.setup[other_period]['settle_time']:
             logger.info(f'Relays for {self} period {period} are not switched on because of the other period {other_period} settle time. We have to wait for {self.setup[other_period]["settle_time"]-time_elapsed} more seconds of the total settle time of {self.setup[other_period]["settle_time"]} seconds.')
+            self._wake_up_at(self.state[other_period]['last_powered_on'] + self.setup[other_period]['settle_time'] + 1)
             continue
 
         if self.state[period]['alarm_count'] < self.setup[period]['alarm_threshold']:
           logger.info(f'The alarm counter ({self.state[period]["alarm_count"]}) for area {self} for alarm {period} is lower than the threshold ({self.setup[period]["alarm_threshold"]}). Skip this round.')
           self.state[period]['alarm_count'] += 1
+          # The alarm counter only increases with every evaluation, so evaluate again in the next round
+          self._wake_up_at(0)
           continue
 
         self.relays_toggle(period,True)
@@ -761,6 +943,9 @@ class terrariumArea(object):
     self.state['powered'] = self._powered
     self.state['last_update'] = int(datetime.datetime.now().timestamp())
 
+    if full_update:
+      self._schedule_next_update()
+
     logger.info(f'Updated area {self} in {self.mode} mode at enclosure {self.enclosure.name} in {time.time()-start:.2f} seconds.')
     return self.state
 
@@ -824,12 +1009,21 @@ class terrariumArea(object):
     with orm.db_session():
       relays = orm.select(r.id for r in Relay if r.id in self.setup[part]['relays'] and not r.manual_mode)[:]
 
+    board_actions = []
     for relay in relays:
       if relay not in self.enclosure.relays:
         continue
 
       relay = self.enclosure.relays[relay]
-      self._relay_action(part, relay, on)
+      if relay.board_key is None:
+        self._relay_action(part, relay, on)
+      else:
+        # Relays on a shared board are switched at the same time, so the board can write them in a single action
+        board_actions.append(threading.Thread(target=self._relay_action, args=(part, relay, on)))
+        board_actions[-1].start()
+
+    for action in board_actions:
+      action.join()
 
     if on:
       self.state[part]['last_powered_on'] = int(datetime.datetime.now().timestamp())
@@ -1016,6 +1210,9 @@ class terrariumAreaHeater(terrariumArea):
     super().update(read_only)
 
     if not read_only and self.mode != 'disabled' and len(self.__dimmers) > 0:
+      # The PID controllers need a new sensor value every round
+      self._wake_up_at(0)
+
       sensor_values  = self.current_value(self.setup['sensors'])
       sensor_average = float(sensor_values['alarm_min'] + sensor_values['alarm_max']) / 2.0
 
@@ -9,7 +9,7 @@ import socket
 
 from time import sleep, time
 
-from terrariumUtils import classproperty, terrariumCache, terrariumSingleton, terrariumAsync, terrariumUtils
+from terrariumUtils import classproperty, terrariumSingleton, terrariumAsync, terrariumUtils
 import os
 
 # pip install meross-iot
@@ -24,6 +24,15 @@ from meross_iot.model.enums import Namespace
 
 class TerrariumMerossCloud(terrariumSingleton):
 
+  # Device data without a push message or refresh within this time is refreshed from the cloud
+  __STALE_TIMEOUT = 90 # in seconds
+  __REFRESH_INTERVAL = 30 # in seconds
+
+  @classproperty
+  def instance(__cls__):
+    # The running cloud connection, without creating a new one
+    return __cls__._instances.get(__cls__)
+
   @classproperty
   def is_enabled(__cls__):
     EMAIL    = terrariumUtils.decrypt(os.environ.get('MEROSS_EMAIL',''))
@@ -33,9 +42,21 @@ class TerrariumMerossCloud(terrariumSingleton):
 
   def __init__(self, username, password):
 
-    self.__engine = { 'cache' : terrariumCache(), 'running': False, 'reconnecting': False, 'restart_counter' : 0, 'error': False, 'event': None , 'asyncio' : terrariumAsync()}
+    self.__engine = { 'running': False, 'reconnecting': False, 'restart_counter' : 0, 'error': False, 'event': None , 'asyncio' : terrariumAsync()}
 
+    # Versioned device data store. Filled by push messages and refreshes, and it does not expire
     self._data = {}
+    self.__data_lock = threading.Lock()
+    self.__metrics = {'connects'        : 0,
+                      'reconnects'      : 0,
+                      'push_updates'    : 0,
+                      'refreshes'       : 0,
+                      'refresh_errors'  : 0,
+                      'last_push'       : None,
+                      'connect_time'    : None,
+                      'refresh_latency' : None,
+                      'toggle_latency'  : None}
+
     self._username = username
     self._password = password
 
@@ -43,19 +64,24 @@ class TerrariumMerossCloud(terrariumSingleton):
 
   def start(self, reconnecting = False):
 
-    def _run():
-      try:
-        data = asyncio.run_coroutine_threadsafe(self._main_process(), self.__engine['asyncio'].async_loop)
-        data.result()
-      except Exception as ex:
-        logger.exception(f'Error in cloud run: {ex}')
-        self.reconnect()
+    def _done(task):
+      if task.cancelled() or task.exception() is None:
+        return
+
+      logger.error(f'Error in cloud run: {task.exception()}')
+      # The callback runs in the event loop, so reconnect from a separate thread
+      threading.Thread(target=self.reconnect).start()
+
+    async def _event():
+      # The event has to belong to the event loop of the async runtime
+      return asyncio.Event()
 
     start_time = time()
     self.__engine['error']  = False
-    self.__engine['event']  = asyncio.Event()
-    self.__engine['thread'] = threading.Thread(target=_run)
-    self.__engine['thread'].start()
+    self.__engine['event']  = self.__engine['asyncio'].run(_event())
+    # The cloud connection is a long running task on the shared async runtime
+    self.__engine['task']   = self.__engine['asyncio'].create_task(self._main_process(), 'meross_cloud')
+    self.__engine['task'].add_done_callback(_done)
 
     if reconnecting:
       logger.info('Reconnecting to the Meross cloud')
@@ -73,9 +99,106 @@ class TerrariumMerossCloud(terrariumSingleton):
     if not self.__engine['error']:
       logger.info(f'Meross cloud is {"re-" if reconnecting else ""}connected! Found {len(self._data)} devices in {time()-start_time:.2f} seconds.')
 
-  def _store_data(self):
-    for key in self._data:
-      self.__engine['cache'].set_data(key, self._data[key],90)
+  def _set_device_data(self, key, value, source):
+    with self.__data_lock:
+      version = self._data[key]['version'] + 1 if key in self._data else 1
+      self._data[key] = {'value' : value, 'version' : version, 'timestamp' : time(), 'source' : source, 'refresh_failed' : False}
+
+  def _set_refresh_failed(self, key):
+    with self.__data_lock:
+      if key in self._data:
+        self._data[key]['refresh_failed'] = True
+
+  def get_device_data(self, key):
+    """
+    Get the last known data of a device. The data does not expire, use device_info() for the age of the data.
+
+    Args:
+        key (str): The device uuid (relays) or sub device id (sensors)
+
+    Returns:
+        any: The device data, or None when the device is unknown
+    """
+    data = self._data.get(f'{key}')
+    return None if data is None else data['value']
+
+  def device_info(self, key):
+    """
+    Get the store metadata of a device.
+
+    Args:
+        key (str): The device uuid (relays) or sub device id (sensors)
+
+    Returns:
+        dict: The version, timestamp, source, age, stale and expired state of the data, or None when the device is unknown.
+              Expired data is stale, and could not be refreshed
+    """
+    data = self._data.get(f'{key}')
+    if data is None:
+      return None
+
+    age = time() - data['timestamp']
+    stale = age > TerrariumMerossCloud.__STALE_TIMEOUT
+    return {'version'   : data['version'],
+            'timestamp' : data['timestamp'],
+            'source'    : data['source'],
+            'age'       : age,
+            'stale'     : stale,
+            'expired'   : stale and (data['refresh_failed'] or not self.__engine['running'])}
+
+  @property
+  def metrics(self):
+    """
+    Connection and latency metrics of the cloud connection. Latencies are in seconds.
+
+    Returns:
+        dict: The metrics
+    """
+    data = dict(self.__metrics)
+    data['connected'] = self.__engine['running']
+    data['devices'] = len(self._data)
+    data['stale_devices'] = len([key for key in list(self._data.keys()) if self.device_info(key)['stale']])
+    data['last_push_age'] = None if data['last_push'] is None else time() - data['last_push']
+
+    return data
+
+  def __store_device(self, device, source):
+    # Is a relay
+    if hasattr(device,'is_on'):
+      self._set_device_data(f'{device.uuid}', [device.is_on(channel=channel.index) for channel in device.channels], source)
+
+    # Is a sensor
+    if hasattr(device,'last_sampled_temperature'):
+      self._set_device_data(f'{device.subdevice_id}', {
+        'temperature' : device.last_sampled_temperature,
+        'humidity'    : device.last_sampled_humidity
+      }, source)
+
+  def __device_key(self, device):
+    return f'{device.subdevice_id}' if hasattr(device,'last_sampled_temperature') else f'{device.uuid}'
+
+  async def __refresh_stale_devices(self):
+    # Only the devices that did not send a push message for a while are updated, all at the same time
+    devices = [device for device in self.manager.find_devices() if (hasattr(device,'is_on') or hasattr(device,'last_sampled_temperature'))
+                                                                and (self.device_info(self.__device_key(device)) or {'stale' : True})['stale']]
+    if len(devices) == 0:
+      return
+
+    start = time()
+    results = await asyncio.gather(*[device.async_update() for device in devices], return_exceptions=True)
+    self.__metrics['refresh_latency'] = time() - start
+    self.__metrics['refreshes'] += 1
+
+    for device, result in zip(devices, results):
+      if isinstance(result, Exception):
+        self.__metrics['refresh_errors'] += 1
+        self._set_refresh_failed(self.__device_key(device))
+        logger.warning(f'Could not refresh Meross device {device.name}: {result}')
+        continue
+
+      self.__store_device(device, 'refresh')
+
+    logger.debug(f'Refreshed {len(devices)} stale Meross devices in {self.__metrics["refresh_latency"]:.2f} seconds.')
 
   def scan_hardware(self,type):
 
@@ -92,9 +215,7 @@ class TerrariumMerossCloud(terrariumSingleton):
     if not self.__engine['running']:
       return []
 
-    data = asyncio.run_coroutine_threadsafe(_scan_hardware(type), self.__engine['asyncio'].async_loop)
-    devices = data.result()
-    return devices
+    return self.__engine['asyncio'].run(_scan_hardware(type))
 
   def toggle_relay(self, device, switch, state):
     TIMEOUT = 5
@@ -122,25 +243,36 @@ class TerrariumMerossCloud(terrariumSingleton):
     offline.start()
 
     # Start the toggle action
-    data = asyncio.run_coroutine_threadsafe(_toggle_relay(device, switch, state), self.__engine['asyncio'].async_loop)
-    result = data.result()
-
-    # Stop the offline detection
-    offline.cancel()
+    start = time()
+    try:
+      result = self.__engine['asyncio'].run(_toggle_relay(device, switch, state), TIMEOUT+2)
+      self.__metrics['toggle_latency'] = time() - start
+    except asyncio.TimeoutError:
+      result = None
+    finally:
+      # Stop the offline detection
+      offline.cancel()
 
     return result
 
   def stop(self):
     logger.info('Stopping Meross cloud ... ')
     self.__engine['running'] = False
-    self.__engine['event'].set()
-    self.__engine['thread'].join()
+    # The event belongs to the event loop, so it has to be set from there
+    self.__engine['asyncio'].async_loop.call_soon_threadsafe(self.__engine['event'].set)
+    try:
+      self.__engine['task'].result(30)
+    except Exception as ex:
+      if not self.__engine['task'].done():
+        logger.warning(f'Meross cloud did not stop in time. Cancelling: {ex}')
+        self.__engine['task'].cancel()
 
   def reconnect(self):
     if self.__engine['reconnecting']:
       return
 
     self.__engine['reconnecting'] = True
+    self.__metrics['reconnects'] += 1
     logger.warning('Reconnecting to Meross cloud. Somehow the connection was lost ...')
     self.stop()
     self.start(True)
@@ -156,26 +288,18 @@ class TerrariumMerossCloud(terrariumSingleton):
 
     async def _notification(namespace: Namespace, data: dict, device_internal_id: str, *args, **kwargs):
       for device in data:
+        self.__store_device(device, 'push')
+        self.__metrics['push_updates'] += 1
+        self.__metrics['last_push'] = time()
 
         if hasattr(device,'is_on'):
-          self._data[f'{device.uuid}'] = []
-
-          for channel in device.channels:
-            self._data[f'{device.uuid}'].append(device.is_on(channel=channel.index))
-
-          logger.info(f'Got an update from the Meross Cloud. Relay state {device.uuid} {self._data[device.uuid]}')
+          logger.info(f'Got an update from the Meross Cloud. Relay state {device.uuid} {self.get_device_data(device.uuid)}')
 
         if hasattr(device,'last_sampled_temperature'):
-          self._data[f'{device.subdevice_id}'] = {
-            'temperature' : device.last_sampled_temperature,
-            'humidity'    : device.last_sampled_humidity
-          }
-
           logger.info(f'Got an update from the Meross Cloud. Setting temperature to {device.last_sampled_temperature} and humidity to {device.last_sampled_humidity}')
 
-      self._store_data()
-
     try:
+      start = time()
       # Setup the HTTP client API from user-password
       http_api_client = await MerossHttpClient.async_from_user_password(email=self._username, password=self._password)
 
@@ -183,35 +307,19 @@ class TerrariumMerossCloud(terrariumSingleton):
       self.manager = MerossManager(http_client=http_api_client)
       await self.manager.async_init()
 
-      # Discover devices.
+      # Discover devices, and get their initial state all at the same time
       await self.manager.async_device_discovery()
-      meross_devices = self.manager.find_devices()
-      for dev in meross_devices:
-
-        # Is a relay
-        if hasattr(dev,'is_on'):
-          await dev.async_update()
-          self._data[f'{dev.uuid}'] = []
-
-          for channel in dev.channels:
-            self._data[f'{dev.uuid}'].append(dev.is_on(channel=channel.index))
-
-        # Is a sensor
-        if hasattr(dev,'last_sampled_temperature'):
-          await dev.async_update()
-          self._data[f'{dev.subdevice_id}'] = {
-            'temperature' : dev.last_sampled_temperature,
-            'humidity'    : dev.last_sampled_humidity
-          }
-
-      self._store_data()
+      await self.__refresh_stale_devices()
+
+      self.__metrics['connects'] += 1
+      self.__metrics['connect_time'] = time() - start
       self.__engine['running'] = True
       self.__engine['reconnecting'] = False
       self.__engine['restart_counter'] = 0
       self.manager.register_push_notification_handler_coroutine(_notification)
 
-      while not await event_wait(self.__engine['event'], 30):
-        self._store_data()
+      while not await event_wait(self.__engine['event'], TerrariumMerossCloud.__REFRESH_INTERVAL):
+        await self.__refresh_stale_devices()
 
     except CommandTimeoutError:
       logger.error('Meross communication timed out connecting with the server.')
@@ -221,7 +329,8 @@ class TerrariumMerossCloud(terrariumSingleton):
 
     except TooManyTokensException as ex:
       logger.error(ex)
-      self.stop()
+      # This runs in the event loop, so do not wait for the task itself to stop
+      self.__engine['running'] = False
 
     except socket.timeout:
       self.__engine['error'] = True
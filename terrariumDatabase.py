@@ -8,6 +8,7 @@ from terrariumUtils import terrariumUtils
 import copy
 import re
 import sqlite3
+import threading
 import time
 
 DATABASE = 'data/terrariumpi.db'
@@ -115,6 +116,17 @@ def recover():
     # init(version)
     return True
 
+def latest_history_values(table, column, max_age):
+  """
+  Get the latest history value for all the items in a history table with a single query
+
+  Returns:
+      dict: Latest value per item id. Items without a value in the last max_age seconds are not in the dict
+  """
+  timestamp_limit = (datetime.now() - timedelta(seconds=max_age)).strftime('%Y-%m-%d %H:%M:%S')
+  # SQLite returns the value of the row with the MAX(timestamp) in every group
+  return { row[0] : row[1] for row in db.select(f'SELECT "{column}", "value", MAX("timestamp") FROM "{table}" WHERE "timestamp" >= $timestamp_limit GROUP BY "{column}"') }
+
 class Area(db.Entity):
 
   __VALID_TYPES = ['lights','watertank'] # + All sensor types....
@@ -128,6 +140,42 @@ class Area(db.Entity):
 
   state     = orm.Optional(orm.Json)
 
+  # Sensor id => area ids. Loaded on first use, and cleared with clear_sensor_areas() after the sensors of an area are
+  # changed and committed. The area state is written every engine round, so the normal updates do not clear it
+  __sensor_areas = None
+  __sensor_areas_lock = threading.Lock()
+
+  @staticmethod
+  def sensor_areas(sensor_id):
+    """
+    Get the areas that use a sensor, without loading all the areas on every call.
+
+    Args:
+        sensor_id (str): The sensor id
+
+    Returns:
+        list: The ids of the areas that use the sensor
+    """
+    with Area.__sensor_areas_lock:
+      if Area.__sensor_areas is None:
+        sensor_areas = {}
+        for area in Area.select():
+          for area_sensor in (area.setup or {}).get('sensors', []):
+            sensor_areas.setdefault(area_sensor, []).append(area.id)
+
+        Area.__sensor_areas = sensor_areas
+
+      return Area.__sensor_areas.get(sensor_id, [])
+
+  @staticmethod
+  def clear_sensor_areas():
+    """
+    Clear the sensor to area mapping. Call this after the transaction that adds, deletes or changes the sensors of an
+    area is committed, else another thread could load the mapping again before the changes are visible.
+    """
+    with Area.__sensor_areas_lock:
+      Area.__sensor_areas = None
+
   def __repr__(self):
     return f'Area {self.type} {self.name} in {self.mode} mode, part of {self.enclosure}'
 
@@ -165,6 +213,10 @@ class Button(db.Entity):
 
   enclosure   = orm.Optional(lambda: Enclosure)
 
+  @staticmethod
+  def latest_values():
+    return latest_history_values('ButtonHistory', 'button', Button.__MAX_VALUE_AGE)
+
   @property
   def value(self):
     timestamp_limit = datetime.now() - timedelta(seconds=Button.__MAX_VALUE_AGE)
@@ -191,11 +243,11 @@ class Button(db.Entity):
 
       return button_data
 
-  def to_dict(self, only=None, exclude=None, with_collections=False, with_lazy=False, related_objects=False):
+  def to_dict(self, only=None, exclude=None, with_collections=False, with_lazy=False, related_objects=False, latest_values=None):
     data = copy.deepcopy(super().to_dict(only, exclude, with_collections, with_lazy, related_objects))
-    # Add extra fields
-    data['value']  = self.value
-    data['error']  = self.error
+    # Add extra fields. Use the prefetched latest values when available
+    data['value']  = self.value if latest_values is None else latest_values.get(self.id)
+    data['error']  = data['value'] is None
 
     return data
 
@@ -338,6 +390,10 @@ class Relay(db.Entity):
 
   webcam      = orm.Optional(lambda: Webcam)
 
+  @staticmethod
+  def latest_values():
+    return latest_history_values('RelayHistory', 'relay', Relay.__MAX_VALUE_AGE)
+
   @property
   def value(self):
     value = self.history.filter(lambda h: h.timestamp >= datetime.now() - timedelta(seconds=Relay.__MAX_VALUE_AGE)).order_by(orm.desc(RelayHistory.timestamp)).first()
@@ -380,14 +436,14 @@ class Relay(db.Entity):
   def type(self):
     return 'dimmer' if self.is_dimmer else 'relay'
 
-  def to_dict(self, only=None, exclude=None, with_collections=False, with_lazy=False, related_objects=False):
+  def to_dict(self, only=None, exclude=None, with_collections=False, with_lazy=False, related_objects=False, latest_values=None):
     data = copy.deepcopy(super().to_dict(only, exclude, with_collections, with_lazy, related_objects))
 
-    # Add extra fields
+    # Add extra fields. Use the prefetched latest values when available
     data['dimmer']      = self.is_dimmer
-    data['value']       = self.value
+    data['value']       = self.value if latest_values is None else latest_values.get(self.id)
     data['replacement'] = self.replacement.timestamp()
-    data['error']       = self.error
+    data['error']       = data['value'] is None
 
     return data
 
@@ -459,6 +515,10 @@ class Sensor(db.Entity):
 
     return not self.alarm_min <= self.value <= self.alarm_max
 
+  @staticmethod
+  def latest_values():
+    return latest_history_values('SensorHistory', 'sensor', Sensor.__MAX_VALUE_AGE)
+
   @property
   def value(self):
     value = self.history.filter(lambda h: h.timestamp >= datetime.now() - timedelta(seconds=Sensor.__MAX_VALUE_AGE)).order_by(orm.desc(SensorHistory.timestamp)).first()
@@ -471,13 +531,13 @@ class Sensor(db.Entity):
   def error(self):
     return True if self.value is None else False
 
-  def to_dict(self, only=None, exclude=None, with_collections=False, with_lazy=False, related_objects=False):
+  def to_dict(self, only=None, exclude=None, with_collections=False, with_lazy=False, related_objects=False, latest_values=None):
     data = copy.deepcopy(super().to_dict(only, exclude, with_collections, with_lazy, related_objects))
-    # Add extra fields
-    data['value']  = self.value
+    # Add extra fields. The value is only loaded once, or taken from the prefetched latest values
+    data['value']  = self.value if latest_values is None else latest_values.get(self.id)
     data['offset'] = self.offset
-    data['alarm']  = self.alarm
-    data['error']  = self.error
+    data['error']  = data['value'] is None
+    data['alarm']  = False if data['error'] else not self.alarm_min <= data['value'] <= self.alarm_max
 
     return data
 
@@ -493,6 +553,9 @@ class Sensor(db.Entity):
     if sensor_data and self.__VALUE_MODE == 1:
       return sensor_data
 
+    # The current contribution of this sensor to the average history
+    old_data = None if not sensor_data or sensor_data.exclude_avg else (sensor_data.value, sensor_data.alarm_min, sensor_data.alarm_max)
+
     if (sensor_data):
       # Mode 2 will take previous value and current and average it.
       # Mode 3 will just overwrite existing value
@@ -518,8 +581,23 @@ class Sensor(db.Entity):
         exclude_avg = self.exclude_avg
       )
 
+    new_data = None if sensor_data.exclude_avg else (sensor_data.value, sensor_data.alarm_min, sensor_data.alarm_max)
+    self.__update_average_history(timestamp, old_data, new_data)
+
     return sensor_data
 
+  def __update_average_history(self, timestamp, old_data, new_data):
+    if old_data == new_data:
+      return
+
+    # Replace the old contribution with the new contribution in the sensor type and area averages
+    delta  = [(0.0 if new_data is None else new_data[i]) - (0.0 if old_data is None else old_data[i]) for i in range(3)]
+    amount = (0 if new_data is None else 1) - (0 if old_data is None else 1)
+
+    sources = [f'type:{self.type}'] + [f'area:{area_id}' for area_id in Area.sensor_areas(self.id)]
+    for source in sources:
+      SensorAverageHistory.add(source, timestamp, delta[0], delta[1], delta[2], amount)
+
   def __repr__(self):
     return f'{self.hardware} {self.type} named \'{self.name}\' at address \'{self.address}\''
 
@@ -546,6 +624,80 @@ class SensorHistory(db.Entity):
     return not self.alarm_min <= self.value <= self.alarm_max
 
 
+class SensorAverageHistory(db.Entity):
+  # Materialized totals of the sensor history per sensor type ('type:<type>') or area ('area:<id>'), so the average
+  # graphs do not need to aggregate the full sensor history. Sensors with exclude_avg enabled are not included.
+  source          = orm.Required(str)
+
+  timestamp       = orm.Required(datetime)
+  value_total     = orm.Required(float)
+  alarm_min_total = orm.Required(float)
+  alarm_max_total = orm.Required(float)
+  amount          = orm.Required(int)
+
+  orm.PrimaryKey(source, timestamp)
+
+  @property
+  def value(self):
+    return self.value_total / self.amount
+
+  @property
+  def alarm_min(self):
+    return self.alarm_min_total / self.amount
+
+  @property
+  def alarm_max(self):
+    return self.alarm_max_total / self.amount
+
+  @staticmethod
+  def add(source, timestamp, value, alarm_min, alarm_max, amount):
+    average_data = SensorAverageHistory.get(source = source, timestamp = timestamp)
+    if average_data is None:
+      if amount > 0:
+        SensorAverageHistory(source = source, timestamp = timestamp, value_total = value, alarm_min_total = alarm_min, alarm_max_total = alarm_max, amount = amount)
+
+      return
+
+    if average_data.amount + amount <= 0:
+      average_data.delete()
+      return
+
+    average_data.value_total     += value
+    average_data.alarm_min_total += alarm_min
+    average_data.alarm_max_total += alarm_max
+    average_data.amount          += amount
+
+  @staticmethod
+  def rebuild(source):
+    """
+    Recalculate the full average history of a sensor type or area. Only needed when the sensors of the source are changed.
+    """
+    db.execute('DELETE FROM "SensorAverageHistory" WHERE "source" = $source')
+
+    source_type, source_id = source.split(':', 1)
+    if 'type' == source_type:
+      db.execute("""INSERT INTO "SensorAverageHistory" ("source", "timestamp", "value_total", "alarm_min_total", "alarm_max_total", "amount")
+                      SELECT $source, "SensorHistory"."timestamp", TOTAL("SensorHistory"."value"), TOTAL("SensorHistory"."alarm_min"), TOTAL("SensorHistory"."alarm_max"), COUNT(*)
+                        FROM "SensorHistory"
+                        JOIN "Sensor" ON "Sensor"."id" = "SensorHistory"."sensor"
+                       WHERE "SensorHistory"."exclude_avg" = 0 AND "Sensor"."type" = $source_id
+                    GROUP BY "SensorHistory"."timestamp"
+                    """)
+
+    elif 'area' == source_type:
+      db.execute("""INSERT INTO "SensorAverageHistory" ("source", "timestamp", "value_total", "alarm_min_total", "alarm_max_total", "amount")
+                      SELECT $source, "SensorHistory"."timestamp", TOTAL("SensorHistory"."value"), TOTAL("SensorHistory"."alarm_min"), TOTAL("SensorHistory"."alarm_max"), COUNT(*)
+                        FROM "Area", json_each("Area"."setup", '$$.sensors') AS "AreaSensor"
+                        JOIN "SensorHistory" ON "SensorHistory"."sensor" = "AreaSensor"."value"
+                       WHERE "SensorHistory"."exclude_avg" = 0 AND "Area"."id" = $source_id
+                    GROUP BY "SensorHistory"."timestamp"
+                    """)
+
+  @staticmethod
+  def delete_source(source):
+    db.execute('DELETE FROM "SensorAverageHistory" WHERE "source" = $source')
+
+
 class Setting(db.Entity):
   id    = orm.PrimaryKey(str)
   value = orm.Optional(str)
@@ -98,10 +98,43 @@ class terrariumEnclosure(object):
         # This area is already processed...
         continue
 
-      area_states[area_id] = self.areas[area_id].update(read_only)
+      area = self.areas[area_id]
+      if not area.needs_update(read_only):
+        # Nothing changed for this area, so no need to evaluate it again
+        continue
+
+      old_state = (area.state.get('powered'), area.state.get('is_day'), area.state.get('sensors',{}).get('alarm'))
+      area_states[area_id] = area.update(read_only)
+
+      if old_state != (area.state.get('powered'), area.state.get('is_day'), area.state.get('sensors',{}).get('alarm')):
+        self.__area_changed(area)
 
     return area_states
 
+  def __area_changed(self, changed_area):
+    # The main lights are used for the light state, timer tables and day/night changes of other areas.
+    # Other areas can depend on the alarm state of the changed area
+    main_lights = changed_area.setup.get('main_lights', False)
+    for area in self.areas.values():
+      if area.id != changed_area.id and (main_lights or changed_area.id in area.depends_on):
+        area.notify()
+
+  def notify(self, sensors = [], relays = [], doors = [], all = False):
+    """
+    Mark the areas that use one of the changed sensors, relays or doors, so they are evaluated in the next update.
+
+    Args:
+        sensors (list): IDs of the changed sensors
+        relays (list): IDs of the changed relays
+        doors (list): IDs of the changed doors
+        all (bool): Mark all the areas, like after a setup change
+    """
+    door_change = len(set(doors) & set(self.doors)) > 0
+
+    for area in self.areas.values():
+      if all or door_change or area.depends_on_input(sensors, relays):
+        area.notify()
+
   def stop(self):
     for area_id in self.areas:
       self.areas[area_id].stop()
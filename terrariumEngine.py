@@ -1,5 +1,4 @@
 # -*- coding: utf-8 -*-
-from hardware.webcam.rpilive_webcam import terrariumRPILiveWebcam
 import terrariumLogging
 logger = terrariumLogging.logging.getLogger(__name__)
 
@@ -8,7 +7,6 @@ import time
 import datetime
 import os
 import psutil
-import subprocess
 import re
 import pyfiglet
 import copy
@@ -21,18 +19,19 @@ from pathlib import Path
 from gevent import sleep
 from packaging.version import Version
 from pyfancy.pyfancy import pyfancy
+from ansi2html import Ansi2HTMLConverter
 
 from pony import orm
-from terrariumDatabase import init as init_db, db, Setting, Sensor, Relay, Button, Webcam, Enclosure
+from terrariumDatabase import init as init_db, db, Setting, Sensor, Relay, Button, Webcam, Enclosure, Area
 from terrariumWebserver import terrariumWebserver
 from terrariumCalendar import terrariumCalendar
-from terrariumUtils import terrariumUtils, terrariumAsync
+from terrariumUtils import terrariumUtils, terrariumAsync, terrariumScriptPool
 from terrariumEnclosure import terrariumEnclosure
 from terrariumArea import terrariumArea
 from terrariumCloud import TerrariumMerossCloud
 
 from weather import terrariumWeather
-from hardware.sensor import terrariumSensor, terrariumSensorLoadingException
+from hardware.sensor import terrariumSensor, terrariumSensorLoadingException, terrariumBluetoothHelpers, terrariumBluetoothCollector, terrariumAnalogSampler
 from hardware.relay import terrariumRelay, terrariumRelayLoadingException, terrariumRelayUpdateException
 from hardware.button import terrariumButton, terrariumButtonLoadingException
 from hardware.webcam import terrariumWebcam, terrariumWebcamLoadingException
@@ -46,6 +45,9 @@ def N_(message):
 class terrariumEngine(object):
   __ENGINE_LOOP_TIMEOUT          = 30.0 # in seconds
   __VERSION_UPDATE_CHECK_TIMEOUT = 1    # in days
+  __RELAY_CALLBACK_WINDOW        = 0.5  # in seconds
+  __SYSTEM_STATS_INTERVAL        = 10.0 # in seconds
+  __MOTD_REFRESH_INTERVAL        = 300  # in seconds
 
   def __init__(self, version):
     self.starttime = time.time()
@@ -79,11 +81,29 @@ class terrariumEngine(object):
 
     self.__engine = {'exit'    : threading.Event(),
                      'thread'  : None,
-                     'logtail' : None,
                      'too_late': 0,
                      'systemd' : sdnotify.SystemdNotifier(),
                      'asyncio' : terrariumAsync()}
 
+    # Relay changes within a short window are processed together
+    self.__relay_changes = {'lock'  : threading.Lock(),
+                            'timer' : None}
+
+    # Shared snapshot of the system metrics, which is sampled at most once per interval
+    self.__system_stats = {'lock'      : threading.Lock(),
+                           'timestamp' : 0,
+                           'boot_time' : psutil.boot_time(),
+                           'cpu_count' : psutil.cpu_count(),
+                           'data'      : None}
+
+    # The MOTD model of the last engine round, its change key, and the lazy rendered versions of the model
+    self.__motd = {'lock'      : threading.RLock(),
+                   'key'       : None,
+                   'model'     : None,
+                   'timestamp' : None,
+                   'text'      : None,
+                   'html'      : None}
+
     self.meross_cloud = None
 
     self.version = version
@@ -166,10 +186,7 @@ class terrariumEngine(object):
 
     # Return console logging back to 'normal'
     terrariumLogging.logging.getLogger().handlers[0].setLevel(old_log_level)
-    self.__engine['logtail'] = threading.Thread(target=self.__log_tailing)
-    self.__engine['thread']  = threading.Thread(target=self.__engine_loop)
-
-    self.__engine['logtail'].start()
+    self.__engine['thread'] = threading.Thread(target=self.__engine_loop)
     self.__engine['thread'].start()
 
     # Start the web server. This will be ending by pressing Ctrl-C or sending kill -INT {PID}
@@ -400,6 +417,7 @@ class terrariumEngine(object):
       if 'calibration' in data:
         self.buttons[data['id']].calibrate(data['calibration'])
 
+      self._notify_enclosures(doors = [data['id']])
       update_ok = True
 
     elif issubclass(item, terrariumRelay):
@@ -412,11 +430,14 @@ class terrariumEngine(object):
       if self.relays[data['id']].is_dimmer:
         self.relays[data['id']].calibrate(data['calibration'])
 
+      self._notify_enclosures(relays = [data['id']])
       update_ok = True
 
     elif issubclass(item, terrariumSensor):
       self.sensors[data['id']].address = data['address']
       self.sensors[data['id']].name    = data['name']
+      # The alarm values could be changed, so the areas that use this sensor have to be evaluated again
+      self._notify_enclosures(sensors = [data['id']])
       update_ok = True
 
     elif issubclass(item, terrariumWebcam):
@@ -427,7 +448,7 @@ class terrariumEngine(object):
       self.webcams[data['id']].rotation   = data['rotation']
       self.webcams[data['id']].awb        = data['awb']
 
-      if isinstance(self.webcams[data['id']], terrariumRPILiveWebcam):
+      if 'rpicam-live' == self.webcams[data['id']].HARDWARE:
         logger.info(f'Stopping webcam {self.webcams[data["id"]].name}')
         self.webcams[data['id']].stop()
         sleep(0.2)
@@ -437,6 +458,12 @@ class terrariumEngine(object):
       update_ok = True
 
     elif issubclass(item, terrariumEnclosure):
+      if data.get('id') in self.enclosures:
+        enclosure = self.enclosures[data['id']]
+        enclosure.name  = data.get('name', enclosure.name)
+        enclosure.doors = data.get('doors', enclosure.doors)
+        enclosure.notify(all = True)
+
       update_ok = True
 
     elif issubclass(item, terrariumArea):
@@ -554,9 +581,11 @@ class terrariumEngine(object):
   # -= NEW =-
   def _update_sensors(self):
     sensors = []
+    changed_sensors = []
+    batch = {}
     with orm.db_session():
-      # Get all loaded sensors ordered by hardware address
-      sensors = sorted(Sensor.select(lambda s: s.id in self.sensors.keys() and not s.id in self.settings['exclude_ids'])[:], key=lambda item: item.address)
+      # Get all loaded sensors ordered by update group (I2C bus and multiplexer channel) and hardware address
+      sensors = sorted(Sensor.select(lambda s: s.id in self.sensors.keys() and not s.id in self.settings['exclude_ids'])[:], key=lambda item: (self.sensors[item.id].update_group, item.address))
 
     for sensor in sensors:
       with orm.db_session():
@@ -628,16 +657,28 @@ class terrariumEngine(object):
 
         if new_value != current_value:
           self.notification.message('sensor_change' , sensor_data)
+          changed_sensors.append(sensor.id)
 
         if sensor_data['alarm']:
           self.notification.message('sensor_alarm' , sensor_data)
 
+        batch[sensor.id] = { field: sensor_data[field] for field in ['type', 'value', 'unit', 'alarm', 'error'] }
+
         logger.info(f'Updated sensor {sensor} with new value {new_value:.2f}{self.units[sensor.type]} in {measurement_time+db_time:.2f} seconds.')
         logger.debug(f'Updated sensor {sensor} with new value {new_value:.2f}{self.units[sensor.type]}. M: {measurement_time:.2f} sec, DB:{db_time:.2f} sec.')
 
       # A small sleep between sensor measurement to get a bit more responsiveness of the system
       sleep(0.1)
 
+    # Send all the new sensor values of this round in one message to the services that support it
+    if len(batch) > 0:
+      self.notification.batch('sensors', batch)
+      self.webserver.api.invalidate_cache('sensors')
+
+    # Only the areas that use the changed sensors need to be evaluated
+    if len(changed_sensors) > 0:
+      self._notify_enclosures(sensors = changed_sensors)
+
     for sensor_type, avg_data in self.sensor_averages.items():
       avg_data['id'] = sensor_type
       self.webserver.websocket_message('sensor', avg_data)
@@ -780,6 +821,9 @@ class terrariumEngine(object):
       # Get all loaded relays ordered by hardware address
       relays = sorted(Relay.select(lambda r: r.id in self.relays.keys() and not r.id in self.settings['exclude_ids'])[:], key=lambda item: item.address)
 
+    # Read all the async (network) relays at once, so the updates below can use that data
+    terrariumRelay.update_async([self.relays[relay.id] for relay in relays])
+
     for relay in relays:
       with orm.db_session():
         current_value = relay.value
@@ -811,10 +855,14 @@ class terrariumEngine(object):
 
       if new_value != current_value:
         self.notification.message('relay_change' , relay_data)
+        self._notify_enclosures(relays = [relay.id])
 
       # A small sleep between sensor measurement to get a bit more responsiveness of the system
-      sleep(0.1)
+      # Relays on a shared board are served from a single board read, so they do not need the pause
+      if self.relays[relay.id].board_key is None:
+        sleep(0.1)
 
+    self.webserver.api.invalidate_cache('relays')
     self.webserver.websocket_message('power_usage_water_flow', self.get_power_usage_water_flow)
 
 
@@ -847,12 +895,25 @@ class terrariumEngine(object):
       relay.update(state)
       relay_data = relay.to_dict()
 
-    # Update totals through websocket
-    self.webserver.websocket_message('power_usage_water_flow', self.get_power_usage_water_flow)
+    self.webserver.api.invalidate_cache('relays')
 
     # Notification message
     self.notification.message('relay_toggle' , relay_data)
 
+    # Mark the areas that use this relay. The enclosures and totals are updated once for all the relay changes in the current window
+    self._notify_enclosures(relays = [relay_data['id']])
+    with self.__relay_changes['lock']:
+      if self.__relay_changes['timer'] is None:
+        self.__relay_changes['timer'] = threading.Timer(terrariumEngine.__RELAY_CALLBACK_WINDOW, self.__process_relay_changes)
+        self.__relay_changes['timer'].start()
+
+  def __process_relay_changes(self):
+    with self.__relay_changes['lock']:
+      self.__relay_changes['timer'] = None
+
+    # Update totals through websocket
+    self.webserver.websocket_message('power_usage_water_flow', self.get_power_usage_water_flow)
+
     # Update enclosure states to reflect the new relay states
     if self.__engine['thread'] is not None and self.__engine['thread'].is_alive() and hasattr(self,'enclosures'):
       self._update_enclosures(True)
@@ -925,6 +986,8 @@ class terrariumEngine(object):
 
       if new_value != current_value:
         self.notification.message('button_change' , button_data)
+        self._notify_enclosures(doors = [button.id])
+        self.webserver.api.invalidate_cache('buttons')
 
       # A small sleep between sensor measurement to get a bit more responsiveness of the system
       sleep(0.1)
@@ -949,9 +1012,14 @@ class terrariumEngine(object):
       button.update(state,True)
       button_data = button.to_dict()
 
+    self.webserver.api.invalidate_cache('buttons')
+
     # Update the button state on the button page
     self.webserver.websocket_message('button', button_data)
 
+    # Areas in the enclosure of a door have to be evaluated again
+    self._notify_enclosures(doors = [button_data['id']])
+
     # Notification message
     self.notification.message('button_action', button_data)
 
@@ -1060,24 +1128,39 @@ class terrariumEngine(object):
         new_enclosure.update()
         logger.info(f'Loaded {enclosure} in {time.time()-start:.2f} seconds.')
 
+  # -= NEW =-
+  def _notify_enclosures(self, sensors = [], relays = [], doors = [], all = False):
+    if not hasattr(self, 'enclosures') or not (all or len(sensors) + len(relays) + len(doors) > 0):
+      return
+
+    for enclosure in self.enclosures.values():
+      enclosure.notify(sensors, relays, doors, all)
+
   # -= NEW =-
   def _update_enclosures(self, read_only = False):
-    with orm.db_session():
-      for enclosure in Enclosure.select():
-        if str(enclosure.id) not in self.enclosures.keys() or str(enclosure.id) in self.settings['exclude_ids']:
-          continue
+    for enclosure_id, enclosure in self.enclosures.items():
+      if enclosure_id in self.settings['exclude_ids']:
+        continue
 
-        start = time.time()
-        area_states = self.enclosures[str(enclosure.id)].update(read_only)
-        for area in enclosure.areas:
-          area_state = area_states.get(str(area.id),None)
-          if area_state:
+      start = time.time()
+      # Only the areas with changed inputs or running timers are updated
+      area_states = enclosure.update(read_only)
+      if len(area_states) == 0:
+        logger.debug(f'No changes for {enclosure}.')
+        continue
+
+      with orm.db_session():
+        for area_id, area_state in area_states.items():
+          area = Area.get(id=area_id)
+          if area_state and area is not None:
             area.state = area_state
 
-        measurement_time = time.time() - start
+      self.webserver.api.invalidate_cache('areas')
+
+      measurement_time = time.time() - start
 
-        logger.info(f'Updated {enclosure} in {measurement_time:.2f} seconds.')
-        logger.debug(f'Updated {enclosure}. M: {measurement_time:.2f} sec.')
+      logger.info(f'Updated {len(area_states)} areas of {enclosure} in {measurement_time:.2f} seconds.')
+      logger.debug(f'Updated {enclosure}. M: {measurement_time:.2f} sec.')
 
   # -= NEW =-
   def __engine_loop(self):
@@ -1113,14 +1196,7 @@ class terrariumEngine(object):
       self.motd()
 
       # Cleanup hanging bluetooth helper scripts....
-      current_process = psutil.Process()
-      for process in current_process.children(recursive=True):
-        if 'bluepy-helper' in ' '.join(process.cmdline()):
-          try:
-            logger.warning('Killing hanging bluetooth helper process')
-            process.kill()
-          except Exception as ex:
-            logger.error(f'Error killing hanging bluetooth helper process: {ex}')
+      terrariumBluetoothHelpers.reap()
 
       duration = time.time() - start
       time_left = terrariumEngine.__ENGINE_LOOP_TIMEOUT - duration
@@ -1157,27 +1233,89 @@ class terrariumEngine(object):
 
     logger.info('Stopped main engine thread')
 
-  def motd(self):
-    # Enable translations
-    _ = terrariumUtils.get_translator(self.active_language)
+  def __motd_model(self):
+    # Collect all the values that are shown in the MOTD
+    stats = self.system_stats()
 
     motd_data = {}
+    motd_data['uptime'] = terrariumUtils.format_uptime(int(stats['uptime'] / 60) * 60)
+    motd_data['system_load'] = str(stats['load']['absolute'])[1:-1]
+    motd_data['system_load_alarm'] = stats['load']['absolute'][0] > 1.0
 
-    # Default left padding
-    padding = 2 * ' '
-    # Longest text lines first...
-    tmp = self.system_stats()
+    motd_data['cpu_temperature'] = f'{stats["cpu_temperature"]} {self.units["temperature"]}'
+    motd_data['cpu_temperature_alarm'] = stats["cpu_temperature"] > 50
 
-    motd_data['uptime'] = terrariumUtils.format_uptime(tmp['uptime'])
-    motd_data['system_load'] = str(tmp['load']['absolute'])[1:-1]
-    motd_data['system_load_alarm'] = tmp['load']['absolute'][0] > 1.0
+    motd_data['storage'] = f'{terrariumUtils.format_filesize(stats["storage"]["used"])}({ stats["storage"]["used"] / stats["storage"]["total"] * 100:.2f}%) used of total {terrariumUtils.format_filesize(stats["storage"]["total"])}'
+    motd_data['memory']  = f'{terrariumUtils.format_filesize(stats["memory"]["used"])}({ stats["memory"]["used"] / stats["memory"]["total"] * 100:.2f}%) used of total {terrariumUtils.format_filesize(stats["memory"]["total"])}'
 
-    motd_data['cpu_temperature'] = f'{tmp["cpu_temperature"]} {self.units["temperature"]}'
-    motd_data['cpu_temperature_alarm'] = tmp["cpu_temperature"] > 50
+    # Get the sensors averages
+    for avg_type, avg_data in self.sensor_averages.items():
+      motd_data[f'average_{avg_type}']       = avg_data['value']
+      motd_data[f'average_{avg_type}_unit']  = self.units[avg_type]
+      motd_data[f'average_{avg_type}_alarm'] = not avg_data['alarm_min'] <= avg_data['value'] <= avg_data['alarm_max']
 
-    motd_data['storage'] = f'{terrariumUtils.format_filesize(tmp["storage"]["used"])}({ tmp["storage"]["used"] / tmp["storage"]["total"] * 100:.2f}%) used of total {terrariumUtils.format_filesize(tmp["storage"]["total"])}'
-    motd_data['memory']  = f'{terrariumUtils.format_filesize(tmp["memory"]["used"])}({ tmp["memory"]["used"] / tmp["memory"]["total"] * 100:.2f}%) used of total {terrariumUtils.format_filesize(tmp["memory"]["total"])}'
+    # Relays
+    relays = []
+    relay_averages = {'power': {'current' : 0, 'max' : 0}, 'flow': {'current' : 0, 'max' : 0}}
+    with orm.db_session():
+      for relay in Relay.select(lambda r: r.id in self.relays.keys() and not r.id in self.settings['exclude_ids']):
+        relay_averages['power']['current'] += relay.current_wattage
+        relay_averages['power']['max']     += relay.wattage
 
+        relay_averages['flow']['current']  += relay.current_flow
+        relay_averages['flow']['max']      += relay.flow
+
+        if not relay.is_on:
+          continue
+
+        relays.append({
+          'name'    : relay.name,
+          'dimmer'  : f'{relay.value:.0f}' if relay.is_dimmer else None,
+          'wattage' : f'{relay.current_wattage:.2f}',
+          'flow'    : f'{relay.current_flow:.2f}'
+        })
+
+    motd_data['current_watt']  = relay_averages['power']['current']
+    motd_data['max_watt']      = relay_averages['power']['max']
+    motd_data['current_flow']  = relay_averages['flow']['current']
+    motd_data['max_flow']      = relay_averages['flow']['max']
+    motd_data['relays_active'] = len(relays)
+
+    return {
+      'language'       : self.active_language,
+      'title'          : self.settings['title'],
+      'version'        : self.version,
+      'latest_version' : self.latest_version,
+      'too_late'       : self.__engine['too_late'] if self.__engine['too_late'] > 30 else 0,
+      'relays_total'   : len(self.relays),
+      'relays'         : relays,
+      'data'           : motd_data
+    }
+
+  def __motd_key(self, model):
+    # Only the values that change the meaning of the MOTD. The volatile metrics (load, temperatures, usage, averages and
+    # power usage) are left out, and are rendered when the MOTD is read
+    data = model['data']
+    return {
+      'language'       : model['language'],
+      'title'          : model['title'],
+      'version'        : model['version'],
+      'latest_version' : model['latest_version'],
+      'too_late'       : model['too_late'],
+      'relays_total'   : model['relays_total'],
+      'relays'         : [(relay['name'], relay['dimmer']) for relay in model['relays']],
+      'alarms'         : { key : value for key, value in data.items() if key.endswith(('_alarm', '_unit')) }
+    }
+
+  def __render_motd(self, model):
+    # Enable translations
+    _ = terrariumUtils.get_translator(model['language'])
+    motd_data = model['data']
+
+    # Default left padding
+    padding = 2 * ' '
+
+    # Longest text lines first...
     system_stats = []
     system_stats.append({
       'title' : _('Up time') + ':',
@@ -1216,21 +1354,20 @@ class terrariumEngine(object):
     avg_unit_length  = 0
 
     # Get the sensors averages sorted on type name
-    tmp = self.sensor_averages
     averages = []
-    if len(tmp) > 0:
-      for avg_type in self.sensor_averages.keys():
-        motd_data[f'average_{avg_type}']       = tmp[avg_type]["value"]
-        motd_data[f'average_{avg_type}_unit']  = self.units[avg_type]
-        motd_data[f'average_{avg_type}_alarm'] = not tmp[avg_type]['alarm_min'] <= tmp[avg_type]['value'] <= tmp[avg_type]['alarm_max']
-
-        averages.append({
-          'title' : _('average {sensor_type}').format(sensor_type=_(avg_type)).capitalize() + ':',
-          'value' : '{:.2f}'.format(motd_data[f'average_{avg_type}']),
-          'unit'  : motd_data[f'average_{avg_type}_unit'],
-          'alarm' : motd_data[f'average_{avg_type}_alarm']
-        })
+    for key in motd_data.keys():
+      if not key.startswith('average_') or key.endswith('_unit') or key.endswith('_alarm'):
+        continue
+
+      avg_type = key[len('average_'):]
+      averages.append({
+        'title' : _('average {sensor_type}').format(sensor_type=_(avg_type)).capitalize() + ':',
+        'value' : '{:.2f}'.format(motd_data[f'average_{avg_type}']),
+        'unit'  : motd_data[f'average_{avg_type}_unit'],
+        'alarm' : motd_data[f'average_{avg_type}_alarm']
+      })
 
+    if len(averages) > 0:
       averages = sorted(averages, key=lambda k: k['title'])
 
       # Get the lengths of all the texts for the text alignment
@@ -1266,7 +1403,7 @@ class terrariumEngine(object):
 
     # Generate ascii art title in color
     figlet = pyfiglet.Figlet(font='doom')
-    title = self.settings['title']
+    title = model['title']
 
     if 'PI' in title:
       split_pos   = title.find('PI')
@@ -1308,8 +1445,8 @@ class terrariumEngine(object):
       motd_title += '\n'
 
     # Current version and update message
-    update_available = False if self.latest_version is None else Version(self.version) < Version(self.latest_version)
-    motd_version = '{}: {}{}'.format(_('Version'), self.version, (f' / {self.latest_version}' if update_available else ''))
+    update_available = False if model['latest_version'] is None else Version(model['version']) < Version(model['latest_version'])
+    motd_version = '{}: {}{}'.format(_('Version'), model['version'], (f' / {model["latest_version"]}' if update_available else ''))
     version_length = len(motd_version)
     version_padding = (int(max_line_length*0.66) - version_length) * ' '
 
@@ -1319,51 +1456,32 @@ class terrariumEngine(object):
     motd_version = padding + version_padding + motd_version + '\n'
 
     if update_available:
-      motd_version += padding + pyfancy().yellow(_('A new version ({version}) is available!').format(version=self.latest_version) + ' https://github.com/theyosh/TerrariumPI/releases').get() + '\n'
+      motd_version += padding + pyfancy().yellow(_('A new version ({version}) is available!').format(version=model['latest_version']) + ' https://github.com/theyosh/TerrariumPI/releases').get() + '\n'
 
 
     # Relays
     relays = []
-    relay_averages = {'power': {'current' : 0, 'max' : 0}, 'flow': {'current' : 0, 'max' : 0}}
-    with orm.db_session():
-      for relay in Relay.select(lambda r: r.id in self.relays.keys() and not r.id in self.settings['exclude_ids']):
-        relay_averages['power']['current'] += relay.current_wattage
-        relay_averages['power']['max']     += relay.wattage
-
-        relay_averages['flow']['current']  += relay.current_flow
-        relay_averages['flow']['max']      += relay.flow
-
-        if not relay.is_on:
-          continue
-
-        relay_title = f'{padding}{relay.name}'
-        if relay.is_dimmer:
-          relay_title += f' ({relay.value:.0f}%)'
+    for relay in model['relays']:
+      relay_title = f'{padding}{relay["name"]}'
+      if relay['dimmer'] is not None:
+        relay_title += f' ({relay["dimmer"]}%)'
 
-        relays.append({
-          'title' : f'{relay_title}  ',
-          'power' : f'{relay.current_wattage:.2f} {_("Watt")},',
-          'flow'  : f'{relay.current_flow:.2f} {self.units["water_flow"]}'
-        })
+      relays.append({
+        'title' : f'{relay_title}  ',
+        'power' : f'{relay["wattage"]} {_("Watt")},',
+        'flow'  : f'{relay["flow"]} {self.units["water_flow"]}'
+      })
 
     relays = sorted(relays, key=lambda k: k['title'])
 
-    # TODO: Optimize variable usage here
-
-    motd_data['current_watt']  = relay_averages['power']['current']
-    motd_data['max_watt']      = relay_averages['power']['max']
-    motd_data['current_flow']  = relay_averages['flow']['current']
-    motd_data['max_flow']      = relay_averages['flow']['max']
-    motd_data['relays_active'] = len(relays)
-
-    current_watt = relay_averages['power']['current']
-    max_watt     = relay_averages['power']['max']
+    current_watt = motd_data['current_watt']
+    max_watt     = motd_data['max_watt']
 
-    current_flow = relay_averages['flow']['current']
-    max_flow     = relay_averages['flow']['max']
+    current_flow = motd_data['current_flow']
+    max_flow     = motd_data['max_flow']
 
-    relays_active     = len(relays)
-    relay_title_left  = len(_('Current active relays') + f' {relays_active}/{len(self.relays)}  ')
+    relays_active     = motd_data['relays_active']
+    relay_title_left  = len(_('Current active relays') + f' {relays_active}/{model["relays_total"]}  ')
     relay_title_right = len(f'{current_watt:.2f}/{max_watt:.2f} ' + _('Watt') + f', {current_flow:.2f}/{max_flow:.2f} {self.units["water_flow"]}')
     relay_title_padding = 0
 
@@ -1388,48 +1506,81 @@ class terrariumEngine(object):
       relay_title_padding = (relay_title_length + relay_power_length + relay_flow_length) - (relay_title_left + relay_title_right) - 2
 
       # Add colors to the values
-      if relays_active > 0:
-        relays_active = pyfancy().green(f'{relays_active}').get()
-        current_watt  = pyfancy().green(f'{current_watt:.2f}').get()
-        current_flow  = pyfancy().blue(f'{current_flow:.2f}').get()
+      relays_active = pyfancy().green(f'{relays_active}').get()
+      current_watt  = pyfancy().green(f'{current_watt:.2f}').get()
+      current_flow  = pyfancy().blue(f'{current_flow:.2f}').get()
 
-    motd_relays = padding + _('Current active relays') + f' ({relays_active}/{len(self.relays)})  ' + (relay_title_padding * ' ') + f'{current_watt}/{max_watt:.2f} {_("Watt")}, {current_flow}/{max_flow:.2f} {self.units["water_flow"]}' + '\n' + motd_relays
+    motd_relays = padding + _('Current active relays') + f' ({relays_active}/{model["relays_total"]})  ' + (relay_title_padding * ' ') + f'{current_watt}/{max_watt:.2f} {_("Watt")}, {current_flow}/{max_flow:.2f} {self.units["water_flow"]}' + '\n' + motd_relays
 
-    if self.__engine['too_late'] > 30:
+    if model['too_late'] > 0:
       motd_relays += '\n'
-      motd_relays += (2 * padding) + pyfancy().red(f'Engine can\'t keep up! For {self.__engine["too_late"]} times it could not finish in {terrariumEngine.__ENGINE_LOOP_TIMEOUT} seconds.').get()
+      motd_relays += (2 * padding) + pyfancy().red(f'Engine can\'t keep up! For {model["too_late"]} times it could not finish in {terrariumEngine.__ENGINE_LOOP_TIMEOUT} seconds.').get()
       motd_relays += (3 * padding) + pyfancy().red('Please check your setup and hardware!').get()
       motd_relays += '\n'
 
-    # Last update line
+    # Last update line. This is the moment the MOTD data has changed
     last_update = _('last update').capitalize()
-    motd_last_update = (3 * padding) + pyfancy().blue(f'{last_update}: {datetime.datetime.now():%A, %d-%m-%Y %H:%M:%S}').get()
+    motd_last_update = (3 * padding) + pyfancy().blue(f'{last_update}: {self.__motd["timestamp"]:%A, %d-%m-%Y %H:%M:%S}').get()
 
-    motd_file = Path('motd.sh')
-    with motd_file.open('w') as motdfile:
-      motdfile.write('#!/bin/bash\n')
-      motdfile.write('echo "')
-      motdfile.write(motd_title.replace('`','\`') + '\n')
-      motdfile.write(motd_version + '\n')
-      motdfile.write(motd_averages + '\n')
-      motdfile.write(motd_relays + '\n')
-      motdfile.write(motd_last_update + '\n')
-      motdfile.write('"')
-
-    motd_file.chmod(0o755)
+    return motd_title + '\n' + motd_version + '\n' + motd_averages + '\n' + motd_relays + '\n' + motd_last_update + '\n'
 
-    # Send notification message
-    self.notification.message('system_summary', motd_data)
+  @property
+  def motd_text(self):
+    """
+    The MOTD with ANSI colors. It is rendered from the model of the last engine round, and only once per round.
 
+    Returns:
+        str: MOTD text
+    """
+    with self.__motd['lock']:
+      if self.__motd['text'] is None and self.__motd['model'] is not None:
+        self.__motd['text'] = self.__render_motd(self.__motd['model'])
 
-  # -= NEW =-
-  def __log_tailing(self):
-    logger.info('Starting log tailing.')
-    with subprocess.Popen(['tail','-F',terrariumLogging.logging.getLogger().handlers[1].baseFilename],stdout=subprocess.PIPE,stderr=subprocess.PIPE, text=True) as self.__logtail_process:
-      for line in self.__logtail_process.stdout:
-        self.webserver.websocket_message('logline' , line.strip())
+      return self.__motd['text']
+
+  @property
+  def motd_html(self):
+    """
+    The MOTD as HTML. It is converted from the MOTD text, and only once per engine round.
+
+    Returns:
+        str: MOTD HTML
+    """
+    with self.__motd['lock']:
+      if self.__motd['html'] is None:
+        motd_text = self.motd_text
+        if motd_text is not None:
+          self.__motd['html'] = Ansi2HTMLConverter().convert(motd_text, full=True)
+
+      return self.__motd['html']
+
+  def motd(self):
+    model = self.__motd_model()
+    key = self.__motd_key(model)
+    motd_file = Path('motd.sh')
+    now = datetime.datetime.now()
+
+    with self.__motd['lock']:
+      # The volatile metrics are refreshed in the file and notification once in a while, also when nothing else changed
+      changed = key != self.__motd['key'] or self.__motd['timestamp'] is None or \
+                (now - self.__motd['timestamp']).total_seconds() >= terrariumEngine.__MOTD_REFRESH_INTERVAL
+      self.__motd.update({'model' : model, 'text' : None, 'html' : None})
+      if changed:
+        self.__motd.update({'key' : key, 'timestamp' : now})
+
+    if not changed and motd_file.exists():
+      # Nothing changed. Only update the modification time, as that is used by the docker health check
+      motd_file.touch()
+      return
+
+    new_file = not motd_file.exists()
+    motd_file.write_text('#!/bin/bash\necho "' + self.motd_text.replace('`','\`') + '"')
+    if new_file:
+      motd_file.chmod(0o755)
+
+    # Send notification message
+    self.notification.message('system_summary', model['data'])
 
-    logger.info('Stopped log tailing.')
 
   # -= NEW =-
   def stop(self):
@@ -1439,10 +1590,12 @@ class terrariumEngine(object):
     self.running = False
     self.__engine['exit'].set()
 
+    with self.__relay_changes['lock']:
+      if self.__relay_changes['timer'] is not None:
+        self.__relay_changes['timer'].cancel()
+
     # Wait till the engine is done, when it was updating the sensors
-    self.__logtail_process.terminate()
     self.__engine['thread'].join()
-    self.__engine['logtail'].join()
 
     for enclosure in self.enclosures:
       self.enclosures[enclosure].stop()
@@ -1456,6 +1609,9 @@ class terrariumEngine(object):
       self.sensors[sensor].stop()
       logger.info(f'Stopped {self.sensors[sensor]}')
 
+    terrariumBluetoothCollector.stop()
+    terrariumAnalogSampler.stop()
+
     for relay in self.relays:
       self.relays[relay].stop()
       logger.info(f'Stopped {self.relays[relay]}')
@@ -1472,6 +1628,7 @@ class terrariumEngine(object):
     self.notification.stop()
 
     self.__engine['asyncio'].stop()
+    terrariumScriptPool().stop()
 
     logger.info(shutdown_message)
 
@@ -1571,27 +1728,43 @@ class terrariumEngine(object):
     return username == self.settings.get('username', None) and terrariumUtils.check_password(password, self.settings.get('password', None))
 
   # -= NEW =-
-  def system_stats(self):
+  def __sample_system_stats(self):
     start = time.time()
     storage = psutil.disk_usage('/')
     memory =  psutil.virtual_memory()
+    load = psutil.getloadavg()
     # Reading temperature through psutil results in a very high load in combination with gevent.... Just reading from disk is way faster.....
     # This is a Raspberry Pi ONLY solution
     cpu_temp = float(Path('/sys/class/thermal/thermal_zone0/temp').read_text().strip()) / 1000.0
     data =  {
-      'uptime': (datetime.datetime.now() - datetime.datetime.fromtimestamp(psutil.boot_time())).total_seconds(),
       'load' : {
-        'percentage' : [x / psutil.cpu_count() * 100 for x in psutil.getloadavg()],
-        'absolute' : psutil.getloadavg()
+        'percentage' : [x / self.__system_stats['cpu_count'] * 100 for x in load],
+        'absolute' : load
       },
       'cpu_temperature' : cpu_temp,
       'memory' : {'total' : memory.total, 'used':memory.total - memory.available,'free':memory.available},
       'storage' : {'total' : storage.total, 'used':storage.used,'free':storage.free},
-      'is_day' : True if self.weather is None else self.weather.is_day
     }
     logger.debug('Loaded system stats {} seconds.'.format(time.time()-start))
     return data
 
+  # -= NEW =-
+  def system_stats(self):
+    with self.__system_stats['lock']:
+      if self.__system_stats['data'] is None or time.time() - self.__system_stats['timestamp'] >= terrariumEngine.__SYSTEM_STATS_INTERVAL:
+        self.__system_stats['data'] = self.__sample_system_stats()
+        self.__system_stats['timestamp'] = time.time()
+
+      data = copy.deepcopy(self.__system_stats['data'])
+
+    data['uptime'] = time.time() - self.__system_stats['boot_time']
+    data['is_day'] = True if self.weather is None else self.weather.is_day
+
+    if self.meross_cloud is not None:
+      data['meross_cloud'] = self.meross_cloud.metrics
+
+    return data
+
   # -= NEW =-
   @property
   def get_power_usage_water_flow(self):
@@ -4,73 +4,119 @@ import logging
 import logging.handlers
 import logging.config
 
-import zipfile
-import codecs
+import gzip
 import os
 import os.path
 import time
-import glob
 import shutil
+import subprocess
 import threading
+import collections
+import queue
+import atexit
 
 from terrariumNotification import terrariumNotification
 from terrariumUtils import terrariumUtils
 
+def clean_record(record):
+  # Clean the log message only once, also when the record is handled by multiple handlers
+  if not getattr(record, 'cleaned', False):
+    record.msg = terrariumUtils.clean_log_line(record.msg)
+    record.cleaned = True
+
 class TimedCompressedRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
     """
     Extended version of TimedRotatingFileHandler that compress logs on rollover.
     """
+    COMPRESS_LEVEL    = 6  # gzip level, higher levels cost a lot more CPU for only a little less space
+    COMPRESS_PRIORITY = 19 # nice value of the compression process
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.__archive_lock = threading.Lock()
+        self.__archives = None
+
     def emit(self,data):
-      data.msg = terrariumUtils.clean_log_line(data.msg)
+      clean_record(data)
       super().emit(data)
 
+    def __load_archives(self):
+        # Scan only once for existing (also older zip) archives. After that, the list is kept up to date in memory
+        dir_name, base_name = os.path.split(self.baseFilename)
+        prefix = base_name + '.'
+        self.__archives = collections.deque(sorted([os.path.join(dir_name, file_name) for file_name in os.listdir(dir_name)
+                                                    if file_name.startswith(prefix) and file_name.endswith(('.gz','.zip')) and self.extMatch.match(file_name[len(prefix):])]))
+
+    def __compress(self, source):
+        # Compress in a child process with a low CPU priority, so the engine does not notice it. Under gevent this
+        # thread is a greenlet in the main OS thread, so the priority of the calling thread should never be changed.
+        archive = source + '.gz'
+        try:
+          try:
+            process = subprocess.Popen(['nice', '-n', str(TimedCompressedRotatingFileHandler.COMPRESS_PRIORITY),
+                                        'gzip', '-f', f'-{TimedCompressedRotatingFileHandler.COMPRESS_LEVEL}', source],
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            _, error = process.communicate()
+            if process.returncode != 0:
+              raise RuntimeError(error.decode().strip())
+
+          except FileNotFoundError:
+            # No nice or gzip tools available, compress in this process
+            with open(source, 'rb') as log_file, gzip.open(archive, 'wb', compresslevel=TimedCompressedRotatingFileHandler.COMPRESS_LEVEL) as log_archive:
+              shutil.copyfileobj(log_file, log_archive, 1024 * 1024)
+
+            os.remove(source)
+
+        except Exception as ex:
+          logging.getLogger(__name__).error(f'Could not compress log file {source}: {ex}')
+          return
+
+        with self.__archive_lock:
+          if self.__archives is None:
+            self.__load_archives()
+          elif archive not in self.__archives:
+            self.__archives.append(archive)
+
+          # Remove the oldest archives
+          while self.backupCount > 0 and len(self.__archives) > self.backupCount:
+            try:
+              os.remove(self.__archives.popleft())
+            except FileNotFoundError:
+              pass
+
     def doRollover(self):
         """
         do a rollover; in this case, a date/time stamp is appended to the filename
         when the rollover happens.  However, you want the file to be named for the
-        start of the interval, not the current time.  If there is a backup count,
-        then we have to get a list of matching filenames, sort them and remove
-        the one with the oldest suffix.
+        start of the interval, not the current time. The stream is swapped directly, as
+        this is called from emit with the handler lock. The old log file is compressed
+        with gzip in a low priority child process.
         """
+        if self.stream:
+            self.stream.close()
+            self.stream = None
 
-        def zipAction():
-          # get the time that this sequence started at and make it a TimeTuple
-          t = self.rolloverAt - self.interval
-          timeTuple = time.localtime(t)
-          dfn = self.baseFilename + '.' + time.strftime(self.suffix, timeTuple)
-          if os.path.exists(dfn):
-              os.remove(dfn)
-
-          self.stream.close()
-
-          shutil.move(os.path.realpath(self.baseFilename), os.path.abspath(dfn))
-          # Empty source file for new day
-          open(self.baseFilename, 'w').close()
-
-          if self.encoding:
-              self.stream = codecs.open(self.baseFilename, 'w', self.encoding)
-          else:
-              self.stream = open(self.baseFilename, 'w')
-
-          self.rolloverAt = self.rolloverAt + self.interval
+        # get the time that this sequence started at and make it a TimeTuple
+        current_time = int(time.time())
+        timeTuple = time.gmtime(self.rolloverAt - self.interval) if self.utc else time.localtime(self.rolloverAt - self.interval)
+        dfn = self.rotation_filename(self.baseFilename + '.' + time.strftime(self.suffix, timeTuple))
+        if os.path.exists(dfn):
+            os.remove(dfn)
 
-          if self.backupCount > 0:
-              # find the oldest log file and delete it
-              s = glob.glob(self.baseFilename + '.20*')
-              if len(s) > self.backupCount:
-                  s.sort()
-                  os.remove(s[0])
+        if os.path.exists(self.baseFilename):
+            shutil.move(os.path.realpath(self.baseFilename), os.path.abspath(dfn))
 
-          if os.path.exists(dfn + '.zip'):
-              os.remove(dfn + '.zip')
+        if not self.delay:
+            self.stream = self._open()
 
-          with zipfile.ZipFile(dfn + '.zip', 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=9) as log_archive:
-            log_archive.write(dfn, os.path.basename(dfn))
+        new_rollover_at = self.computeRollover(current_time)
+        while new_rollover_at <= current_time:
+            new_rollover_at += self.interval
 
-          os.remove(dfn)
+        self.rolloverAt = new_rollover_at
 
-        compress = threading.Thread(target=zipAction)
-        compress.start()
+        if os.path.exists(dfn):
+            threading.Thread(target=self.__compress, args=(dfn,)).start()
 
 class NotificationLogger(logging.StreamHandler):
 
@@ -84,7 +130,202 @@ class NotificationLogger(logging.StreamHandler):
     if 'terrariumNotification' != data.name and str(data.levelname.lower()) in ['warning','error']:
       self.notification.message(f'system_{data.levelname.lower()}' , {'message' : data.getMessage()} )
 
+class LogRingBuffer(logging.Handler):
+  """
+  Keeps the latest log lines in memory and publishes new lines to the subscribers. Every subscriber has its own
+  minimum log level, so lines are filtered before they are published.
+  """
+
+  def __init__(self, capacity = 1000, level = logging.NOTSET):
+    super().__init__(level)
+    self.buffer = collections.deque(maxlen=int(capacity))
+    self.sequence = 0
+    self.subscribers = {}
+    self.__publishing = threading.local()
+
+  def emit(self, record):
+    # Logging done by the subscribers is not published again, else we get an endless loop
+    if getattr(self.__publishing, 'active', False):
+      return
+
+    try:
+      clean_record(record)
+      line = self.format(record)
+    except Exception:
+      self.handleError(record)
+      return
+
+    self.sequence += 1
+    self.buffer.append((self.sequence, record.levelno, line))
+
+    self.__publishing.active = True
+    try:
+      for level, callback in list(self.subscribers.values()):
+        if record.levelno >= level:
+          try:
+            callback(record.levelno, line)
+          except Exception:
+            pass
+    finally:
+      self.__publishing.active = False
+
+  def subscribe(self, callback, level = logging.INFO):
+    with self.lock:
+      self.subscribers[callback] = (level, callback)
+
+  def unsubscribe(self, callback):
+    with self.lock:
+      self.subscribers.pop(callback, None)
+
+  def lines(self, start = 0, level = logging.NOTSET, limit = None):
+    """
+    Get the log lines from memory that are newer than the start sequence number.
+
+    Returns:
+        list: Tuples with the sequence number, log level and log line
+    """
+    with self.lock:
+      lines = [line for line in self.buffer if line[0] > start and line[1] >= level]
+
+    if limit is not None and limit > 0:
+      lines = lines[-limit:]
+
+    return lines
+
+def log_buffer():
+  """
+  Get the in memory log buffer. When the logging config does not have one (old custom configs), a default one is added.
+
+  Returns:
+      LogRingBuffer: The log buffer handler
+  """
+  root = logging.getLogger()
+  for handler in root.handlers:
+    if isinstance(handler, LogRingBuffer):
+      return handler
+
+  handler = LogRingBuffer(level = logging.INFO)
+  handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)-7s - %(name)-21s - %(message)s'))
+  root.addHandler(handler)
+  return handler
+
+class QueueLogHandler(logging.handlers.QueueHandler):
+  """
+  Puts the log records on a bounded queue, so the slow handlers (disk, syslog and notifications) are running on a
+  background listener. When the queue is filling up, records below the drop level are dropped. When the queue is full,
+  all records are dropped. A summary of the dropped records is logged when there is room again, at most once per interval.
+  """
+
+  __SUMMARY_INTERVAL = 10 # in seconds
+
+  def __init__(self, log_queue, drop_level = logging.WARNING, high_water = 0.8):
+    super().__init__(log_queue)
+    self.drop_level = drop_level
+    self.high_water = max(1, int(log_queue.maxsize * high_water))
+    self.dropped = collections.Counter()
+    self.last_summary = 0
+    # Records are logged from many threads
+    self.__dropped_lock = threading.Lock()
+
+  def __drop(self, record):
+    with self.__dropped_lock:
+      self.dropped[record.levelname] += 1
+
+  def emit(self, record):
+    # Drop less important records before formatting them, when the listener can't keep up
+    if record.levelno < self.drop_level and self.queue.qsize() >= self.high_water:
+      self.__drop(record)
+      return
+
+    clean_record(record)
+    super().emit(record)
+
+  def enqueue(self, record):
+    summary = None
+    with self.__dropped_lock:
+      if len(self.dropped) > 0 and time.time() - self.last_summary >= QueueLogHandler.__SUMMARY_INTERVAL:
+        summary = self.__summary()
+        self.dropped.clear()
+        self.last_summary = time.time()
+
+    try:
+      if summary is not None:
+        self.queue.put_nowait(summary)
+
+      self.queue.put_nowait(record)
+    except queue.Full:
+      self.__drop(record)
+
+  def __summary(self):
+    details = ', '.join([f'{amount} {level}' for level, amount in sorted(self.dropped.items())])
+    message = f'Logging could not keep up. Dropped {sum(self.dropped.values())} log records ({details}).'
+    return logging.LogRecord(__name__, logging.WARNING, __file__, 0, message, None, None)
+
+class QueueLogListener(logging.handlers.QueueListener):
+  """
+  Queue listener that waits for room on a full queue when it is stopped, so the queued records are written first.
+  """
+
+  __STOP_TIMEOUT = 10 # in seconds
+
+  def enqueue_sentinel(self):
+    self.queue.put(self._sentinel, timeout=QueueLogListener.__STOP_TIMEOUT)
+
+# The handlers that are moved behind a queue, per logger name
+_queue_listeners = {}
+
+def _start_queue_logging(max_size = 10000):
+  # Move the slow handlers of all configured loggers behind a queue with a background listener. The position of the
+  # handlers is kept, so handlers[1] stays the (queued) file logging
+  loggers = [logging.getLogger()] + [item for item in logging.Logger.manager.loggerDict.values() if isinstance(item, logging.Logger)]
+  for log in loggers:
+    slow_handlers = [handler for handler in log.handlers if isinstance(handler, (logging.FileHandler, logging.handlers.SysLogHandler, NotificationLogger))]
+    if len(slow_handlers) == 0:
+      continue
+
+    queue_handler = QueueLogHandler(queue.Queue(max_size))
+    # Only queue the records that at least one of the slow handlers will write
+    queue_handler.setLevel(min(handler.level for handler in slow_handlers))
+    handlers = []
+    for handler in log.handlers:
+      if handler not in slow_handlers:
+        handlers.append(handler)
+      elif queue_handler not in handlers:
+        handlers.append(queue_handler)
+
+    log.handlers = handlers
+    _queue_listeners[log.name] = QueueLogListener(queue_handler.queue, *slow_handlers, respect_handler_level=True)
+    _queue_listeners[log.name].start()
+
+@atexit.register
+def _stop_queue_logging():
+  # Process all the log records that are still on the queues
+  for listener in _queue_listeners.values():
+    try:
+      listener.stop()
+    except queue.Full:
+      # The listener is stuck. Its thread is a daemon thread, so it will not block the shutdown
+      pass
+
+  _queue_listeners.clear()
+
+def log_file():
+  """
+  Get the file name of the main log file.
+
+  Returns:
+      str: Full path of the log file
+  """
+  handlers = _queue_listeners[logging.getLogger().name].handlers if logging.getLogger().name in _queue_listeners else logging.getLogger().handlers
+  for handler in handlers:
+    if isinstance(handler, logging.FileHandler):
+      return handler.baseFilename
+
+  return None
+
 if os.path.isfile('log/logging.custom.cfg'):
   logging.config.fileConfig('log/logging.custom.cfg')
 else:
   logging.config.fileConfig('logging.cfg')
+
+_start_queue_logging()
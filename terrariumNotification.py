@@ -7,6 +7,8 @@ import re
 import datetime
 import requests
 import copy
+import sqlite3
+import time
 
 # Traffic light Support
 import RPi.GPIO as GPIO
@@ -22,7 +24,7 @@ from pony import orm
 # from string import Template
 from gevent import sleep
 from operator import itemgetter
-from threading import Thread, Timer
+from threading import Thread, Timer, Lock
 from base64 import b64encode
 from pathlib import Path
 
@@ -409,6 +411,14 @@ class terrariumNotification(terrariumSingleton):
             logger.exception(f'Error sending notification message \'{title}\': {ex}')
 
 
+  def batch(self, batch_type, data):
+    for _, service in self.services.items():
+      if service is not None and service.enabled:
+        try:
+          service.send_batch(batch_type, data)
+        except Exception as ex:
+          logger.exception(f'Error sending {batch_type} batch message: {ex}')
+
   def stop(self):
     for _, service in self.services.items():
       if service is not None:
@@ -499,6 +509,10 @@ class terrariumNotificationService(object):
     self.setup['version']          = setup_data.get('version')
     self.setup['profile_image']    = setup_data.get('profile_image')
 
+  def send_batch(self, batch_type, data):
+    # Only services that can handle a whole update round in one message will implement this
+    pass
+
   def reload_setup(self, setup_data):
     # Stop first
     self.stop()
@@ -1250,47 +1264,216 @@ class terrariumNotificationServiceBuzzer(terrariumNotificationService):
     GPIO.output(self.setup['address'],False)
     GPIO.cleanup(self.setup['address'])
 
+class terrariumNotificationOutbox(object):
+  """
+  Persistent message queue for notification services that can be offline. Messages are stored in a small SQLite
+  database, so they will survive a restart and can be replayed in the original order when the service is back online.
+  """
+  __DATABASE = 'data/notification_outbox.db'
+  __MAX_MESSAGES = 10000
+
+  def __init__(self, service_id):
+    self.service_id = service_id
+    self.__lock = Lock()
+
+    self.__db = sqlite3.connect(self.__DATABASE, check_same_thread=False, isolation_level=None)
+    self.__db.execute('PRAGMA journal_mode = WAL')
+    self.__db.execute('PRAGMA synchronous = NORMAL')
+    self.__db.execute('CREATE TABLE IF NOT EXISTS outbox (id INTEGER PRIMARY KEY AUTOINCREMENT, service TEXT NOT NULL, topic TEXT NOT NULL, payload TEXT NOT NULL, qos INTEGER NOT NULL, timestamp REAL NOT NULL)')
+    self.__db.execute('CREATE INDEX IF NOT EXISTS outbox_service ON outbox (service, id)')
+
+  def __len__(self):
+    with self.__lock:
+      return self.__db.execute('SELECT COUNT(*) FROM outbox WHERE service = ?', (self.service_id,)).fetchone()[0]
+
+  def add(self, topic, payload, qos = 1):
+    with self.__lock:
+      self.__db.execute('INSERT INTO outbox (service, topic, payload, qos, timestamp) VALUES (?, ?, ?, ?, ?)', (self.service_id, topic, payload, qos, time.time()))
+      # Keep the outbox limited in size. When the broker is gone for a long time, drop the oldest messages
+      self.__db.execute('DELETE FROM outbox WHERE service = ? AND id <= (SELECT id FROM outbox WHERE service = ? ORDER BY id DESC LIMIT 1 OFFSET ?)', (self.service_id, self.service_id, self.__MAX_MESSAGES))
+
+  def peek(self, amount = 100):
+    with self.__lock:
+      return self.__db.execute('SELECT id, topic, payload, qos FROM outbox WHERE service = ? ORDER BY id ASC LIMIT ?', (self.service_id, amount)).fetchall()
+
+  def remove(self, ids):
+    if len(ids) == 0:
+      return
+
+    with self.__lock:
+      self.__db.executemany('DELETE FROM outbox WHERE id = ?', [(message_id,) for message_id in ids])
+
+  def close(self):
+    with self.__lock:
+      self.__db.close()
+
 class terrariumNotificationServiceMQTT(terrariumNotificationService):
+  __FLUSH_TIMEOUT = 5  # Max seconds to wait for messages in flight when stopping
+
   # The callback for when the client receives a CONNACK response from the server.
   def on_connect(self, client, userdata, flags, rc):
     if rc == 0:
       logger.info(f'Logged in to MQTT Broker at address: {self.setup["address"]}:{self.setup["port"]}.')
+      # Replay the messages that are stored while we were offline. There is only one replay thread, which does an
+      # extra round when we reconnect during a replay
+      with self.__replay_lock:
+        self.__replay_requested = True
+        if self.__replay_thread is None:
+          self.__replay_thread = Thread(target=self.__replay_outbox)
+          self.__replay_thread.start()
 
     else:
       logger.error(f'Error! Login to MQTT Broker at address: {self.setup["address"]}:{self.setup["port"]} failed! Error code: {rc}')
       self.stop()
 
+  def on_disconnect(self, client, userdata, rc):
+    with self.__outbox_lock:
+      # New messages have to wait in the outbox until the stored messages are replayed after the reconnect
+      self.__replaying = True
+
+    if rc != 0:
+      logger.warning(f'Lost connection to the MQTT Broker at address: {self.setup["address"]}:{self.setup["port"]}. Messages will be stored until the connection is restored.')
+
+  def on_publish(self, client, userdata, mid):
+    # This is called from the MQTT network thread. Never wait here for the publishing thread, as paho holds its own locks during this callback
+    with self.__pending_lock:
+      if self.__pending.pop(mid, None) is None:
+        self.__acknowledged.add(mid)
+
   def load_setup(self, setup_data):
     self.setup = {
-      'address'   : setup_data.get('address'),
-      'port'      : int(setup_data.get('port')),
-      'username'  : setup_data.get('username'),
-      'password'  : setup_data.get('password'),
-      'ssl'       : setup_data.get('ssl', False),
+      'address'     : setup_data.get('address'),
+      'port'        : int(setup_data.get('port')),
+      'username'    : setup_data.get('username'),
+      'password'    : setup_data.get('password'),
+      'ssl'         : setup_data.get('ssl', False),
+      'batch_topic' : terrariumUtils.is_true(setup_data.get('batch_topic', False)),
     }
 
     super().load_setup(setup_data)
 
     self.connection = None
 
+    if not hasattr(self, 'outbox'):
+      self.outbox = terrariumNotificationOutbox(self.id)
+      self.__outbox_lock  = Lock()
+      self.__pending_lock = Lock()
+      self.__replay_lock  = Lock()
+      self.__replay_thread = None
+
+    # Until the first replay is done, all messages go through the outbox
+    self.__replaying    = True
+    self.__replay_requested = False
+    self.__pending      = {}
+    self.__acknowledged = set()
+
     if self.enabled:
       try:
         self.connection = mqtt.Client(client_id=f"TerrariumPI {self.setup['version']}")
-        self.connection.on_connect = self.on_connect
+        self.connection.on_connect    = self.on_connect
+        self.connection.on_disconnect = self.on_disconnect
+        self.connection.on_publish    = self.on_publish
         if self.setup['ssl']:
           self.connection.tls_set(tls_version=mqtt.ssl.PROTOCOL_TLS)
         self.connection.username_pw_set(terrariumUtils.decrypt(self.setup['username']), terrariumUtils.decrypt(self.setup['password']))
-        self.connection.connect(self.setup['address'], self.setup['port'], 30)
+        self.connection.reconnect_delay_set(min_delay=1, max_delay=120)
+        # Connect in the background, so a broker that is (temporary) down will be reconnected automatically
+        self.connection.connect_async(self.setup['address'], self.setup['port'], 30)
         self.connection.loop_start()
         logger.info(f'Connecting to MQTT Broker at address: {self.setup["address"]}:{self.setup["port"]} ...')
 
       except Exception as ex:
         logger.warning(f'Failed connecting to MQTT Broker at address: {self.setup["address"]}:{self.setup["port"]}: {ex}')
 
-  def stop(self):
-    # TODO: Flush the queue
+  def __publish(self, topic, payload, qos = 1):
+    try:
+      result = self.connection.publish(topic, payload=payload, qos=qos)
+    except Exception as ex:
+      logger.debug(f'Could not publish message to topic {topic}: {ex}')
+      return False
+
+    if result.rc != mqtt.MQTT_ERR_SUCCESS:
+      return False
+
+    with self.__pending_lock:
+      if result.mid in self.__acknowledged:
+        self.__acknowledged.discard(result.mid)
+      else:
+        self.__pending[result.mid] = (topic, payload, qos)
+
+    return True
+
+  def __replay_outbox(self):
+    while True:
+      with self.__replay_lock:
+        if not self.__replay_requested:
+          self.__replay_thread = None
+          return
 
+        self.__replay_requested = False
+
+      self.__replay()
+
+  def __replay(self):
+    total = 0
+    start = time.time()
+
+    while self.connection is not None and self.connection.is_connected():
+      messages = self.outbox.peek()
+      if len(messages) == 0:
+        with self.__outbox_lock:
+          # Check again while holding the lock, so no new messages can slip into the outbox unnoticed
+          if len(self.outbox) == 0:
+            self.__replaying = False
+            break
+
+        continue
+
+      send = []
+      for message in messages:
+        if not self.__publish(message[1], message[2], message[3]):
+          break
+
+        send.append(message[0])
+
+      self.outbox.remove(send)
+      total += len(send)
+
+      if len(send) != len(messages):
+        # Lost the connection during replay. The next connect will continue
+        break
+
+    if total > 0:
+      logger.info(f'Replayed {total} stored messages to the MQTT Broker at address: {self.setup["address"]}:{self.setup["port"]} in {time.time()-start:.2f} seconds.')
+
+  def _send(self, topic, payload, qos = 1):
+    with self.__outbox_lock:
+      # When we are offline or still replaying old messages, queue the message so the original order is kept
+      if self.connection is None or not self.connection.is_connected() or self.__replaying or not self.__publish(topic, payload, qos):
+        self.outbox.add(topic, payload, qos)
+        logger.debug(f'Stored message for topic {topic} in the outbox, as we are not connected to the MQTT broker at address: {self.setup["address"]}:{self.setup["port"]}')
+
+  def __pending_messages(self):
+    with self.__pending_lock:
+      return len(self.__pending)
+
+  def stop(self):
     if self.connection is not None:
+      # Wait a short while for the messages that are in flight. What is left will be stored for the next connection
+      timeout = time.time() + self.__FLUSH_TIMEOUT
+      while self.__pending_messages() > 0 and self.connection.is_connected() and time.time() < timeout:
+        sleep(0.1)
+
+      with self.__pending_lock:
+        for topic, payload, qos in self.__pending.values():
+          self.outbox.add(topic, payload, qos)
+
+        if len(self.__pending) > 0:
+          logger.info(f'Stored {len(self.__pending)} unconfirmed messages in the outbox for the MQTT Broker at address: {self.setup["address"]}:{self.setup["port"]}')
+
+        self.__pending.clear()
+        self.__acknowledged.clear()
+
       try:
         self.connection.loop_stop()
       except Exception as ex:
@@ -1320,10 +1503,21 @@ class terrariumNotificationServiceMQTT(terrariumNotificationService):
     # Add the message
     data['message'] = message
 
-    if self.connection is not None:
-      self.connection.publish(topic, payload=json.dumps(data), qos=1)
-    else:
-      logger.error(f'Could not send message {data["subject"]} to topic {data["topic"]} as we are not connected to the MQTT broker at address: {self.setup["address"]}:{self.setup["port"]}')
+    self._send(topic, json.dumps(data))
+
+  def send_batch(self, batch_type, data):
+    if not self.setup['batch_topic']:
+      return
+
+    topic = f'terrariumpi/batch/{batch_type}'
+    # Compact payload with all the values of a single update round
+    payload = {
+      'uuid'      : terrariumUtils.generate_uuid(),
+      'timestamp' : int(time.time()),
+      batch_type  : data
+    }
+
+    self._send(topic, json.dumps(payload, separators=(',',':')))
 
 
 class terrariumNotificationServicePushover(terrariumNotificationService):
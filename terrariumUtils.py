@@ -13,10 +13,14 @@ import os
 import math
 import asyncio
 import base64
+import json
+import queue
+import shlex
 
 from cryptography.fernet import Fernet
 
 from math import log
+from pathlib import Path
 
 import time
 import uuid
@@ -38,22 +42,124 @@ class classproperty(property):
     return classmethod(self.fget).__get__(None, owner)()
 
 class terrariumAsync(terrariumSingleton):
+  """
+  Shared asyncio runtime for all the async hardware drivers. A single event loop runs in a background thread. The
+  (sync) engine uses run() and gather() to execute coroutines on it, and long running jobs are started with create_task()
+  so they can be cancelled on stop().
+  """
+
+  __STOP_TIMEOUT = 10 # in seconds
+
   def __init__(self):
-    def __run():
-      self.async_loop.run_until_complete(self._keep_running())
-      self.async_loop.close()
+    self.async_loop = asyncio.new_event_loop()
+    self.__tasks = set()
+    self.__thread = threading.Thread(target=self.__run, name='terrariumAsync', daemon=True)
+    self.__thread.start()
+
+  def __run(self):
+    asyncio.set_event_loop(self.async_loop)
+    self.async_loop.run_forever()
+
+    # Give the cancelled tasks a last chance to cleanup
+    pending = asyncio.all_tasks(self.async_loop)
+    if len(pending) > 0:
+      self.async_loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+
+    self.async_loop.run_until_complete(self.async_loop.shutdown_asyncgens())
+    self.async_loop.close()
+
+  @property
+  def running(self):
+    return self.async_loop.is_running() and not self.async_loop.is_closed()
+
+  def create_task(self, coroutine, name = None):
+    """
+    Start a long running coroutine on the event loop. The task is cancelled when the runtime stops.
+
+    Args:
+        coroutine (coroutine): The coroutine to run
+        name (str): Optional name of the task
+
+    Returns:
+        concurrent.futures.Future: Future with the result of the coroutine
+    """
+    async def __task():
+      task = asyncio.current_task()
+      # Task names are only available from Python 3.8
+      if name is not None and hasattr(task, 'set_name'):
+        task.set_name(name)
+
+      self.__tasks.add(task)
+      try:
+        return await coroutine
+      finally:
+        self.__tasks.discard(task)
+
+    return asyncio.run_coroutine_threadsafe(__task(), self.async_loop)
+
+  def run(self, coroutine, timeout = None):
+    """
+    Run a coroutine on the event loop, and wait for the result. The coroutine is cancelled when it takes too long.
+
+    Args:
+        coroutine (coroutine): The coroutine to run
+        timeout (float): Maximum time to wait in seconds. None is wait forever
+
+    Raises:
+        asyncio.TimeoutError: The coroutine did not finish in time
 
-    self.async_loop = asyncio.get_event_loop()
-    process = threading.Thread(target=__run)
-    process.start()
+    Returns:
+        any: The result of the coroutine
+    """
+    if timeout is not None:
+      coroutine = asyncio.wait_for(coroutine, timeout)
+
+    return self.create_task(coroutine).result()
+
+  def gather(self, coroutines, timeout = None):
+    """
+    Run multiple coroutines at the same time, and wait for all the results. Every coroutine has its own timeout, so a
+    single slow device does not delay or fail the others.
+
+    Args:
+        coroutines (list): The coroutines to run
+        timeout (float): Maximum time per coroutine in seconds. None is wait forever
+
+    Returns:
+        list: The results in the same order as the coroutines. A failed coroutine returns its exception
+    """
+    coroutines = list(coroutines)
+    if len(coroutines) == 0:
+      return []
+
+    async def __gather():
+      return await asyncio.gather(*[coroutine if timeout is None else asyncio.wait_for(coroutine, timeout) for coroutine in coroutines], return_exceptions=True)
+
+    return self.run(__gather())
 
   def stop(self):
-    self.__running = False
+    """
+    Cancel all the running tasks and stop the event loop.
+    """
+    if not self.running:
+      return
+
+    async def __cancel():
+      tasks = list(self.__tasks)
+      for task in tasks:
+        task.cancel()
 
-  async def _keep_running(self):
-    self.__running = True
-    while self.__running:
-      await asyncio.sleep(1)
+      if len(tasks) > 0:
+        await asyncio.wait(tasks, timeout=terrariumAsync.__STOP_TIMEOUT)
+
+    try:
+      asyncio.run_coroutine_threadsafe(__cancel(), self.async_loop).result(terrariumAsync.__STOP_TIMEOUT + 1)
+    except Exception as ex:
+      logger.warning(f'Not all async tasks stopped in time: {ex}')
+
+    self.async_loop.call_soon_threadsafe(self.async_loop.stop)
+    if threading.current_thread() != self.__thread:
+      self.__thread.join(terrariumAsync.__STOP_TIMEOUT)
 
 class terrariumCache(terrariumSingleton):
   def __init__(self):
@@ -102,6 +208,215 @@ class terrariumCache(terrariumSingleton):
     if hash_key in self.__cache:
       del(self.__cache[hash_key])
 
+class terrariumScriptWorker(object):
+  """
+  Long running script that handles requests with line delimited JSON over stdin/stdout, so there is no process and
+  interpreter startup on every call. A request is a single line like {"id": 1, "args": ["50"]}, and the script answers
+  with a single line like {"id": 1, "result": 22.5} or {"id": 1, "error": "message"}.
+  """
+
+  def __init__(self, command):
+    # The script, optionally started by an interpreter like ['python3', 'script.py']
+    self.command = list(command)
+    self.script = self.command[-1]
+    self.__lock = threading.Lock()
+    self.__process = None
+    self.__responses = None
+    self.__request_id = 0
+
+  def __repr__(self):
+    return f'Script worker {self.script}'
+
+  @staticmethod
+  def __read(process, responses):
+    for line in process.stdout:
+      responses.put(line)
+
+    # End of output, the script has stopped
+    responses.put(None)
+
+  def __start(self):
+    logger.info(f'Starting {self}')
+    self.__process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1)
+    self.__responses = queue.Queue()
+    threading.Thread(target=terrariumScriptWorker.__read, args=(self.__process, self.__responses), name=f'terrariumScriptWorker_{Path(self.script).name}', daemon=True).start()
+
+  def request(self, args, timeout):
+    """
+    Send a request to the script, and wait for the answer. The script is (re)started when it is not running.
+
+    Args:
+        args (list): The arguments of the request
+        timeout (float): Maximum time to wait for the answer in seconds
+
+    Raises:
+        subprocess.TimeoutExpired: The script did not answer in time, and is stopped
+        subprocess.CalledProcessError: The script returned an error
+
+    Returns:
+        bytes: The result, like the output of a one-shot script
+    """
+    with self.__lock:
+      if self.__process is None or self.__process.poll() is not None:
+        self.__start()
+
+      self.__request_id += 1
+      deadline = time.time() + timeout
+      try:
+        self.__process.stdin.write(json.dumps({'id' : self.__request_id, 'args' : args}) + '\n')
+        self.__process.stdin.flush()
+
+        while True:
+          line = self.__responses.get(timeout=max(0, deadline - time.time()))
+          if line is None:
+            raise RuntimeError(f'{self} stopped unexpectedly')
+
+          try:
+            response = json.loads(line)
+          except ValueError:
+            logger.debug(f'Ignoring invalid output from {self}: {line.strip()}')
+            continue
+
+          # Skip answers of older (timed out) requests
+          if isinstance(response, dict) and response.get('id') == self.__request_id:
+            break
+
+      except queue.Empty:
+        self.__stop()
+        raise subprocess.TimeoutExpired(self.script, timeout)
+
+      except Exception:
+        self.__stop()
+        raise
+
+    if 'error' in response:
+      raise subprocess.CalledProcessError(1, self.command + args, output=str(response['error']).encode())
+
+    return b'' if response.get('result') is None else str(response['result']).encode()
+
+  def __stop(self):
+    if self.__process is None:
+      return
+
+    try:
+      self.__process.stdin.close()
+      self.__process.terminate()
+      self.__process.wait(5)
+    except Exception as ex:
+      logger.debug(f'Killing {self}: {ex}')
+      self.__process.kill()
+
+    self.__process = None
+
+  def stop(self):
+    with self.__lock:
+      self.__stop()
+
+class terrariumScriptPool(terrariumSingleton):
+  """
+  Runs all the external scripts of sensors, relays and areas. The amount of scripts that run at the same time is limited.
+  Scripts that contain the worker marker in their first lines are started once and kept running as a
+  terrariumScriptWorker. This also works when the script is started with an interpreter, like 'python3 script.py'. All
+  other scripts run one-shot in a shell, like before, and only have a timeout when the caller asks for one.
+  """
+
+  __MAX_CONCURRENT = 4
+  __WORKER_TIMEOUT = 30 # in seconds
+  __INTERPRETERS = re.compile(r'^(python[0-9.]*|bash|sh|perl|php|node)$')
+  __WORKER_MARKER = b'terrariumpi-worker'
+  __WORKER_HEADER_SIZE = 1024 # in bytes
+
+  def __init__(self):
+    self.__lock = threading.Lock()
+    self.__slots = threading.BoundedSemaphore(terrariumScriptPool.__MAX_CONCURRENT)
+    self.__workers = {}
+    self.__scripts = {}
+    self.__cache = terrariumCache()
+
+  def __is_worker(self, script, executable = True):
+    try:
+      stat = script.stat()
+      if not script.is_file() or (executable and not os.access(script, os.X_OK)):
+        return False
+    except OSError:
+      return False
+
+    key = (stat.st_size, stat.st_mtime_ns)
+    if self.__scripts.get(script, (None,))[0] != key:
+      with script.open('rb') as file:
+        self.__scripts[script] = (key, terrariumScriptPool.__WORKER_MARKER in file.read(terrariumScriptPool.__WORKER_HEADER_SIZE))
+
+    return self.__scripts[script][1]
+
+  def __worker(self, script):
+    try:
+      command = shlex.split(script)
+    except ValueError:
+      return None, None
+
+    if len(command) == 0:
+      return None, None
+
+    with self.__lock:
+      if self.__is_worker(Path(command[0])):
+        worker_command = command[:1]
+      elif len(command) > 1 and terrariumScriptPool.__INTERPRETERS.match(Path(command[0]).name) and self.__is_worker(Path(command[1]), False):
+        # The script is started with an interpreter, so it does not need to be executable
+        worker_command = command[:2]
+      else:
+        return None, None
+
+      key = tuple(worker_command)
+      if key not in self.__workers:
+        self.__workers[key] = terrariumScriptWorker(worker_command)
+
+      return self.__workers[key], command[len(worker_command):]
+
+  def execute(self, script, cache_timeout = 0, timeout = None):
+    """
+    Run a script and return the output.
+
+    Args:
+        script (str): The script with optional arguments
+        cache_timeout (int): Reuse the output for this amount of seconds. Zero is no caching
+        timeout (float): Maximum run time in seconds. One-shot scripts have no timeout when None, workers wait 30 seconds
+
+    Raises:
+        subprocess.TimeoutExpired: The script did not finish in time
+        subprocess.CalledProcessError: The script failed
+
+    Returns:
+        bytes: The output of the script
+    """
+    cache_key = f'script-{script}'
+    if cache_timeout > 0:
+      data = self.__cache.get_data(cache_key)
+      if data is not None:
+        return data
+
+    with self.__slots:
+      worker, args = self.__worker(script)
+      if worker is None:
+        data = subprocess.check_output(script, shell=True, timeout=timeout)
+      else:
+        data = worker.request(args, terrariumScriptPool.__WORKER_TIMEOUT if timeout is None else timeout)
+
+    if cache_timeout > 0:
+      self.__cache.set_data(cache_key, data, cache_timeout)
+
+    return data
+
+  def stop(self):
+    """
+    Stop all the running script workers.
+    """
+    with self.__lock:
+      workers = list(self.__workers.values())
+      self.__workers = {}
+
+    for worker in workers:
+      worker.stop()
+
 class terrariumUtils():
 
   @staticmethod
@@ -391,11 +706,11 @@ class terrariumUtils():
     return data
 
   @staticmethod
-  def get_script_data(script):
+  def get_script_data(script, cache_timeout = 0, timeout = None):
     data = None
     try:
       logger.debug('Running script: %s.' % (script))
-      data = subprocess.check_output(script, shell=True)
+      data = terrariumScriptPool().execute(script, cache_timeout, timeout)
       logger.debug('Output was: %s.' % (data))
     except Exception as ex:
       logger.exception('Error parsing script data for script %s. Exception %s' % (script, ex))
@@ -419,22 +734,23 @@ class terrariumUtils():
     power,n=min(int(log(max(n*b**power,1),b)),len(pre)-1),n*b**power
     return "%%.%if %%s%%s"%abs(power%(-power-1))%(n/b**float(power),pre[power],u)
 
+  # Some regex replacement to keep passwords/tokens out off the logging. The marker is used to skip lines that do not need cleaning
+  __CLEAN_LOG_LINE = [
+    ('://',    re.compile(r'(:\/\/)([^@]+)(@[^ ]+)'), '\\1*********\\3'),
+    ('appid=', re.compile(r'(appid=)([^ ]+)'),      '\\1*********')
+  ]
+
   @staticmethod
   def clean_log_line(logline):
-    # Some regex replacement to keep passwords/tokens out off the logging
-    search = [
-      r'(:\/\/)([^@]+)(@[^ ]+)',
-      r'(appid=)([^ ]+)'
-    ]
-
-    replace = [
-      '\\1*********\\3',
-      '\\1*********'
-    ]
-
-    for index in range(len(search)):
+    if not isinstance(logline, str):
+      return logline
+
+    for marker, search, replace in terrariumUtils.__CLEAN_LOG_LINE:
+      if marker not in logline:
+        continue
+
       try:
-        logline = re.sub(search[index], replace[index], logline)
+        logline = search.sub(replace, logline)
       except Exception as ex:
         logger.debug(f'Could not clear with regex: {ex}')
 
@@ -8,11 +8,14 @@ import json
 import datetime
 import functools
 import re
+import time
+import hmac
+import secrets
 from PIL import Image
 import base64
 from uuid import uuid4
 from pathlib import Path
-from hashlib import md5
+from hashlib import md5, sha256
 
 from bottle import BaseRequest,  default_app, request, redirect, static_file, jinja2_template, response, auth_basic, HTTPError, RouteBuildError
 #Increase bottle memory to max 5MB to process images in WYSIWYG editor
@@ -26,6 +29,10 @@ from terrariumUtils import terrariumUtils
 from terrariumAPI import terrariumAPI
 
 class terrariumWebserver(object):
+  # Sessions are valid for 1 hour after the last request, the same as the cookie
+  __SESSION_TIMEOUT     = 60 * 60
+  # Verified HTTP basic credentials are cached for 5 minutes, so bcrypt is not needed for every request
+  __CREDENTIALS_TIMEOUT = 5 * 60
 
   def __init__(self, terrariumEngine):
     # Define caching timeouts per url/path
@@ -41,6 +48,8 @@ class terrariumWebserver(object):
 
     # This secret will change every reboot. So cookies will not work anymore after a reboot.
     self.cookie_secret = uuid4().bytes
+    self.__sessions    = {}
+    self.__credentials = {}
     self.bottle        = default_app() # This is needed to get the APISpec BottlePlugin to work
     self.engine        = terrariumEngine
     self.websocket     = terrariumWebsocket(self)
@@ -61,12 +70,16 @@ class terrariumWebserver(object):
 
       @functools.wraps(func)
       def wrapper(*a, **ka):
-        # Get user info from auth request, then from cookie or else nothing
-        user, password = request.auth or request.get_cookie('auth', secret=self.cookie_secret) or (None, None)
+        # Get user info from auth request, then from the session cookie or else nothing
+        user, password = request.auth or (None, None)
+        session = self.check_session(self.__session_cookie())
+
+        # A valid session does not need the (expensive) password check
+        authenticated = session is not None or (user is not None and check(user, password))
 
         if int(self.engine.settings['always_authenticate']) != -1 and (required or terrariumUtils.is_true(self.engine.settings['always_authenticate'])):
           ip = request.remote_addr if request.get_header('X-Real-Ip') is None else request.get_header('X-Real-Ip')
-          if user is None or not check(user, password):
+          if not authenticated:
             err = HTTPError(401, text)
             err.add_header('WWW-Authenticate', f'Basic realm="{realm}"')
             if user is not None or password is not None:
@@ -76,9 +89,9 @@ class terrariumWebserver(object):
 
         if request.method.lower() in ['get','head','options']:
           self.__add_caching_headers(response,request.fullpath)
-          if check(user, password):
+          if session is not None:
             # Update the cookie timeout so that we are staying logged in as long as we are working on the interface
-            response.set_cookie('auth', request.get_cookie('auth', secret=self.cookie_secret), secret=self.cookie_secret, **{ 'max_age' : 3600, 'path' : '/'})
+            response.set_cookie('auth', session, secret=self.cookie_secret, **{ 'max_age' : terrariumWebserver.__SESSION_TIMEOUT, 'path' : '/'})
 
         elif request.method.lower() in ['post','put','delete']:
           response.set_cookie('no-cache','1', secret=None, **{ 'max_age' : 90, 'path' : '/'})
@@ -94,6 +107,83 @@ class terrariumWebserver(object):
   def __clear_authentication(self, user, password):
     return True
 
+  def __session_cookie(self):
+    try:
+      return request.get_cookie('auth', secret=self.cookie_secret)
+    except Exception as ex:
+      # Some strange cookie error when cleared... we can ignore that
+      logger.debug(f'Invalid cookie data. Either wrong secret or strange auth. We can ignore this. {ex}')
+
+    return None
+
+  def check_credentials(self, user, password):
+    """
+    Check the username and password. Bcrypt is only used once, after that the verified credentials are cached for a
+    short time. A username or password change will invalidate the cache, as they are part of the cache key.
+
+    Returns:
+        bool: True when the credentials are valid
+    """
+    if user is None or password is None:
+      return False
+
+    now = time.time()
+    credentials = hmac.new(self.cookie_secret, f'{user}:{password}:{self.engine.settings.get("username")}:{self.engine.settings.get("password")}'.encode(), sha256).hexdigest()
+    if self.__credentials.get(credentials, 0) > now:
+      return True
+
+    if not self.engine.authenticate(user, password):
+      return False
+
+    for key in [key for key, expire in self.__credentials.items() if expire <= now]:
+      del(self.__credentials[key])
+
+    self.__credentials[credentials] = now + terrariumWebserver.__CREDENTIALS_TIMEOUT
+    return True
+
+  def create_session(self, user):
+    """
+    Create a new session for an authenticated user. The session token is an opaque random value.
+
+    Returns:
+        string: The session token
+    """
+    now = time.time()
+    for token in [token for token, session in self.__sessions.items() if session['expire'] <= now]:
+      del(self.__sessions[token])
+
+    token = secrets.token_urlsafe(32)
+    self.__sessions[token] = {
+      'username' : user,
+      'password' : self.engine.settings.get('password'),
+      'expire'   : now + terrariumWebserver.__SESSION_TIMEOUT
+    }
+
+    return token
+
+  def check_session(self, token):
+    """
+    Validate a session token. A session is revoked when the username or password setting is changed.
+
+    Returns:
+        string: The session token when valid, else None
+    """
+    if not isinstance(token, str) or token not in self.__sessions:
+      return None
+
+    session = self.__sessions[token]
+    if session['expire'] <= time.time() or session['username'] != self.engine.settings.get('username') or session['password'] != self.engine.settings.get('password'):
+      del(self.__sessions[token])
+      return None
+
+    # Extend the session as long as it is used
+    session['expire'] = time.time() + terrariumWebserver.__SESSION_TIMEOUT
+    return token
+
+  def remove_session(self, token):
+    if isinstance(token, str) and token in self.__sessions:
+      del(self.__sessions[token])
+
   def __add_caching_headers(self, response, fullpath):
     if 200 == response.status_code:
       response.content_type = response.content_type.replace('application/javascript','application/javascript; charset=UTF-8')
@@ -118,14 +208,7 @@ class terrariumWebserver(object):
 
       return units
 
-    authenticated = False
-    try:
-      cookie_data = request.get_cookie('auth', secret=self.cookie_secret)
-      if cookie_data is not None:
-        authenticated = self.engine.authenticate(cookie_data[0],cookie_data[1])
-    except Exception as ex:
-      # Some strange cookie error when cleared... we can ignore that
-      logger.debug(f'Clear cookie issue: {ex}')
+    authenticated = self.check_session(self.__session_cookie()) is not None
 
     # Variables
     variables = {
@@ -162,7 +245,7 @@ class terrariumWebserver(object):
     return variables
 
   def authenticate(self, required = False):
-    return self.__auth_basic(self.engine.authenticate,required,_('TerrariumPI') + ' ' + _('Authentication'),_('Authenticate to make any changes'))
+    return self.__auth_basic(self.check_credentials,required,_('TerrariumPI') + ' ' + _('Authentication'),_('Authenticate to make any changes'))
 
   def render_page(self, page = 'index'):
     page_name = None
@@ -278,13 +361,19 @@ class terrariumWebserver(object):
     return url
 
   def __login(self):
-    response.set_cookie('auth', request.auth, secret=self.cookie_secret, **{ 'max_age' : 3600, 'path' : '/'})
+    # An existing session is reused. It is already extended by the authentication check
+    if self.check_session(self.__session_cookie()) is None:
+      # Logged in with HTTP basic authentication, or the authentication is disabled
+      user = self.engine.settings.get('username') if request.auth is None else request.auth[0]
+      response.set_cookie('auth', self.create_session(user), secret=self.cookie_secret, **{ 'max_age' : terrariumWebserver.__SESSION_TIMEOUT, 'path' : '/'})
+
     if request.is_ajax:
       return {'location' : self.url_for('home'), 'message' : 'User logged in.'}
 
     redirect(self.url_for('home'))
 
   def __logout(self):
+    self.remove_session(self.__session_cookie())
     response.set_cookie('auth', None, secret=self.cookie_secret, **{ 'max_age' : 3600, 'path' : '/'})
     if request.is_ajax:
       return {'location' : self.url_for('home'), 'message' : 'User logged out.'}
@@ -314,12 +403,11 @@ class terrariumWebsocket(object):
   def connect(self,socket):
 
     def listen_for_messages(messages, socket):
-      try:
-        self.clients.remove(messages)
-      except Exception as ex:
-        logger.debug(f'Client {messages} was not on the client list when started: {ex}')
+      if not self.remove_client(messages):
+        logger.debug(f'Client {messages} was not on the client list when started')
 
       self.clients.append(messages)
+      terrariumLogging.log_buffer().subscribe(messages.log_callback, messages.log_level)
       logger.debug(f'Got a new websocket connection from {socket}')
 
       while True:
@@ -330,21 +418,20 @@ class terrariumWebsocket(object):
         except Exception as ex:
           # Socket connection is lost/closed, stop looping....
           logger.debug(f'Disconnected {socket}. Stop listening and remove queue... {ex}')
-          try:
-            self.clients.remove(messages)
-          except Exception as ex:
-            logger.debug(f'Disconnected {socket} is not in the clients queue... {ex}')
+          if not self.remove_client(messages):
+            logger.debug(f'Disconnected {socket} is not in the clients queue...')
 
           break
 
     messages = Queue()
+    # Log lines are published from the in memory log buffer, filtered on the log level of this client
+    messages.log_level = terrariumLogging.logging.INFO
+    messages.log_callback = lambda level, line: self.send_message({'type' : 'logline', 'data' : line}, messages)
     authenticated = False
 
     # First try (existing) cookie login
     try:
-      cookie_data = request.get_cookie('auth', secret=self.webserver.cookie_secret)
-      if cookie_data is not None:
-        authenticated = self.webserver.engine.authenticate(cookie_data[0],cookie_data[1])
+      authenticated = self.webserver.check_session(request.get_cookie('auth', secret=self.webserver.cookie_secret)) is not None
     except Exception as ex:
       logger.debug(f'Invalid cookie data. Either wrong secret or strange auth. We can ignore this. {ex}')
 
@@ -354,10 +441,8 @@ class terrariumWebsocket(object):
       except Exception as ex:
         # Closed websocket connection.
         logger.debug(f'Websocket error receiving messages: {ex}')
-        try:
-          self.clients.remove(messages)
-        except Exception as ex:
-          logger.debug(f'Clashed client was not in the list of clients {ex}')
+        if not self.remove_client(messages):
+          logger.debug('Clashed client was not in the list of clients')
 
         break
 
@@ -375,11 +460,15 @@ class terrariumWebsocket(object):
             else:
               try:
                 auth = base64.b64decode(message['auth']).decode('utf-8').split(':')
-                authenticated = self.webserver.engine.authenticate(auth[0], auth[1])
+                authenticated = self.webserver.check_credentials(auth[0], auth[1])
 
               except Exception as ex:
                 logger.debug(f'Invalid auth data. Either wrong base64 or strange auth. We can ignore this.: {ex}')
 
+          log_level = terrariumLogging.logging.getLevelName(str(message.get('log_level', '')).upper())
+          if isinstance(log_level, int):
+            messages.log_level = log_level
+
           if not messages in self.clients:
             messages.authenticated = authenticated
             logger.debug(f'Starting authenticated socket? {messages.authenticated}')
@@ -389,6 +478,7 @@ class terrariumWebsocket(object):
               self.send_message({'type' : 'button', 'data' : door}, messages)
           else:
             self.clients[self.clients.index(messages)].authenticated = authenticated
+            terrariumLogging.log_buffer().subscribe(messages.log_callback, messages.log_level)
 
           if self.webserver.engine.update_available:
             self.send_message({'type' : 'softwareupdate', 'data' : {'title':_('Software Update'), 'message' : '<a href="https://github.com/theyosh/TerrariumPI/releases" target="_blank" rel="noopener">' + _('A new version ({version}) is available!').format(version=self.webserver.engine.latest_version) + '</a>'}}, messages)
@@ -401,6 +491,14 @@ class terrariumWebsocket(object):
             avg_data['id'] = sensor_type
             self.send_message({'type' : 'sensor', 'data' : avg_data}, messages)
 
+  def remove_client(self, queue):
+    terrariumLogging.log_buffer().unsubscribe(getattr(queue, 'log_callback', None))
+    try:
+      self.clients.remove(queue)
+      return True
+    except ValueError:
+      return False
+
   def send_message(self, message, queue = None):
     # Get all the connected websockets (get a copy of the list, as we could delete entries and change the list length during the loop)
     clients = self.clients
@@ -409,15 +507,13 @@ class terrariumWebsocket(object):
       if queue is None or queue == client:
         if 'logline' == message['type'] and not client.authenticated:
           # Clean the logline message. Keep date and type for web indicators
-          message['data'] = message['data'][0:36].strip()
-
-        client.put(message)
+          client.put({'type' : message['type'], 'data' : message['data'][0:36].strip()})
+        else:
+          client.put(message)
       # If more then 50 messages in queue, looks like connection is gone and remove the queue from the list
       if client.qsize() > 50:
         logger.debug(f'Lost connection.... should not happen anymore. {len(self.clients)} - {client.qsize()} - {client}')
-        try:
-          self.clients.remove(client)
-        except Exception as ex:
-          logger.debug(f'Client {client} was not on the client list anymore: {ex}')
+        if not self.remove_client(client):
+          logger.debug(f'Client {client} was not on the client list anymore')
 
     logger.debug(f'Websocket message {message} is send to {len(self.clients)} clients')
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import gettext
+import os
+import sys
+import types
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+# Run from the TerrariumPI root folder, as the logging config, migrations and translations use relative paths
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)
+
+gettext.install('terrariumpi', 'locales/')
+
+try:
+  import RPi.GPIO
+except (ImportError, RuntimeError):
+  # Not running on a Raspberry PI. Use a mocked GPIO backend
+  gpio = mock.MagicMock(name='RPi.GPIO')
+  rpi  = types.ModuleType('RPi')
+  rpi.GPIO = gpio
+  sys.modules['RPi'] = rpi
+  sys.modules['RPi.GPIO'] = gpio
+
+# The logging has to be loaded first, like terrariumPI.py does
+import terrariumLogging
+
+
+@pytest.fixture(scope='session')
+def database(tmp_path_factory):
+  """
+  A new TerrariumPI database with all the migrations applied. Pony can only bind once, so it is shared by all the tests.
+  """
+  import terrariumDatabase
+
+  terrariumDatabase.DATABASE = str(tmp_path_factory.mktemp('data') / 'terrariumpi.db')
+  terrariumDatabase.init('0.0.0')
+
+  return terrariumDatabase
+
+
+@pytest.fixture
+def query_counter(database):
+  """
+  Count the SQL statements that are executed in the current thread.
+  """
+  class QueryCounter(object):
+    def __enter__(self):
+      database.db.local_stats.clear()
+      return self
+
+    def __exit__(self, *args):
+      total = database.db.local_stats.get(None)
+      self.count = 0 if total is None else total.db_count
+
+  return QueryCounter
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+import gevent
+import pytest
+
+import hardware.button
+import hardware.io_expander
+from hardware.button import terrariumButton
+from hardware.io_expander import terrariumIOExpanderInputPoller
+from terrariumUtils import terrariumCache
+
+
+class FakeGPIO(object):
+  """
+  GPIO backend stand-in. The pin levels can be changed by the test, and the edge callbacks are stored so the test can
+  fire them.
+  """
+  IN     = 'in'
+  BOTH   = 'both'
+  PUD_UP = 'pud_up'
+
+  def __init__(self, edge_detection = True):
+    self.levels = {}
+    self.events = {}
+    self.edge_detection = edge_detection
+
+  def setup(self, pin, direction, pull_up_down = None):
+    self.levels.setdefault(pin, 0)
+
+  def input(self, pin):
+    return self.levels[pin]
+
+  def add_event_detect(self, pin, edge, callback = None, bouncetime = None):
+    if not self.edge_detection:
+      raise RuntimeError('Failed to add edge detection')
+
+    self.events[pin] = {'callback' : callback, 'bouncetime' : bouncetime}
+
+  def remove_event_detect(self, pin):
+    self.events.pop(pin, None)
+
+  def cleanup(self, pin = None):
+    pass
+
+  def edge(self, pin):
+    # Fire the edge callback in its own thread, like RPi.GPIO does
+    thread = threading.Thread(target=self.events[pin]['callback'], args=(pin,))
+    thread.start()
+    return thread
+
+
+class FakeSMBus(object):
+  """
+  I2C bus stand-in for a single PCF8574 chip. Every read is counted, together with the thread that did the read.
+  """
+
+  def __init__(self, chip):
+    self.chip = chip
+    self.reads = 0
+    self.readers = set()
+
+  def read_byte(self, address):
+    self.reads += 1
+    self.readers.add(threading.get_ident())
+    return sum(1 << 7 - pin for pin, level in enumerate(self.chip.levels) if level)
+
+  def write_byte(self, address, value):
+    self.chip.written = value
+
+
+class FakePCF8574(object):
+  """
+  PCF8574 stand-in that works like the pcf8574 library: reading the port does an I2C read per pin.
+  """
+
+  def __init__(self, bus, address):
+    self.address = address
+    self.levels = [False] * 8
+    self.written = None
+    self.bus = FakeSMBus(self)
+
+  @property
+  def port(self):
+    return [self.get_pin_state(pin) for pin in range(8)]
+
+  @port.setter
+  def port(self, value):
+    self.bus.write_byte(self.address, sum(1 << 7 - pin for pin, level in enumerate(value) if level))
+
+  def get_pin_state(self, pin):
+    return bool(self.bus.read_byte(self.address) & 1 << 7 - pin)
+
+
+def wait_for(check, timeout = 5):
+  # Wait with gevent, so the hub can process the edges that are handed over by the GPIO threads
+  end = time.time() + timeout
+  while time.time() < end:
+    if check():
+      return True
+    gevent.sleep(0.01)
+
+  return False
+
+
+class Recorder(object):
+  def __init__(self):
+    self.states = {}
+    self.threads = set()
+
+  def __call__(self, button_id, state):
+    self.states.setdefault(button_id, []).append(state)
+    self.threads.add(threading.get_ident())
+
+  def get(self, button_id):
+    return self.states.get(button_id, [])
+
+
+@pytest.fixture
+def gpio(monkeypatch):
+  backend = FakeGPIO()
+  monkeypatch.setattr(hardware.button, 'GPIO', backend)
+  return backend
+
+
+@pytest.fixture
+def expander(monkeypatch):
+  monkeypatch.setattr(hardware.io_expander, 'PCF8574', FakePCF8574)
+  yield
+  # The loaded expander chips are cached forever
+  terrariumCache().clear_data('IO_PCF8574_27')
+
+
+def test_edge_detection_is_debounced(gpio):
+  recorder = Recorder()
+  button = terrariumButton('motion', 'motion', '11', 'Motion', recorder)
+  pin = button._device['device']
+  try:
+    assert button._checker['mode'] == 'interrupt'
+    assert button._checker['thread'] is None
+    assert gpio.events[pin]['bouncetime'] == terrariumButton._DEBOUNCE_TIME
+    assert recorder.get('motion') == [terrariumButton.RELEASED]
+
+    # A short spike that is gone before the debounce time has passed, is ignored
+    gpio.levels[pin] = 1
+    gpio.edge(pin).join()
+    gpio.levels[pin] = 0
+    gevent.sleep(terrariumButton._DEBOUNCE_TIME / 1000 * 2)
+    assert recorder.get('motion') == [terrariumButton.RELEASED]
+
+    # A bouncing press fires multiple edges, but is only reported once
+    gpio.levels[pin] = 1
+    for edge in [gpio.edge(pin) for _ in range(3)]:
+      edge.join()
+
+    # The GPIO threads only hand over the edges. The state is checked in the gevent hub of the main thread
+    assert recorder.get('motion') == [terrariumButton.RELEASED]
+    gevent.sleep(terrariumButton._DEBOUNCE_TIME / 1000 * 2)
+    assert recorder.get('motion') == [terrariumButton.RELEASED, terrariumButton.PRESSED]
+    assert recorder.threads == {threading.get_ident()}
+    assert button.pressed
+
+  finally:
+    button.stop()
+
+  assert pin not in gpio.events
+  assert button._checker['mode'] is None
+
+
+def test_expander_buttons_share_a_single_poller(expander):
+  recorder = Recorder()
+  buttons = [terrariumButton(f'motion{port}', 'motion', f'pcf8574-{port},27', f'Motion {port}', recorder) for port in [1, 2]]
+  pollers = terrariumIOExpanderInputPoller._terrariumIOExpanderInputPoller__pollers
+  try:
+    assert all(button._checker['mode'] == 'expander' for button in buttons)
+    assert list(pollers.keys()) == ['IO_PCF8574_27']
+    assert len(pollers['IO_PCF8574_27'].subscribers) == 2
+
+    device = buttons[0]._device['device']._terrariumIOExpander__device
+    assert device is buttons[1]._device['device']._terrariumIOExpander__device
+    assert wait_for(lambda: recorder.get('motion1') == [terrariumButton.RELEASED] and recorder.get('motion2') == [terrariumButton.RELEASED])
+
+    # One chip read per poll interval for all the buttons, done by a single thread
+    reads = device.bus.reads
+    time.sleep(0.5)
+    assert device.bus.reads - reads <= 7
+    assert len(device.bus.readers) == 1
+
+    # Every button only reacts on its own pin
+    device.levels[0] = True
+    assert wait_for(lambda: buttons[0].pressed)
+    assert recorder.get('motion1') == [terrariumButton.RELEASED, terrariumButton.PRESSED]
+    assert recorder.get('motion2') == [terrariumButton.RELEASED]
+
+    device.levels[1] = True
+    assert wait_for(lambda: buttons[1].pressed)
+    assert recorder.get('motion2') == [terrariumButton.RELEASED, terrariumButton.PRESSED]
+
+  finally:
+    for button in buttons:
+      button.stop()
+
+  assert 'IO_PCF8574_27' not in pollers
+
+
+def test_polling_fallback(gpio, database):
+  # The fallback logs a warning, which is also stored as a notification
+  gpio.edge_detection = False
+  recorder = Recorder()
+  button = terrariumButton('motion', 'motion', '11', 'Motion', recorder)
+  pin = button._device['device']
+  try:
+    assert button._checker['mode'] == 'polling'
+    assert button._checker['thread'].is_alive()
+    assert wait_for(lambda: recorder.get('motion') == [terrariumButton.RELEASED])
+
+    gpio.levels[pin] = 1
+    assert wait_for(lambda: button.pressed)
+
+    gpio.levels[pin] = 0
+    assert wait_for(lambda: not button.pressed)
+    assert recorder.get('motion') == [terrariumButton.RELEASED, terrariumButton.PRESSED, terrariumButton.RELEASED]
+
+  finally:
+    thread = button._checker['thread']
+    button.stop()
+
+  assert not thread.is_alive()
+  assert button._checker['thread'] is None
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from pony import orm
+
+
+@pytest.fixture
+def db(database):
+  # Every test starts with empty hardware tables
+  with orm.db_session():
+    for entity in [database.SensorAverageHistory, database.SensorHistory, database.RelayHistory, database.ButtonHistory,
+                   database.Area, database.Sensor, database.Relay, database.Button, database.Webcam, database.Enclosure]:
+      orm.delete(item for item in entity)
+
+  database.Area.clear_sensor_areas()
+  return database
+
+
+def create_hardware(db, amount, first = 0):
+  now = datetime.now().replace(microsecond=0)
+  with orm.db_session():
+    enclosure = db.Enclosure(name='Test enclosure')
+    for counter in range(first, first + amount):
+      sensor = db.Sensor(id=f'sensor{counter}', hardware='script', type='temperature', name=f'Sensor {counter}', address='/tmp/sensor.sh', alarm_min=20, alarm_max=30, calibration={})
+      db.SensorHistory(sensor=sensor, timestamp=now, value=20.0 + counter, limit_min=0, limit_max=100, alarm_min=20, alarm_max=30)
+
+      relay = db.Relay(id=f'relay{counter}', hardware='script', name=f'Relay {counter}', address='/tmp/relay.sh', calibration={})
+      db.RelayHistory(relay=relay, timestamp=now, value=100.0, wattage=10.0, flow=0.0)
+
+      button = db.Button(id=f'button{counter}', hardware='remote', name=f'Button {counter}', address='http://localhost/door', calibration={}, enclosure=enclosure)
+      db.ButtonHistory(button=button, timestamp=now, value=1.0)
+
+      db.Area(enclosure=enclosure, name=f'Area {counter}', type='heating', mode='sensors', setup={'sensors' : [sensor.id]})
+
+
+def list_queries(db, query_counter, entity, exclude = None):
+  # Build the list like the API list endpoints do
+  with orm.db_session():
+    with query_counter() as counter:
+      latest_values = entity.latest_values()
+      rows = [item.to_dict(exclude=exclude, latest_values=latest_values) for item in entity.select()]
+
+  return counter.count, rows
+
+
+@pytest.mark.parametrize('entity, exclude', [('Sensor', None), ('Relay', 'webcam'), ('Button', 'enclosure')])
+def test_list_query_count_is_constant(db, query_counter, entity, exclude):
+  entity = getattr(db, entity)
+
+  create_hardware(db, 1)
+  queries_one, rows = list_queries(db, query_counter, entity, exclude)
+  assert len(rows) == 1
+  assert rows[0]['value'] is not None
+
+  create_hardware(db, 10, 1)
+  queries_many, rows = list_queries(db, query_counter, entity, exclude)
+  assert len(rows) == 11
+  assert all(row['value'] is not None and not row['error'] for row in rows)
+
+  assert queries_many == queries_one
+
+
+def test_latest_values_match_value_property(db):
+  create_hardware(db, 3)
+  with orm.db_session():
+    latest_values = db.Sensor.latest_values()
+    for sensor in db.Sensor.select():
+      assert latest_values[sensor.id] == sensor.value
+      assert sensor.to_dict(latest_values=latest_values) == sensor.to_dict()
+
+
+@pytest.mark.parametrize('api_list', ['sensor', 'relay', 'button', 'area', 'enclosure'])
+def test_api_list_query_count_is_constant(db, query_counter, api_list):
+  terrariumAPI = pytest.importorskip('terrariumAPI')
+
+  api = object.__new__(terrariumAPI.terrariumAPI)
+  api.webserver = SimpleNamespace(engine=SimpleNamespace(settings={'exclude_ids' : []}))
+  list_builder = getattr(api, f'_terrariumAPI__{api_list}_list')
+
+  create_hardware(db, 1)
+  with query_counter() as queries_one:
+    assert len(list_builder()['data']) == 1
+
+  create_hardware(db, 10, 1)
+  with query_counter() as queries_many:
+    assert len(list_builder()['data']) == (2 if 'enclosure' == api_list else 11)
+
+  assert queries_many.count == queries_one.count
+
+
+@pytest.fixture
+def fixed_time(db, monkeypatch):
+  # All the sensor updates of a test are in the same minute
+  now = datetime(2024, 1, 1, 12, 0, 30)
+
+  class FixedDatetime(datetime):
+    @classmethod
+    def now(cls, tz = None):
+      return now
+
+  monkeypatch.setattr(db, 'datetime', FixedDatetime)
+  return now.replace(second=0)
+
+
+def average_rows(db):
+  with orm.db_session():
+    return {(row.source, row.timestamp) : (row.value, row.alarm_min, row.alarm_max, row.amount) for row in db.SensorAverageHistory.select()}
+
+
+def test_sensor_updates_maintain_the_average_history(db, fixed_time):
+  with orm.db_session():
+    enclosure = db.Enclosure(name='Test enclosure')
+    for counter in range(3):
+      db.Sensor(id=f'sensor{counter}', hardware='script', type='temperature', name=f'Sensor {counter}', address='/tmp/sensor.sh',
+                alarm_min=20, alarm_max=30, exclude_avg=(2 == counter), calibration={})
+
+    heating = db.Area(enclosure=enclosure, name='Heating', type='heating', mode='sensors', setup={'sensors' : ['sensor0', 'sensor1']})
+    cooling = db.Area(enclosure=enclosure, name='Cooling', type='cooling', mode='sensors', setup={'sensors' : ['sensor1']})
+    heating, cooling = heating.id, cooling.id
+
+  with orm.db_session():
+    db.Sensor['sensor0'].update(20.0)
+    db.Sensor['sensor1'].update(26.0)
+    # Excluded from the averages
+    db.Sensor['sensor2'].update(40.0)
+
+  assert average_rows(db) == {
+    ('type:temperature', fixed_time) : (23.0, 20.0, 30.0, 2),
+    (f'area:{heating}', fixed_time)  : (23.0, 20.0, 30.0, 2),
+    (f'area:{cooling}', fixed_time)  : (26.0, 20.0, 30.0, 1),
+  }
+
+  # A second value in the same minute is averaged with the first one, and replaces its contribution
+  with orm.db_session():
+    db.Sensor['sensor1'].update(30.0)
+
+  assert average_rows(db) == {
+    ('type:temperature', fixed_time) : (24.0, 20.0, 30.0, 2),
+    (f'area:{heating}', fixed_time)  : (24.0, 20.0, 30.0, 2),
+    (f'area:{cooling}', fixed_time)  : (28.0, 20.0, 30.0, 1),
+  }
+
+  # The averages match a full rebuild
+  with orm.db_session():
+    for source in ['type:temperature', f'area:{heating}', f'area:{cooling}']:
+      db.SensorAverageHistory.rebuild(source)
+
+  assert average_rows(db)[(f'area:{cooling}', fixed_time)] == (28.0, 20.0, 30.0, 1)
+  assert average_rows(db)[('type:temperature', fixed_time)] == (24.0, 20.0, 30.0, 2)
+
+
+def test_sensor_areas_are_cached_until_cleared(db, query_counter, fixed_time):
+  with orm.db_session():
+    enclosure = db.Enclosure(name='Test enclosure')
+    db.Sensor(id='sensor0', hardware='script', type='temperature', name='Sensor 0', address='/tmp/sensor.sh', calibration={})
+    area = db.Area(enclosure=enclosure, name='Heating', type='heating', mode='sensors', setup={'sensors' : []})
+    area = area.id
+
+  with orm.db_session():
+    assert db.Area.sensor_areas('sensor0') == []
+
+  # The engine updates the area state every round, which does not clear the mapping
+  with orm.db_session():
+    db.Area[area].state = {'is_day' : True}
+
+  with orm.db_session():
+    with query_counter() as counter:
+      assert db.Area.sensor_areas('sensor0') == []
+
+  assert counter.count == 0
+
+  # The mapping is cleared after the changed sensors are committed
+  with orm.db_session():
+    db.Area[area].setup = {'sensors' : ['sensor0']}
+
+  db.Area.clear_sensor_areas()
+  with orm.db_session():
+    assert db.Area.sensor_areas('sensor0') == [area]
+    db.Sensor['sensor0'].update(25.0)
+
+  assert (f'area:{area}', fixed_time) in average_rows(db)
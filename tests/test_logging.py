@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import gzip
+import logging
+import os
+import queue
+import threading
+import time
+
+from terrariumLogging import QueueLogHandler, QueueLogListener, TimedCompressedRotatingFileHandler
+
+
+def test_rollover_compression_does_not_change_the_process_priority(tmp_path):
+  handler = TimedCompressedRotatingFileHandler(str(tmp_path / 'terrariumpi.log'), when='midnight', backupCount=2)
+  try:
+    rotated = tmp_path / 'terrariumpi.log.2024-01-01'
+    rotated.write_bytes(b'log line\n' * 1000)
+
+    priority = os.getpriority(os.PRIO_PROCESS, 0)
+    handler._TimedCompressedRotatingFileHandler__compress(str(rotated))
+
+    assert os.getpriority(os.PRIO_PROCESS, 0) == priority
+    assert not rotated.exists()
+    with gzip.open(str(rotated) + '.gz', 'rb') as archive:
+      assert archive.read() == b'log line\n' * 1000
+
+  finally:
+    handler.close()
+
+
+class BlockingHandler(logging.Handler):
+  # Blocks on the first record until it is released, so the queue stays full
+  def __init__(self):
+    super().__init__()
+    self.records = []
+    self.started = threading.Event()
+    self.unblock = threading.Event()
+
+  def emit(self, record):
+    self.started.set()
+    self.unblock.wait()
+    self.records.append(record.getMessage())
+
+
+def record(message, level = logging.INFO):
+  return logging.LogRecord('test', level, __file__, 0, message, None, None)
+
+
+def test_dropped_records_are_counted_from_all_threads():
+  handler = QueueLogHandler(queue.Queue(10))
+  for counter in range(10):
+    handler.handle(record(f'fill {counter}', logging.ERROR))
+
+  def log():
+    for counter in range(1000):
+      handler.handle(record(f'drop {counter}'))
+
+  threads = [threading.Thread(target=log) for _ in range(8)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+
+  assert handler.dropped == {'INFO' : 8000}
+
+
+def test_listener_stops_with_a_full_queue():
+  log_queue = queue.Queue(5)
+  handler = BlockingHandler()
+  listener = QueueLogListener(log_queue, handler)
+  listener.start()
+
+  for counter in range(6):
+    log_queue.put(record(f'message {counter}'), timeout=5)
+    if 0 == counter:
+      assert handler.started.wait(5)
+
+  assert log_queue.full()
+  threading.Timer(0.2, handler.unblock.set).start()
+  listener.stop()
+
+  assert handler.records == [f'message {counter}' for counter in range(6)]
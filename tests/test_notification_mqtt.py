@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+import json
+import socket
+import struct
+import threading
+import time
+
+import pytest
+
+from terrariumNotification import terrariumNotificationService, terrariumNotificationOutbox
+
+
+class MQTTBroker(object):
+  """
+  Minimal MQTT 3.1.1 broker stand-in. It accepts all the connections, acknowledges QoS 1 messages and records all the
+  published messages in order.
+  """
+
+  def __init__(self, port = 0):
+    self.messages = []
+    self.connects = 0
+    self.__clients = []
+    self.__server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    self.__server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    self.__server.bind(('127.0.0.1', port))
+    self.__server.listen()
+    self.port = self.__server.getsockname()[1]
+    self.__lock = threading.Lock()
+    self.__running = True
+    threading.Thread(target=self.__accept, daemon=True).start()
+
+  def __accept(self):
+    while self.__running:
+      try:
+        client, _ = self.__server.accept()
+      except OSError:
+        break
+
+      with self.__lock:
+        self.__clients.append(client)
+
+      threading.Thread(target=self.__handle, args=(client,), daemon=True).start()
+
+  @staticmethod
+  def __read(client, length):
+    data = b''
+    while len(data) < length:
+      chunk = client.recv(length - len(data))
+      if not chunk:
+        raise ConnectionError('Client disconnected')
+      data += chunk
+
+    return data
+
+  def __handle(self, client):
+    try:
+      while True:
+        header = self.__read(client, 1)[0]
+        length, multiplier = 0, 1
+        while True:
+          byte = self.__read(client, 1)[0]
+          length += (byte & 0x7F) * multiplier
+          multiplier *= 128
+          if not byte & 0x80:
+            break
+
+        body = self.__read(client, length)
+        packet_type = header >> 4
+
+        if 1 == packet_type:
+          # CONNECT
+          with self.__lock:
+            self.connects += 1
+          client.sendall(b'\x20\x02\x00\x00')
+
+        elif 3 == packet_type:
+          # PUBLISH
+          qos = (header >> 1) & 0x03
+          topic_length = struct.unpack('>H', body[:2])[0]
+          topic = body[2:2+topic_length].decode()
+          position = 2 + topic_length
+          if qos > 0:
+            client.sendall(b'\x40\x02' + body[position:position+2])
+            position += 2
+
+          with self.__lock:
+            self.messages.append((topic, body[position:].decode()))
+
+        elif 12 == packet_type:
+          # PINGREQ
+          client.sendall(b'\xd0\x00')
+
+        elif 14 == packet_type:
+          # DISCONNECT
+          break
+
+    except (ConnectionError, OSError):
+      pass
+
+    finally:
+      client.close()
+
+  def payloads(self):
+    with self.__lock:
+      return [json.loads(payload)['message'] for _, payload in self.messages]
+
+  def drop_clients(self):
+    # Simulate a network failure
+    with self.__lock:
+      for client in self.__clients:
+        try:
+          client.shutdown(socket.SHUT_RDWR)
+        except OSError:
+          pass
+
+      self.__clients = []
+
+  def stop(self):
+    self.__running = False
+    self.drop_clients()
+    self.__server.close()
+
+
+def wait_for(check, timeout = 15):
+  end = time.time() + timeout
+  while time.time() < end:
+    if check():
+      return True
+    time.sleep(0.05)
+
+  return False
+
+
+def free_port():
+  with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+    sock.bind(('127.0.0.1', 0))
+    return sock.getsockname()[1]
+
+
+@pytest.fixture
+def outbox(tmp_path, monkeypatch):
+  monkeypatch.setattr(terrariumNotificationOutbox, '_terrariumNotificationOutbox__DATABASE', str(tmp_path / 'outbox.db'))
+
+
+def mqtt_service(port):
+  return terrariumNotificationService(None, 'mqtt', 'Test broker', True, {
+    'address'  : '127.0.0.1',
+    'port'     : port,
+    'username' : '',
+    'password' : '',
+    'version'  : 'test'
+  })
+
+
+def send(service, message):
+  service.send_message('test', 'Test', message)
+
+
+def test_offline_messages_are_replayed_before_new_messages(outbox):
+  port = free_port()
+  service = mqtt_service(port)
+
+  # The broker is not running yet, so these messages are stored in the outbox
+  for counter in range(5):
+    send(service, counter)
+
+  assert len(service.outbox) == 5
+
+  # Keep sending while the broker comes up and the outbox is replayed
+  sender_done = threading.Event()
+  def sender():
+    for counter in range(5, 55):
+      send(service, counter)
+      time.sleep(0.01)
+    sender_done.set()
+
+  thread = threading.Thread(target=sender)
+  thread.start()
+
+  broker = MQTTBroker(port)
+  try:
+    thread.join()
+    assert wait_for(lambda: len(broker.payloads()) == 55)
+    assert broker.payloads() == list(range(55))
+    assert len(service.outbox) == 0
+  finally:
+    service.stop()
+    broker.stop()
+
+
+def test_reconnect_keeps_order_without_duplicates(outbox):
+  broker = MQTTBroker()
+  service = mqtt_service(broker.port)
+  try:
+    assert wait_for(lambda: service.connection.is_connected())
+    send(service, 0)
+    assert wait_for(lambda: broker.payloads() == [0])
+
+    # Lose the connection a few times, while messages are sent
+    counter = 1
+    for connects in range(2, 5):
+      broker.drop_clients()
+
+      for _ in range(5):
+        send(service, counter)
+        counter += 1
+
+      assert wait_for(lambda: broker.connects == connects and service.connection.is_connected())
+
+    for _ in range(5):
+      send(service, counter)
+      counter += 1
+
+    assert wait_for(lambda: len(broker.payloads()) == counter)
+    assert broker.payloads() == list(range(counter))
+    assert broker.connects == 4
+    # The replay thread is done when everything is replayed
+    assert wait_for(lambda: service._terrariumNotificationServiceMQTT__replay_thread is None)
+    assert len(service.outbox) == 0
+  finally:
+    service.stop()
+    broker.stop()
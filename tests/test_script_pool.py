@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import sys
+
+import pytest
+
+from terrariumUtils import terrariumScriptPool
+
+WORKER = '''# terrariumpi-worker
+import json
+import os
+import sys
+
+for line in sys.stdin:
+  request = json.loads(line)
+  print(json.dumps({'id' : request['id'], 'result' : f'{os.getpid()}:{",".join(request["args"])}'}), flush=True)
+'''
+
+
+@pytest.fixture
+def pool():
+  yield terrariumScriptPool()
+  terrariumScriptPool().stop()
+
+
+def test_worker_started_with_an_interpreter(pool, tmp_path):
+  script = tmp_path / 'worker.py'
+  script.write_text(WORKER)
+  # Not executable, as it is started with the interpreter
+  script.chmod(0o644)
+
+  first  = pool.execute(f'{sys.executable} {script} 1').decode().split(':')
+  second = pool.execute(f'{sys.executable} {script} 2 3').decode().split(':')
+
+  assert first[1] == '1'
+  assert second[1] == '2,3'
+  # The same worker process answered both requests
+  assert first[0] == second[0]
+
+
+def test_one_shot_script(pool, tmp_path):
+  script = tmp_path / 'script.py'
+  script.write_text('print(21.5)\n')
+
+  assert pool.execute(f'{sys.executable} {script}') == b'21.5\n'
+  assert pool.execute('echo 42') == b'42\n'
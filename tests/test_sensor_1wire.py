@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from importlib import import_module
+
+terrarium1WireBus = import_module('hardware.sensor.1wire_sensor').terrarium1WireBus
+
+
+def test_failing_sensor_does_not_trigger_new_conversions(tmp_path):
+  master = tmp_path / 'w1_bus_master1'
+  master.mkdir()
+  bulk = master / 'therm_bulk_read'
+  bulk.write_text('1\n')
+
+  (master / '28-000000000001').mkdir()
+  (master / '28-000000000001' / 'temperature').write_text('21500\n')
+  (master / '28-000000000002').mkdir()
+  # A sensor that returns garbage after the conversion
+  (master / '28-000000000002' / 'temperature').write_text('error\n')
+  (master / '28-000000000001' / 'w1_slave').write_text('')
+
+  bus = terrarium1WireBus.get(master / '28-000000000001' / 'w1_slave')
+  assert bus.temperature('28-000000000001') == 21.5
+  assert bulk.read_text() == 'trigger\n'
+
+  # The values are fresh, so no new bulk conversion is started for the failing sensor
+  bulk.write_text('1\n')
+  (master / '28-000000000001' / 'temperature').write_text('25000\n')
+  for _ in range(3):
+    assert bus.temperature('28-000000000002') is None
+    assert bus.temperature('28-000000000001') == 21.5
+
+  assert bulk.read_text() == '1\n'